@@ -0,0 +1,116 @@
+"""
+Analytics dashboard data, computed in a fixed number of queries and cached per user.
+"""
+
+from datetime import timedelta
+from decimal import Decimal
+from typing import Dict, Optional
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Case, Count, DecimalField, F, OuterRef, Q, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce, Least
+from django.utils import timezone
+
+from .models import CarbonFootprint, SustainabilityGoal
+from invoices.models import Invoice
+from recommendations.models import Recommendation
+from simulations.models import Simulation
+
+User = get_user_model()
+
+# Metrics shown for the current month, with the CarbonFootprint column behind each
+MONTHLY_METRICS = {
+    'carbon': 'total_carbon_kg',
+    'water': 'water_footprint_l',
+    'energy': 'energy_footprint_kwh',
+}
+
+
+def dashboard_cache_key(user_id: int) -> str:
+    return f"analytics-dashboard:{user_id}"
+
+
+def invalidate_dashboard(user_id: int) -> None:
+    """Drop the user's cached dashboard once the current transaction commits."""
+    transaction.on_commit(lambda: cache.delete(dashboard_cache_key(user_id)))
+
+
+def _percentage_change(current: Optional[Decimal], previous: Optional[Decimal]):
+    if previous and current:
+        return (current - previous) / previous * 100
+    return 0
+
+
+def _count_subquery(queryset) -> Coalesce:
+    """Correlated COUNT(*) of a per-user queryset, for annotating a User row."""
+    counts = queryset.filter(user=OuterRef('pk')).order_by().values('user').annotate(count=Count('pk')).values('count')
+    return Coalesce(Subquery(counts), 0)
+
+
+def build_dashboard(user) -> Dict:
+    """Compute the dashboard in three queries: footprints, goals and cross-app counts."""
+    current_month = timezone.localdate().replace(day=1)
+    previous_month = (current_month - timedelta(days=1)).replace(day=1)
+    
+    # Both months from the monthly rollup rows in one pass
+    aggregates = {}
+    for metric, field in MONTHLY_METRICS.items():
+        aggregates[f'current_{metric}'] = Sum(field, filter=Q(date=current_month))
+        aggregates[f'previous_{metric}'] = Sum(field, filter=Q(date=previous_month))
+    footprint = CarbonFootprint.objects.filter(
+        user=user, period_type='monthly', date__in=[current_month, previous_month],
+    ).aggregate(**aggregates)
+    
+    # The stored progress_percentage is only refreshed on save, so compute it here
+    decimal = DecimalField(max_digits=15, decimal_places=2)
+    goals = SustainabilityGoal.objects.filter(user=user, status='active').annotate(
+        progress=Case(
+            When(target_value__gt=0, then=Least(F('current_value') * 100 / F('target_value'), Value(100, output_field=decimal))),
+            default=Value(0, output_field=decimal),
+            output_field=decimal,
+        ),
+    ).values_list('id', 'name', 'target_value', 'current_value', 'unit', 'progress')
+    goals_progress = [
+        {
+            'id': goal_id,
+            'title': name,
+            'target_value': target_value,
+            'current_value': current_value,
+            'unit': unit,
+            'progress_percentage': progress,
+        }
+        for goal_id, name, target_value, current_value, unit, progress in goals
+    ]
+    
+    counts = User.objects.filter(pk=user.pk).annotate(
+        total_invoices_processed=_count_subquery(Invoice.objects.filter(status='processed')),
+        total_recommendations=_count_subquery(Recommendation.objects.all()),
+        total_simulations=_count_subquery(Simulation.objects.all()),
+    ).values('total_invoices_processed', 'total_recommendations', 'total_simulations').get()
+    
+    return {
+        'current_month': {
+            'carbon_footprint': footprint['current_carbon'] or 0,
+            'water_footprint': footprint['current_water'] or 0,
+            'energy_footprint': footprint['current_energy'] or 0,
+        },
+        'changes': {
+            f'{metric}_change': _percentage_change(footprint[f'current_{metric}'], footprint[f'previous_{metric}'])
+            for metric in MONTHLY_METRICS
+        },
+        'goals_progress': goals_progress,
+        'summary': counts,
+    }
+
+
+def get_dashboard(user) -> Dict:
+    """Return the user's dashboard, from the cache when it is still valid."""
+    key = dashboard_cache_key(user.pk)
+    data = cache.get(key)
+    if data is None:
+        data = build_dashboard(user)
+        cache.set(key, data, timeout=settings.ANALYTICS_DASHBOARD_CACHE_TIMEOUT)
+    return data
\ No newline at end of file
@@ -0,0 +1,74 @@
+"""
+Check analytics dashboard response times and query counts against targets.
+    
+    python manage.py benchmark_dashboard --user 12
+    python manage.py benchmark_dashboard --user 12 --max-cold-ms 150 --max-warm-ms 10
+"""
+
+import statistics
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from analytics.dashboard import dashboard_cache_key
+from analytics.views import AnalyticsDashboardView
+
+# Queries a cold dashboard may take: footprints, goals and cross-app counts
+DASHBOARD_QUERY_BUDGET = 3
+
+
+class Command(BaseCommand):
+    help = 'Measure cold and cached dashboard response times for a user'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, required=True, help='User id to render the dashboard for')
+        parser.add_argument('--iterations', type=int, default=50)
+        parser.add_argument('--max-cold-ms', type=float, default=200, help='p95 target without the cache')
+        parser.add_argument('--max-warm-ms', type=float, default=20, help='p95 target from the cache')
+    
+    def handle(self, *args, **options):
+        user = get_user_model().objects.filter(pk=options['user']).first()
+        if user is None:
+            raise CommandError(f"User {options['user']} does not exist")
+        
+        view = AnalyticsDashboardView.as_view()
+        factory = APIRequestFactory()
+        
+        def render():
+            request = factory.get('/api/analytics/')
+            force_authenticate(request, user=user)
+            started = time.perf_counter()
+            response = view(request)
+            elapsed = (time.perf_counter() - started) * 1000
+            if response.status_code != 200:
+                raise CommandError(f"Dashboard returned {response.status_code}: {response.data}")
+            return elapsed
+        
+        cold = []
+        warm = []
+        for _ in range(options['iterations']):
+            cache.delete(dashboard_cache_key(user.pk))
+            with CaptureQueriesContext(connection) as queries:
+                cold.append(render())
+            warm.append(render())
+        
+        failures = []
+        for label, samples, target in (('cold', cold, options['max_cold_ms']), ('cached', warm, options['max_warm_ms'])):
+            p95 = statistics.quantiles(samples, n=20)[-1] if len(samples) > 1 else samples[0]
+            self.stdout.write(f"{label:<8} median {statistics.median(samples):7.2f} ms  p95 {p95:7.2f} ms  (target {target} ms)")
+            if p95 > target:
+                failures.append(f"{label} p95 {p95:.2f} ms exceeds {target} ms")
+        
+        # Authentication is forced, so every captured query is the dashboard's own
+        self.stdout.write(f"cold queries {len(queries)} (budget {DASHBOARD_QUERY_BUDGET})")
+        if len(queries) > DASHBOARD_QUERY_BUDGET:
+            failures.append(f"{len(queries)} queries exceeds the budget of {DASHBOARD_QUERY_BUDGET}")
+        
+        if failures:
+            raise CommandError('; '.join(failures))
+        self.stdout.write(self.style.SUCCESS('Dashboard within targets'))
\ No newline at end of file
@@ -0,0 +1,161 @@
+"""
+Check that list and detail endpoints stay within a fixed number of queries.
+
+Each endpoint is requested against a small and a large synthetic dataset,
+seeded inside transactions that are rolled back. An endpoint fails when it
+exceeds its budget or when its query count grows with the data, which is
+what an N+1 looks like. Exits non-zero on failure, so it can gate CI.
+    
+    python manage.py check_query_budgets
+    python manage.py check_query_budgets --large 50
+"""
+
+from datetime import date, timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext, setup_test_environment, teardown_test_environment
+from django.urls import resolve, reverse
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from analytics.models import CarbonFootprint, EnvironmentalReport, MaterialBreakdown, SupplierBreakdown
+from invoices.models import Invoice, InvoiceItem, MaterialCategory, Supplier
+from recommendations.models import Recommendation
+from simulations.models import Simulation, SimulationParameter, SimulationResult
+
+# URL name, URL kwargs mapped to the seeded object whose pk they take, and the
+# query budget. Page-number lists spend one query on the count; keyset lists don't.
+ENDPOINT_BUDGETS = [
+    ('invoices:list', {}, 1),
+    ('invoices:detail', {'pk': 'invoice'}, 2),
+    ('invoices:items', {'invoice_id': 'invoice'}, 1),
+    ('invoices:materials', {}, 3),
+    ('invoices:suppliers', {}, 2),
+    ('analytics:carbon-footprint', {}, 2),
+    ('analytics:material-breakdown', {}, 2),
+    ('analytics:supplier-breakdown', {}, 2),
+    ('analytics:reports', {}, 2),
+    ('recommendations:recommendation-list', {}, 1),
+    ('recommendations:recommendation-detail', {'pk': 'recommendation'}, 1),
+    ('simulations:simulation-list', {}, 2),
+    ('simulations:simulation-detail', {'pk': 'simulation'}, 2),
+    ('simulations:simulation-results', {'pk': 'simulation'}, 1),
+]
+
+
+class Rollback(Exception):
+    """Raised to discard the seeded rows once the endpoints are measured."""
+
+
+class Command(BaseCommand):
+    help = 'Assert per-endpoint query budgets that do not grow with page size or nested rows'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--large', type=int, default=25, help='Rows per list and children per row in the large dataset')
+    
+    def handle(self, *args, **options):
+        # Lets the factory's 'testserver' host through ALLOWED_HOSTS, which
+        # paginated responses check when they build absolute links
+        setup_test_environment()
+        try:
+            small = self.measure(1)
+            large = self.measure(options['large'])
+        finally:
+            teardown_test_environment()
+        
+        failures = []
+        for name, _, budget in ENDPOINT_BUDGETS:
+            counts = (small[name], large[name])
+            ok = max(counts) <= budget and counts[0] == counts[1]
+            status = self.style.SUCCESS('ok') if ok else self.style.ERROR('FAIL')
+            self.stdout.write(f"{name:<40} {status}  queries {counts[0]} / {counts[1]}  (budget {budget})")
+            if not ok:
+                failures.append(name)
+        
+        if failures:
+            raise CommandError(f"Query budgets exceeded: {', '.join(failures)}")
+        self.stdout.write(self.style.SUCCESS('All endpoints within their query budgets'))
+    
+    def measure(self, size):
+        """Query count of every endpoint with `size` rows per list and children per row."""
+        factory = APIRequestFactory()
+        counts = {}
+        try:
+            with transaction.atomic():
+                user, objects = self.seed(size)
+                for name, targets, _ in ENDPOINT_BUDGETS:
+                    path = reverse(name, kwargs={kwarg: objects[target].pk for kwarg, target in targets.items()})
+                    match = resolve(path)
+                    request = factory.get(path)
+                    force_authenticate(request, user=user)
+                    with CaptureQueriesContext(connection) as queries:
+                        response = match.func(request, *match.args, **match.kwargs)
+                        response.render()
+                    if response.status_code != 200:
+                        raise CommandError(f"{name} returned {response.status_code}: {response.data}")
+                    counts[name] = len(queries)
+                raise Rollback
+        except Rollback:
+            pass
+        return counts
+    
+    def seed(self, size):
+        """Give a fresh user `size` rows in every listed model, each with `size` children."""
+        user = get_user_model().objects.create(username=f'query-budget-{size}', password='!')
+        
+        invoices = Invoice.objects.bulk_create([
+            Invoice(user=user, file=f'invoices/budget-{index}.txt', file_name=f'budget-{index}.txt',
+                    file_size=1024, file_type='text/plain', status='processed')
+            for index in range(size)
+        ])
+        InvoiceItem.objects.bulk_create([
+            InvoiceItem(invoice=invoice, description=f'Item {index}', material_type='paper')
+            for invoice in invoices
+            for index in range(size)
+        ])
+        
+        materials = MaterialCategory.objects.bulk_create([
+            MaterialCategory(name=f'query-budget-{size}-{index}') for index in range(size)
+        ])
+        for material in materials:
+            material.alternatives.set(materials)
+        Supplier.objects.bulk_create([Supplier(name=f'Supplier {index}') for index in range(size)])
+        
+        footprints = CarbonFootprint.objects.bulk_create([
+            CarbonFootprint(user=user, date=date(2000, 1, 1) + timedelta(days=index), period_type='daily')
+            for index in range(size)
+        ])
+        MaterialBreakdown.objects.bulk_create([
+            MaterialBreakdown(carbon_footprint=footprint, material_type=f'material-{index}')
+            for footprint in footprints
+            for index in range(size)
+        ])
+        SupplierBreakdown.objects.bulk_create([
+            SupplierBreakdown(carbon_footprint=footprint, supplier_name=f'Supplier {index}')
+            for footprint in footprints
+            for index in range(size)
+        ])
+        EnvironmentalReport.objects.bulk_create([
+            EnvironmentalReport(user=user, title=f'Report {index}', start_date='2000-01-01', end_date='2000-01-31')
+            for index in range(size)
+        ])
+        
+        recommendations = Recommendation.objects.bulk_create([
+            Recommendation(user=user, title=f'Recommendation {index}', description='', recommendation_type='material')
+            for index in range(size)
+        ])
+        
+        simulations = Simulation.objects.bulk_create([
+            Simulation(user=user, name=f'Simulation {index}', simulation_type='material_substitution')
+            for index in range(size)
+        ])
+        SimulationParameter.objects.bulk_create([
+            SimulationParameter(simulation=simulation, parameter_type='material', parameter_name=f'p{index}',
+                                original_value='plastic', new_value='paper')
+            for simulation in simulations
+            for index in range(size)
+        ])
+        SimulationResult.objects.create(simulation=simulations[0])
+        
+        return user, {'invoice': invoices[0], 'recommendation': recommendations[0], 'simulation': simulations[0]}
\ No newline at end of file
@@ -0,0 +1,177 @@
+"""
+Check that the hot per-user queries are planned on their indexes.
+
+Seeds a synthetic dataset inside a transaction that is rolled back, refreshes
+the planner statistics and inspects EXPLAIN output for each query shape.
+    
+    python manage.py check_query_plans
+    python manage.py check_query_plans --users 50 --invoices-per-user 400
+"""
+
+import random
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Sum
+
+from analytics.models import CarbonFootprint, SustainabilityGoal
+from invoices.models import Invoice, InvoiceItem
+from recommendations.models import Recommendation
+from simulations.models import Simulation
+
+MATERIALS = ['plastic', 'paper', 'steel', 'aluminum', 'glass', 'wood', 'cotton', 'unknown']
+
+
+class Rollback(Exception):
+    """Raised to discard the seeded rows once the plans are checked."""
+
+
+class Command(BaseCommand):
+    help = 'Assert that per-user time-range and status queries use their indexes'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=20)
+        parser.add_argument('--invoices-per-user', type=int, default=250)
+        parser.add_argument('--items-per-invoice', type=int, default=4)
+        parser.add_argument('--seed', type=int, default=0)
+    
+    def handle(self, *args, **options):
+        if connection.vendor not in ('sqlite', 'postgresql'):
+            raise CommandError(f"Query plan checks are not supported on {connection.vendor}")
+        
+        failures = []
+        try:
+            with transaction.atomic():
+                user = self.seed(options)
+                with connection.cursor() as cursor:
+                    cursor.execute('ANALYZE')
+                for label, queryset, indexes in self.query_shapes(user):
+                    plan = queryset.explain()
+                    used = [name for name in indexes if name in plan]
+                    status = self.style.SUCCESS('ok') if used else self.style.ERROR('MISSING')
+                    self.stdout.write(f"{label:<32} {status}  expected {' or '.join(indexes)}")
+                    if not used:
+                        failures.append(label)
+                        self.stdout.write(plan)
+                raise Rollback
+        except Rollback:
+            pass
+        
+        if failures:
+            raise CommandError(f"Queries not using their indexes: {', '.join(failures)}")
+        self.stdout.write(self.style.SUCCESS('All query shapes use their indexes'))
+    
+    def query_shapes(self, user):
+        """Representative queries of the views and services, with the indexes that should serve them."""
+        today = date.today()
+        items = InvoiceItem.objects.filter(invoice__user=user, invoice__status='processed')
+        first_invoice = Invoice.objects.filter(user=user).first()
+        return [
+            ('invoice list', Invoice.objects.filter(user=user).order_by('-created_at', '-id')[:20],
+             ['invoice_user_created_idx']),
+            ('invoice items page', InvoiceItem.objects.filter(invoice=first_invoice).order_by('-created_at', '-id')[:20],
+             ['invoiceitem_created_idx']),
+            ('invoices by status', Invoice.objects.filter(user=user, status='failed').order_by().values('id'),
+             ['invoice_user_status_idx']),
+            ('processed invoices', Invoice.objects.filter(user=user, status='processed').order_by().values('invoice_date'),
+             ['invoice_processed_idx', 'invoice_user_status_idx']),
+            ('material breakdown', items.order_by().values('material_type').annotate(carbon=Sum('carbon_footprint_kg')),
+             ['invoiceitem_created_idx']),
+            ('footprint range', CarbonFootprint.objects.filter(
+                user=user, period_type='daily', date__range=(today - timedelta(days=180), today),
+            ).order_by().values('date', 'total_carbon_kg'), ['footprint_user_period_idx']),
+            ('active goals', SustainabilityGoal.objects.filter(user=user, status='active').order_by(),
+             ['goal_user_status_idx']),
+            ('implemented recommendations', Recommendation.objects.filter(
+                user=user, is_implemented=True,
+            ).order_by('-created_at'), ['rec_implemented_idx']),
+            ('recommendation list', Recommendation.objects.filter(user=user).order_by('-created_at', '-id')[:20],
+             ['rec_user_created_idx']),
+            ('simulation list', Simulation.objects.filter(user=user).order_by('-created_at', '-id')[:20],
+             ['simulation_user_created_idx']),
+            ('open recommendations', Recommendation.objects.filter(
+                user=user, is_implemented=False, is_dismissed=False,
+            ).order_by('-created_at'), ['rec_open_idx']),
+        ]
+    
+    def seed(self, options):
+        """Bulk insert the synthetic dataset and return the user whose queries are checked."""
+        rng = random.Random(options['seed'])
+        User = get_user_model()
+        users = User.objects.bulk_create([
+            User(username=f'query-plan-{options["seed"]}-{index}', password='!')
+            for index in range(options['users'])
+        ])
+        if not users[0].pk:
+            # Backends without RETURNING leave the primary keys unset
+            users = list(User.objects.filter(username__startswith=f'query-plan-{options["seed"]}-').order_by('id'))
+        
+        today = date.today()
+        statuses = ['processed'] * 7 + ['uploaded', 'processing', 'failed']
+        invoices = [
+            Invoice(
+                user=user, file=f'invoices/plan-{user.pk}-{index}.txt', file_name=f'plan-{index}.txt',
+                file_size=1024, file_type='text/plain', status=rng.choice(statuses),
+                invoice_date=today - timedelta(days=rng.randrange(730)),
+            )
+            for user in users
+            for index in range(options['invoices_per_user'])
+        ]
+        Invoice.objects.bulk_create(invoices, batch_size=500)
+        invoice_ids = list(Invoice.objects.filter(user__in=users).values_list('id', flat=True))
+        
+        items = []
+        for invoice_id in invoice_ids:
+            for index in range(options['items_per_invoice']):
+                items.append(InvoiceItem(
+                    invoice_id=invoice_id, description=f'Item {index}', material_type=rng.choice(MATERIALS),
+                    weight_kg=Decimal('1.5'), carbon_footprint_kg=Decimal('2.5'),
+                ))
+            if len(items) >= 5000:
+                InvoiceItem.objects.bulk_create(items, batch_size=500)
+                items = []
+        InvoiceItem.objects.bulk_create(items, batch_size=500)
+        
+        footprints = []
+        for user in users:
+            for offset in range(365):
+                footprints.append(CarbonFootprint(user=user, date=today - timedelta(days=offset), period_type='daily'))
+            for offset in range(24):
+                footprints.append(CarbonFootprint(
+                    user=user, date=date(today.year - offset // 12, offset % 12 + 1, 1), period_type='monthly',
+                ))
+        CarbonFootprint.objects.bulk_create(footprints, batch_size=500)
+        
+        goal_statuses = ['active', 'achieved', 'overdue', 'cancelled']
+        SustainabilityGoal.objects.bulk_create([
+            SustainabilityGoal(
+                user=user, name=f'Goal {index}', goal_type='carbon_reduction', target_value=100, unit='kg',
+                start_date=today, target_date=today, status=rng.choice(goal_statuses),
+            )
+            for user in users
+            for index in range(20)
+        ], batch_size=500)
+        
+        Recommendation.objects.bulk_create([
+            Recommendation(
+                user=user, title=f'Recommendation {index}', description='', recommendation_type='material',
+                is_implemented=rng.random() < 0.3, is_dismissed=rng.random() < 0.2,
+            )
+            for user in users
+            for index in range(100)
+        ], batch_size=500)
+        
+        Simulation.objects.bulk_create([
+            Simulation(user=user, name=f'Simulation {index}', simulation_type='custom')
+            for user in users
+            for index in range(50)
+        ], batch_size=500)
+        
+        self.stdout.write(
+            f"Seeded {len(users)} users, {len(invoice_ids)} invoices, "
+            f"{len(invoice_ids) * options['items_per_invoice']} items"
+        )
+        return users[0]
\ No newline at end of file
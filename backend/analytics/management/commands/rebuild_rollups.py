@@ -0,0 +1,24 @@
+"""
+Recompute CarbonFootprint rollups and breakdowns from invoice items.
+    
+    python manage.py rebuild_rollups
+    python manage.py rebuild_rollups --user 12 --user 15
+"""
+
+from django.core.management.base import BaseCommand
+
+from analytics.rollups import rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = 'Rebuild daily, monthly and quarterly carbon footprint rollups from invoice items'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, action='append', dest='user_ids', help='Only rebuild this user (repeatable)')
+    
+    def handle(self, *args, **options):
+        counts = rebuild_rollups(options['user_ids'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt {counts['footprints']} footprints, {counts['materials']} material "
+            f"and {counts['suppliers']} supplier breakdowns"
+        ))
\ No newline at end of file
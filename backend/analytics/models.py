@@ -50,6 +50,10 @@ class CarbonFootprint(models.Model):
         verbose_name_plural = _('Carbon Footprints')
         unique_together = ['user', 'date', 'period_type']
         ordering = ['-date']
+        indexes = [
+            # Dashboard and trends read one period type over a date range
+            models.Index(fields=['user', 'period_type', 'date'], name='footprint_user_period_idx'),
+        ]
     
     def __str__(self):
         return f"{self.user.username} - {self.date} ({self.period_type})"
@@ -187,6 +191,9 @@ class SustainabilityGoal(models.Model):
         verbose_name = _('Sustainability Goal')
         verbose_name_plural = _('Sustainability Goals')
         ordering = ['-target_date']
+        indexes = [
+            models.Index(fields=['user', 'status'], name='goal_user_status_idx'),
+        ]
     
     def __str__(self):
         return f"{self.name} - {self.user.username}"
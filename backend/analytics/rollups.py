@@ -0,0 +1,311 @@
+"""
+Incremental CarbonFootprint rollups derived from invoice items.
+
+Every invoice contributes its items to the daily, monthly and quarterly
+CarbonFootprint rows of its date (the invoice date, or the upload date when
+the invoice has none), and to the MaterialBreakdown and SupplierBreakdown
+rows under them. When an invoice's items change, only the difference between
+its old and new contribution is applied, with F() updates, so history is
+never recomputed. ``rebuild_rollups`` recomputes everything for backfills.
+
+Percentages of total are left to readers; they change with every invoice.
+"""
+
+import logging
+from contextlib import contextmanager
+from datetime import date
+from decimal import Decimal
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from django.db import IntegrityError, transaction
+from django.db.models import DateField, F, Sum
+from django.db.models.functions import Coalesce, Trunc, TruncDate
+from django.utils import timezone
+
+from .dashboard import invalidate_dashboard
+from .models import CarbonFootprint, MaterialBreakdown, SupplierBreakdown
+from .trends import invalidate_trends
+from invoices.models import Invoice, InvoiceItem
+
+logger = logging.getLogger(__name__)
+
+# Period types kept up to date, and the Trunc kind that maps a day onto each
+ROLLUP_PERIODS = {
+    'daily': 'day',
+    'monthly': 'month',
+    'quarterly': 'quarter',
+}
+
+UNKNOWN_MATERIAL = 'unknown'
+UNKNOWN_SUPPLIER = 'Unknown'
+
+ZERO = Decimal('0')
+
+# Contribution keys:
+#   ('footprint', day)           -> [carbon, water, energy]
+#   ('material', day, material)  -> [weight, carbon, water, energy]
+#   ('supplier', day, supplier)  -> [spend, carbon, water, energy]
+Contribution = Dict[Tuple, List[Decimal]]
+
+
+def period_start(day: date, period_type: str) -> date:
+    """First day of the rollup period containing the given day."""
+    if period_type == 'monthly':
+        return day.replace(day=1)
+    if period_type == 'quarterly':
+        return day.replace(month=(day.month - 1) // 3 * 3 + 1, day=1)
+    return day
+
+
+def invoice_contribution(invoice_id: int) -> Contribution:
+    """Read what an invoice currently contributes to the rollups, straight from the database."""
+    invoice = Invoice.objects.filter(id=invoice_id).values(
+        'invoice_date', 'created_at', 'supplier_name', 'total_amount',
+    ).first()
+    if invoice is None:
+        return {}
+    
+    materials = list(InvoiceItem.objects.filter(invoice_id=invoice_id).values('material_type').annotate(
+        weight=Sum('weight_kg'),
+        carbon=Sum('carbon_footprint_kg'),
+        water=Sum('water_footprint_l'),
+        energy=Sum('energy_footprint_kwh'),
+    ))
+    if not materials:
+        # Invoices without items (unprocessed or failed) are not in the rollups
+        return {}
+    
+    day = invoice['invoice_date'] or timezone.localdate(invoice['created_at'])
+    supplier = invoice['supplier_name'] or UNKNOWN_SUPPLIER
+    totals = [ZERO, ZERO, ZERO]
+    contribution: Contribution = {}
+    for row in materials:
+        impact = [row['carbon'] or ZERO, row['water'] or ZERO, row['energy'] or ZERO]
+        values = [row['weight'] or ZERO] + impact
+        key = ('material', day, row['material_type'] or UNKNOWN_MATERIAL)
+        if key in contribution:
+            values = [a + b for a, b in zip(contribution[key], values)]
+        contribution[key] = values
+        totals = [total + value for total, value in zip(totals, impact)]
+    
+    contribution[('footprint', day)] = totals
+    contribution[('supplier', day, supplier)] = [invoice['total_amount'] or ZERO] + totals
+    return contribution
+
+
+def contribution_delta(old: Contribution, new: Contribution) -> Contribution:
+    """new - old, without the entries that didn't change."""
+    delta = {}
+    for key in old.keys() | new.keys():
+        before = old.get(key)
+        after = new.get(key)
+        if before is None:
+            values = after
+        elif after is None:
+            values = [-value for value in before]
+        else:
+            values = [a - b for a, b in zip(after, before)]
+        if any(values):
+            delta[key] = values
+    return delta
+
+
+def _add_to_row(model, lookup: Dict, deltas: Dict[str, Decimal]) -> None:
+    """Add deltas to the row matching ``lookup``, creating it on first use."""
+    increments = {field: F(field) + value for field, value in deltas.items()}
+    if model.objects.filter(**lookup).update(**increments):
+        return
+    try:
+        with transaction.atomic():
+            model.objects.create(**lookup, **deltas)
+    except IntegrityError:
+        # Another transaction created it first
+        model.objects.filter(**lookup).update(**increments)
+
+
+def apply_contribution(user_id: int, delta: Contribution) -> None:
+    """Add a contribution (or delta) to the user's rollup rows. Call inside a transaction."""
+    footprint_ids: Dict[Tuple[date, str], int] = {}
+    
+    for key, values in delta.items():
+        kind, day = key[0], key[1]
+        for period_type in ROLLUP_PERIODS:
+            footprint_key = (period_start(day, period_type), period_type)
+            if footprint_key not in footprint_ids:
+                footprint, _ = CarbonFootprint.objects.get_or_create(
+                    user_id=user_id, date=footprint_key[0], period_type=period_type,
+                )
+                footprint_ids[footprint_key] = footprint.id
+            footprint_id = footprint_ids[footprint_key]
+            
+            if kind == 'footprint':
+                carbon, water, energy = values
+                CarbonFootprint.objects.filter(id=footprint_id).update(
+                    total_carbon_kg=F('total_carbon_kg') + carbon,
+                    # Purchased goods are indirect (scope 3) emissions
+                    scope_3_kg=F('scope_3_kg') + carbon,
+                    water_footprint_l=F('water_footprint_l') + water,
+                    energy_footprint_kwh=F('energy_footprint_kwh') + energy,
+                )
+            elif kind == 'material':
+                weight, carbon, water, energy = values
+                _add_to_row(MaterialBreakdown, {'carbon_footprint_id': footprint_id, 'material_type': key[2]}, {
+                    'quantity_kg': weight,
+                    'carbon_footprint_kg': carbon,
+                    'water_footprint_l': water,
+                    'energy_footprint_kwh': energy,
+                })
+            else:
+                spend, carbon, water, energy = values
+                _add_to_row(SupplierBreakdown, {'carbon_footprint_id': footprint_id, 'supplier_name': key[2]}, {
+                    'total_spend_usd': spend,
+                    'carbon_footprint_kg': carbon,
+                    'water_footprint_l': water,
+                    'energy_footprint_kwh': energy,
+                })
+
+
+@contextmanager
+def track_invoice_rollups(invoice: Invoice) -> Iterator[None]:
+    """Apply the change in an invoice's contribution made inside the block.
+    
+    Use inside the transaction that rewrites the invoice and its items, so
+    the rollups commit or roll back together with them.
+    """
+    before = invoice_contribution(invoice.id)
+    yield
+    delta = contribution_delta(before, invoice_contribution(invoice.id))
+    if delta:
+        apply_contribution(invoice.user_id, delta)
+
+
+def remove_invoice_rollups(invoice: Invoice) -> None:
+    """Subtract an invoice's contribution, e.g. right before it is deleted."""
+    delta = contribution_delta(invoice_contribution(invoice.id), {})
+    if delta:
+        apply_contribution(invoice.user_id, delta)
+
+
+def _day_expression(prefix: str = ''):
+    """The rollup day of an invoice as a database expression."""
+    return Coalesce(f'{prefix}invoice_date', TruncDate(f'{prefix}created_at'), output_field=DateField())
+
+
+@transaction.atomic
+def rebuild_rollups(user_ids: Optional[List[int]] = None) -> Dict[str, int]:
+    """Recompute all rollups from invoice items with grouped aggregates and bulk writes.
+    
+    Existing CarbonFootprint rows keep their business metrics (revenue,
+    employees); their impact columns and breakdowns are replaced.
+    """
+    footprints = CarbonFootprint.objects.filter(period_type__in=ROLLUP_PERIODS)
+    items = InvoiceItem.objects.all()
+    invoices = Invoice.objects.filter(items__isnull=False).distinct()
+    if user_ids is not None:
+        footprints = footprints.filter(user_id__in=user_ids)
+        items = items.filter(invoice__user_id__in=user_ids)
+        invoices = invoices.filter(user_id__in=user_ids)
+    
+    MaterialBreakdown.objects.filter(carbon_footprint__in=footprints).delete()
+    SupplierBreakdown.objects.filter(carbon_footprint__in=footprints).delete()
+    footprints.update(
+        total_carbon_kg=0, scope_3_kg=0, water_footprint_l=0, energy_footprint_kwh=0,
+    )
+    
+    # Spend is per invoice, not per item
+    spend_by_invoice = dict(Invoice.objects.filter(id__in=invoices.values('id')).values_list('id', 'total_amount'))
+    
+    counts = {'footprints': 0, 'materials': 0, 'suppliers': 0}
+    for period_type, kind in ROLLUP_PERIODS.items():
+        period = Trunc(_day_expression('invoice__'), kind, output_field=DateField())
+        impact = {
+            'carbon': Sum('carbon_footprint_kg'),
+            'water': Sum('water_footprint_l'),
+            'energy': Sum('energy_footprint_kwh'),
+        }
+        
+        by_footprint = items.annotate(period=period).values('invoice__user_id', 'period').annotate(**impact)
+        by_material = items.annotate(period=period).values('invoice__user_id', 'period', 'material_type').annotate(
+            weight=Sum('weight_kg'), **impact,
+        )
+        by_invoice = items.annotate(period=period).values(
+            'invoice__user_id', 'period', 'invoice_id', 'invoice__supplier_name',
+        ).annotate(**impact)
+        
+        # Upsert the footprint rows of this period type
+        rows = {(row['invoice__user_id'], row['period']): row for row in by_footprint}
+        existing = {
+            (footprint.user_id, footprint.date): footprint
+            for footprint in CarbonFootprint.objects.filter(period_type=period_type, user_id__in={key[0] for key in rows})
+        }
+        to_create = []
+        to_update = []
+        for (user_id, day), row in rows.items():
+            footprint = existing.get((user_id, day)) or CarbonFootprint(user_id=user_id, date=day, period_type=period_type)
+            footprint.total_carbon_kg = footprint.scope_3_kg = row['carbon'] or ZERO
+            footprint.water_footprint_l = row['water'] or ZERO
+            footprint.energy_footprint_kwh = row['energy'] or ZERO
+            (to_update if footprint.pk else to_create).append(footprint)
+        CarbonFootprint.objects.bulk_create(to_create, batch_size=500)
+        CarbonFootprint.objects.bulk_update(
+            to_update, ['total_carbon_kg', 'scope_3_kg', 'water_footprint_l', 'energy_footprint_kwh'], batch_size=500,
+        )
+        counts['footprints'] += len(rows)
+        
+        footprint_ids = {
+            (footprint['user_id'], footprint['date']): footprint['id']
+            for footprint in CarbonFootprint.objects.filter(
+                period_type=period_type, user_id__in={key[0] for key in rows},
+            ).values('id', 'user_id', 'date')
+        }
+        
+        materials = [
+            MaterialBreakdown(
+                carbon_footprint_id=footprint_ids[(row['invoice__user_id'], row['period'])],
+                material_type=row['material_type'] or UNKNOWN_MATERIAL,
+                quantity_kg=row['weight'] or ZERO,
+                carbon_footprint_kg=row['carbon'] or ZERO,
+                water_footprint_l=row['water'] or ZERO,
+                energy_footprint_kwh=row['energy'] or ZERO,
+            )
+            for row in by_material
+        ]
+        MaterialBreakdown.objects.bulk_create(_merge_breakdowns(materials, 'material_type', 'quantity_kg'), batch_size=500)
+        counts['materials'] += len(materials)
+        
+        suppliers = [
+            SupplierBreakdown(
+                carbon_footprint_id=footprint_ids[(row['invoice__user_id'], row['period'])],
+                supplier_name=row['invoice__supplier_name'] or UNKNOWN_SUPPLIER,
+                total_spend_usd=spend_by_invoice.get(row['invoice_id']) or ZERO,
+                carbon_footprint_kg=row['carbon'] or ZERO,
+                water_footprint_l=row['water'] or ZERO,
+                energy_footprint_kwh=row['energy'] or ZERO,
+            )
+            for row in by_invoice
+        ]
+        suppliers = _merge_breakdowns(suppliers, 'supplier_name', 'total_spend_usd')
+        SupplierBreakdown.objects.bulk_create(suppliers, batch_size=500)
+        counts['suppliers'] += len(suppliers)
+    
+    logger.info(f"Rebuilt rollups: {counts}")
+    
+    # Bulk writes bypass the signal handlers that drop per-user caches
+    for user_id in footprints.order_by().values_list('user_id', flat=True).distinct():
+        invalidate_dashboard(user_id)
+        invalidate_trends(user_id)
+    return counts
+
+
+def _merge_breakdowns(rows: List, name_field: str, amount_field: str) -> List:
+    """Sum breakdown rows that share a footprint and name (e.g. "" and None both map to unknown)."""
+    merged = {}
+    for row in rows:
+        key = (row.carbon_footprint_id, getattr(row, name_field))
+        if key not in merged:
+            merged[key] = row
+            continue
+        target = merged[key]
+        for field in (amount_field, 'carbon_footprint_kg', 'water_footprint_l', 'energy_footprint_kwh'):
+            setattr(target, field, getattr(target, field) + getattr(row, field))
+    return list(merged.values())
\ No newline at end of file
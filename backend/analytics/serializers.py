@@ -8,23 +8,29 @@ class CarbonFootprintSerializer(serializers.ModelSerializer):
     class Meta:
         model = CarbonFootprint
         fields = [
-            'id', 'date', 'period_type', 'total_carbon_footprint', 'scope1_carbon',
-            'scope2_carbon', 'scope3_carbon', 'total_water_footprint', 'total_energy_footprint',
-            'total_waste_footprint', 'revenue', 'employees', 'carbon_intensity',
-            'created_at'
+            'id', 'date', 'period_type', 'total_carbon_kg', 'scope_1_kg',
+            'scope_2_kg', 'scope_3_kg', 'water_footprint_l', 'energy_footprint_kwh',
+            'waste_kg', 'revenue_usd', 'employees_count', 'carbon_intensity_kg_per_usd',
+            'carbon_intensity_kg_per_employee', 'created_at', 'updated_at'
+        ]
+        read_only_fields = [
+            'id', 'carbon_intensity_kg_per_usd', 'carbon_intensity_kg_per_employee', 'created_at', 'updated_at'
         ]
-        read_only_fields = ['id', 'created_at']
 
 
 class MaterialBreakdownSerializer(serializers.ModelSerializer):
     """Serializer for MaterialBreakdown model."""
     
+    # Views select_related the footprint for these
+    date = serializers.ReadOnlyField(source='carbon_footprint.date')
+    period_type = serializers.ReadOnlyField(source='carbon_footprint.period_type')
+    
     class Meta:
         model = MaterialBreakdown
         fields = [
-            'id', 'carbon_footprint', 'material_name', 'material_category',
-            'quantity', 'unit', 'carbon_footprint_value', 'water_footprint_value',
-            'energy_footprint_value', 'percentage_of_total'
+            'id', 'carbon_footprint', 'date', 'period_type', 'material_type', 'material_name',
+            'quantity_kg', 'carbon_footprint_kg', 'water_footprint_l',
+            'energy_footprint_kwh', 'percentage_of_total'
         ]
         read_only_fields = ['id']
 
@@ -32,12 +38,15 @@ class MaterialBreakdownSerializer(serializers.ModelSerializer):
 class SupplierBreakdownSerializer(serializers.ModelSerializer):
     """Serializer for SupplierBreakdown model."""
     
+    date = serializers.ReadOnlyField(source='carbon_footprint.date')
+    period_type = serializers.ReadOnlyField(source='carbon_footprint.period_type')
+    
     class Meta:
         model = SupplierBreakdown
         fields = [
-            'id', 'carbon_footprint', 'supplier_name', 'supplier_category',
-            'carbon_footprint_value', 'water_footprint_value', 'energy_footprint_value',
-            'percentage_of_total', 'sustainability_rating'
+            'id', 'carbon_footprint', 'date', 'period_type', 'supplier_name', 'supplier_id',
+            'total_spend_usd', 'carbon_footprint_kg', 'water_footprint_l', 'energy_footprint_kwh',
+            'percentage_of_total', 'supplier_sustainability_rating'
         ]
         read_only_fields = ['id']
 
@@ -48,10 +57,11 @@ class SustainabilityGoalSerializer(serializers.ModelSerializer):
     class Meta:
         model = SustainabilityGoal
         fields = [
-            'id', 'title', 'description', 'goal_type', 'target_value', 'current_value',
-            'unit', 'target_date', 'is_active', 'created_at', 'updated_at'
+            'id', 'name', 'description', 'goal_type', 'target_value', 'current_value',
+            'unit', 'start_date', 'target_date', 'achieved_date', 'status', 'progress_percentage',
+            'created_at', 'updated_at'
         ]
-        read_only_fields = ['id', 'created_at', 'updated_at']
+        read_only_fields = ['id', 'achieved_date', 'progress_percentage', 'created_at', 'updated_at']
 
 
 class EnvironmentalReportSerializer(serializers.ModelSerializer):
@@ -60,7 +70,7 @@ class EnvironmentalReportSerializer(serializers.ModelSerializer):
     class Meta:
         model = EnvironmentalReport
         fields = [
-            'id', 'title', 'report_type', 'period_start', 'period_end',
-            'report_data', 'generated_at'
+            'id', 'title', 'description', 'report_type', 'start_date', 'end_date',
+            'report_data', 'status', 'report_file', 'created_at', 'generated_at'
         ]
-        read_only_fields = ['id', 'generated_at'] 
\ No newline at end of file
+        read_only_fields = ['id', 'created_at', 'generated_at']
\ No newline at end of file
@@ -0,0 +1,51 @@
+"""
+Signal handlers keeping analytics in step with invoices.
+"""
+
+from django.db.models import QuerySet
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from .dashboard import invalidate_dashboard
+from .models import CarbonFootprint, SustainabilityGoal
+from .rollups import remove_invoice_rollups
+from .trends import invalidate_trends
+from invoices.models import Invoice
+from recommendations.models import Recommendation
+from simulations.models import Simulation
+
+
+@receiver(pre_delete, sender=Invoice)
+def remove_deleted_invoice_from_rollups(sender, instance, origin=None, **kwargs):
+    """Subtract a deleted invoice from the rollups, in the deleting transaction."""
+    origin_model = origin.model if isinstance(origin, QuerySet) else type(origin)
+    if origin is not None and origin_model is not Invoice:
+        # Cascading from the user: their rollups are deleted with them
+        return
+    remove_invoice_rollups(instance)
+
+
+@receiver(post_save, sender=Invoice)
+@receiver(post_delete, sender=Invoice)
+@receiver(post_save, sender=CarbonFootprint)
+@receiver(post_delete, sender=CarbonFootprint)
+@receiver(post_save, sender=SustainabilityGoal)
+@receiver(post_delete, sender=SustainabilityGoal)
+@receiver(post_save, sender=Recommendation)
+@receiver(post_delete, sender=Recommendation)
+@receiver(post_save, sender=Simulation)
+@receiver(post_delete, sender=Simulation)
+def invalidate_user_dashboard(sender, instance, **kwargs):
+    """Drop the owner's cached dashboard when anything it summarizes changes."""
+    # Rollup rows change through F() updates alongside invoice saves and deletes,
+    # which land here too
+    invalidate_dashboard(instance.user_id)
+
+
+@receiver(post_save, sender=Invoice)
+@receiver(post_delete, sender=Invoice)
+@receiver(post_save, sender=CarbonFootprint)
+@receiver(post_delete, sender=CarbonFootprint)
+def invalidate_user_trends(sender, instance, **kwargs):
+    """Retire the owner's trends ETags when their rollups may have changed."""
+    invalidate_trends(instance.user_id)
\ No newline at end of file
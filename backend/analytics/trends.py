@@ -0,0 +1,135 @@
+"""
+Environmental impact trends bucketed in the database from the daily rollups.
+"""
+
+import hashlib
+import uuid
+from datetime import date, timedelta
+from typing import Dict, List
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import DateField, Sum
+from django.db.models.functions import Trunc
+from django.utils.http import parse_etags
+
+from .models import CarbonFootprint
+
+# Bucket sizes accepted by the trends endpoint, as Trunc kinds
+GRANULARITIES = ('day', 'week', 'month', 'quarter')
+
+# Named ranges kept for existing clients, in days back from today
+RANGE_PRESETS = {
+    '30days': 30,
+    '90days': 90,
+    '6months': 180,
+    '1year': 365,
+    '2years': 730,
+}
+
+# Response series with the rollup column summed into each
+TREND_SERIES = {
+    'carbon': 'total_carbon_kg',
+    'water': 'water_footprint_l',
+    'energy': 'energy_footprint_kwh',
+}
+
+
+def bucket_start(day: date, granularity: str) -> date:
+    """First day of the bucket containing the given day, matching Trunc."""
+    if granularity == 'week':
+        return day - timedelta(days=day.weekday())
+    if granularity == 'month':
+        return day.replace(day=1)
+    if granularity == 'quarter':
+        return day.replace(month=(day.month - 1) // 3 * 3 + 1, day=1)
+    return day
+
+
+def next_bucket(start: date, granularity: str) -> date:
+    if granularity == 'day':
+        return start + timedelta(days=1)
+    if granularity == 'week':
+        return start + timedelta(days=7)
+    months = 3 if granularity == 'quarter' else 1
+    month = start.month - 1 + months
+    return start.replace(year=start.year + month // 12, month=month % 12 + 1, day=1)
+
+
+def bucket_dates(start: date, end: date, granularity: str) -> List[date]:
+    """Every bucket start overlapping [start, end], so empty buckets are kept."""
+    buckets = []
+    current = bucket_start(start, granularity)
+    while current <= end:
+        buckets.append(current)
+        current = next_bucket(current, granularity)
+    return buckets
+
+
+def bucket_count(start: date, end: date, granularity: str) -> int:
+    """Number of buckets bucket_dates would return, without building them."""
+    first = bucket_start(start, granularity)
+    if granularity == 'day':
+        return (end - first).days + 1
+    if granularity == 'week':
+        return (end - first).days // 7 + 1
+    months = (end.year - first.year) * 12 + end.month - first.month
+    return months // (3 if granularity == 'quarter' else 1) + 1
+
+
+def build_trends(user, start: date, end: date, granularity: str) -> Dict:
+    """Sum the user's daily rollups per bucket and return them as columns."""
+    totals = {series: Sum(field) for series, field in TREND_SERIES.items()}
+    rows = CarbonFootprint.objects.filter(
+        user=user, period_type='daily', date__range=(start, end),
+    ).annotate(
+        bucket=Trunc('date', granularity, output_field=DateField()),
+    ).order_by().values('bucket').annotate(**totals)
+    by_bucket = {row['bucket']: row for row in rows}
+    
+    buckets = bucket_dates(start, end, granularity)
+    trends = {
+        'granularity': granularity,
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        'dates': [bucket.isoformat() for bucket in buckets],
+    }
+    for series in TREND_SERIES:
+        trends[series] = [
+            float(by_bucket[bucket][series] or 0) if bucket in by_bucket else 0.0
+            for bucket in buckets
+        ]
+    return trends
+
+
+def _revision_key(user_id: int) -> str:
+    return f"analytics-trends-revision:{user_id}"
+
+
+def trends_revision(user_id: int) -> str:
+    """Opaque token that changes whenever the user's rollups may have changed."""
+    key = _revision_key(user_id)
+    revision = cache.get(key)
+    if revision is None:
+        # Lost or never set: start a new revision so stale ETags stop matching
+        revision = uuid.uuid4().hex
+        if not cache.add(key, revision, timeout=settings.ANALYTICS_TRENDS_REVISION_TIMEOUT):
+            revision = cache.get(key) or revision
+    return revision
+
+
+def invalidate_trends(user_id: int) -> None:
+    """Retire the user's trends ETags once the current transaction commits."""
+    transaction.on_commit(lambda: cache.delete(_revision_key(user_id)))
+
+
+def trends_etag(user_id: int, start: date, end: date, granularity: str) -> str:
+    token = f"{trends_revision(user_id)}:{start.isoformat()}:{end.isoformat()}:{granularity}"
+    return f'"{hashlib.md5(token.encode()).hexdigest()}"'
+
+
+def etag_matches(etag: str, if_none_match: str) -> bool:
+    """Whether an If-None-Match header names the ETag, comparing whole tags weakly (RFC 9110)."""
+    tags = parse_etags(if_none_match)
+    return '*' in tags or etag.removeprefix('W/') in (tag.removeprefix('W/') for tag in tags)
\ No newline at end of file
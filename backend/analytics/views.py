@@ -1,10 +1,13 @@
 from rest_framework import generics, permissions, status
 from rest_framework.response import Response
 from rest_framework.views import APIView
+from django.conf import settings
 from django.db.models import Sum, Avg, Count
 from django.utils import timezone
+from django.utils.dateparse import parse_date
 from datetime import timedelta
 
+from .dashboard import get_dashboard
 from .models import CarbonFootprint, MaterialBreakdown, SupplierBreakdown, SustainabilityGoal, EnvironmentalReport
 from .serializers import (
     CarbonFootprintSerializer,
@@ -13,6 +16,7 @@ from .serializers import (
     SustainabilityGoalSerializer,
     EnvironmentalReportSerializer
 )
+from .trends import GRANULARITIES, RANGE_PRESETS, bucket_count, build_trends, etag_matches, trends_etag
 
 
 class AnalyticsDashboardView(APIView):
@@ -20,87 +24,8 @@ class AnalyticsDashboardView(APIView):
     permission_classes = [permissions.IsAuthenticated]
     
     def get(self, request):
-        user = request.user
-        
-        # Get current month's data
-        current_month = timezone.now().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-        
-        # Carbon footprint summary
-        current_footprint = CarbonFootprint.objects.filter(
-            user=user,
-            date__gte=current_month
-        ).aggregate(
-            total_carbon=Sum('total_carbon_footprint'),
-            total_water=Sum('total_water_footprint'),
-            total_energy=Sum('total_energy_footprint')
-        )
-        
-        # Previous month for comparison
-        prev_month = current_month - timedelta(days=1)
-        prev_month = prev_month.replace(day=1)
-        
-        prev_footprint = CarbonFootprint.objects.filter(
-            user=user,
-            date__gte=prev_month,
-            date__lt=current_month
-        ).aggregate(
-            total_carbon=Sum('total_carbon_footprint'),
-            total_water=Sum('total_water_footprint'),
-            total_energy=Sum('total_energy_footprint')
-        )
-        
-        # Calculate percentage changes
-        carbon_change = 0
-        water_change = 0
-        energy_change = 0
-        
-        if prev_footprint['total_carbon'] and current_footprint['total_carbon']:
-            carbon_change = ((current_footprint['total_carbon'] - prev_footprint['total_carbon']) / prev_footprint['total_carbon']) * 100
-        
-        if prev_footprint['total_water'] and current_footprint['total_water']:
-            water_change = ((current_footprint['total_water'] - prev_footprint['total_water']) / prev_footprint['total_water']) * 100
-        
-        if prev_footprint['total_energy'] and current_footprint['total_energy']:
-            energy_change = ((current_footprint['total_energy'] - prev_footprint['total_energy']) / prev_footprint['total_energy']) * 100
-        
-        # Goals progress
-        active_goals = SustainabilityGoal.objects.filter(user=user, is_active=True)
-        goals_progress = []
-        
-        for goal in active_goals:
-            progress = {
-                'id': goal.id,
-                'title': goal.title,
-                'target_value': goal.target_value,
-                'current_value': goal.current_value or 0,
-                'unit': goal.unit,
-                'progress_percentage': 0
-            }
-            
-            if goal.target_value:
-                progress['progress_percentage'] = min((progress['current_value'] / goal.target_value) * 100, 100)
-            
-            goals_progress.append(progress)
-        
-        dashboard_data = {
-            'current_month': {
-                'carbon_footprint': current_footprint['total_carbon'] or 0,
-                'water_footprint': current_footprint['total_water'] or 0,
-                'energy_footprint': current_footprint['total_energy'] or 0,
-            },
-            'changes': {
-                'carbon_change': carbon_change,
-                'water_change': water_change,
-                'energy_change': energy_change,
-            },
-            'goals_progress': goals_progress,
-            'summary': {
-                'total_invoices_processed': 0,  # TODO: Get from invoices app
-                'total_recommendations': 0,     # TODO: Get from recommendations app
-                'total_simulations': 0,         # TODO: Get from simulations app
-            }
-        }
-        
+        # Cached per user, invalidated whenever the underlying data changes
+        dashboard_data = get_dashboard(request.user)
         return Response(dashboard_data, status=status.HTTP_200_OK)
 
 
@@ -122,7 +47,7 @@ class MaterialBreakdownView(generics.ListCreateAPIView):
     permission_classes = [permissions.IsAuthenticated]
     
     def get_queryset(self):
-        return MaterialBreakdown.objects.filter(carbon_footprint__user=self.request.user)
+        return MaterialBreakdown.objects.filter(carbon_footprint__user=self.request.user).select_related('carbon_footprint').order_by('-carbon_footprint__date', 'id')
 
 
 class SupplierBreakdownView(generics.ListCreateAPIView):
@@ -131,49 +56,64 @@ class SupplierBreakdownView(generics.ListCreateAPIView):
     permission_classes = [permissions.IsAuthenticated]
     
     def get_queryset(self):
-        return SupplierBreakdown.objects.filter(carbon_footprint__user=self.request.user)
+        return SupplierBreakdown.objects.filter(carbon_footprint__user=self.request.user).select_related('carbon_footprint').order_by('-carbon_footprint__date', 'id')
 
 
 class TrendsView(APIView):
-    """View for environmental impact trends."""
+    """View for environmental impact trends.
+    
+    Query parameters:
+        granularity: day, week, month (default) or quarter
+        start, end: ISO dates bounding the range (end defaults to today)
+        period: named range used when start is not given (default 6months)
+    """
     permission_classes = [permissions.IsAuthenticated]
     
     def get(self, request):
-        user = request.user
-        period = request.GET.get('period', '6months')  # 6months, 1year, 2years
-        
-        # Calculate date range
-        end_date = timezone.now()
-        if period == '6months':
-            start_date = end_date - timedelta(days=180)
-        elif period == '1year':
-            start_date = end_date - timedelta(days=365)
-        elif period == '2years':
-            start_date = end_date - timedelta(days=730)
+        granularity = request.GET.get('granularity', 'month')
+        if granularity not in GRANULARITIES:
+            return Response({
+                'error': f"granularity must be one of: {', '.join(GRANULARITIES)}"
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        try:
+            end_date = parse_date(request.GET['end']) if 'end' in request.GET else timezone.localdate()
+            start_date = parse_date(request.GET['start']) if 'start' in request.GET else None
+        except ValueError:
+            end_date = start_date = None
+        if end_date is None or ('start' in request.GET and start_date is None):
+            return Response({'error': 'start and end must be dates in YYYY-MM-DD format'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        
+        period = None
+        if start_date is None:
+            period = request.GET.get('period', '6months')
+            if period not in RANGE_PRESETS:
+                return Response({
+                    'error': f"period must be one of: {', '.join(RANGE_PRESETS)}"
+                }, status=status.HTTP_400_BAD_REQUEST)
+            start_date = end_date - timedelta(days=RANGE_PRESETS[period])
+        
+        if start_date > end_date:
+            return Response({'error': 'start must not be after end'}, status=status.HTTP_400_BAD_REQUEST)
+        if bucket_count(start_date, end_date, granularity) > settings.ANALYTICS_TRENDS_MAX_BUCKETS:
+            return Response({
+                'error': f"Range too large for {granularity} granularity "
+                         f"(at most {settings.ANALYTICS_TRENDS_MAX_BUCKETS} buckets)"
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        # Polling clients revalidate without touching the database
+        etag = trends_etag(request.user.id, start_date, end_date, granularity)
+        if etag_matches(etag, request.headers.get('If-None-Match', '')):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
         else:
-            start_date = end_date - timedelta(days=180)
-        
-        # Get monthly data
-        footprints = CarbonFootprint.objects.filter(
-            user=user,
-            date__gte=start_date,
-            date__lte=end_date
-        ).order_by('date')
-        
-        trends_data = []
-        for footprint in footprints:
-            trends_data.append({
-                'date': footprint.date.strftime('%Y-%m'),
-                'carbon_footprint': float(footprint.total_carbon_footprint or 0),
-                'water_footprint': float(footprint.total_water_footprint or 0),
-                'energy_footprint': float(footprint.total_energy_footprint or 0),
-                'carbon_intensity': float(footprint.carbon_intensity or 0),
-            })
-        
-        return Response({
-            'period': period,
-            'trends': trends_data
-        }, status=status.HTTP_200_OK)
+            trends = build_trends(request.user, start_date, end_date, granularity)
+            if period:
+                trends['period'] = period
+            response = Response(trends, status=status.HTTP_200_OK)
+        response['ETag'] = etag
+        response['Cache-Control'] = 'private, no-cache'
+        return response
 
 
 class ReportsView(generics.ListCreateAPIView):
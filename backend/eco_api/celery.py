@@ -0,0 +1,22 @@
+"""
+Celery application for eco_api background jobs.
+"""
+
+import os
+
+from celery import Celery
+from celery.signals import worker_init
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'eco_api.settings')
+
+app = Celery('eco_api')
+app.config_from_object('django.conf:settings', namespace='CELERY')
+app.autodiscover_tasks()
+
+
+@worker_init.connect
+def warm_up_nlp_models(**kwargs):
+    """Load NLP models in the parent worker before the pool forks its children."""
+    from nlp_module.registry import warm_up
+    
+    warm_up()
\ No newline at end of file
@@ -0,0 +1,91 @@
+"""
+Keyset pagination for large, append-mostly histories.
+"""
+
+import base64
+from collections import OrderedDict
+from datetime import datetime
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """Newest-first pages keyed on (created_at, id).
+    
+    Each page filters past the last row of the previous one instead of using
+    OFFSET, and no COUNT(*) is issued, so deep pages cost the same as the
+    first. The cursor is opaque to clients; follow the `next` link.
+    """
+    page_size = api_settings.PAGE_SIZE
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Invalid cursor'
+    
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        page_size = self.get_page_size(request)
+        
+        cursor = self.decode_cursor(request)
+        if cursor is not None:
+            created_at, pk = cursor
+            queryset = queryset.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, pk__lt=pk))
+        
+        # One extra row tells whether there is a next page
+        rows = list(queryset.order_by('-created_at', '-pk')[:page_size + 1])
+        page = rows[:page_size]
+        self.next_cursor = self.encode_cursor(page[-1]) if len(rows) > page_size else None
+        return page
+    
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return min(max(size, 1), self.max_page_size)
+    
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            created_at, pk = base64.urlsafe_b64decode(encoded.encode('ascii')).decode('ascii').split('|')
+            return datetime.fromisoformat(created_at), int(pk)
+        except (TypeError, ValueError, UnicodeError):
+            raise NotFound(self.invalid_cursor_message)
+    
+    def encode_cursor(self, row) -> str:
+        position = f"{row.created_at.isoformat()}|{row.pk}"
+        return base64.urlsafe_b64encode(position.encode('ascii')).decode('ascii')
+    
+    def get_next_link(self):
+        if self.next_cursor is None:
+            return None
+        return replace_query_param(self.base_url, self.cursor_query_param, self.next_cursor)
+    
+    def get_first_link(self):
+        return remove_query_param(self.base_url, self.cursor_query_param)
+    
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('first', self.get_first_link()),
+            ('results', data),
+        ]))
+    
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'first': {'type': 'string', 'format': 'uri'},
+                'results': schema,
+            },
+        }
\ No newline at end of file
@@ -0,0 +1,45 @@
+"""
+Serializer helpers shared by the API apps.
+"""
+
+from typing import List, Optional, Set
+
+
+class SelectableFieldsMixin:
+    """Lets clients trim a serializer's output with ?fields=a,b,c.
+    
+    Views use only_fields() so the columns behind dropped fields are not
+    loaded either. Unknown names are ignored; `id` is always returned.
+    """
+    fields_query_param = 'fields'
+    always_included = ('id',)
+    
+    @classmethod
+    def requested_fields(cls, request) -> Optional[Set[str]]:
+        value = request.query_params.get(cls.fields_query_param) if request is not None else None
+        if not value:
+            return None
+        names = {name.strip() for name in value.split(',') if name.strip()}
+        return (names & set(cls.Meta.fields)) | set(cls.always_included)
+    
+    @classmethod
+    def selected_fields(cls, request) -> List[str]:
+        requested = cls.requested_fields(request)
+        return [name for name in cls.Meta.fields if requested is None or name in requested]
+    
+    @classmethod
+    def only_fields(cls, request, *extra: str) -> List[str]:
+        """Model columns read by the selected fields, for QuerySet.only()."""
+        columns = {field.name for field in cls.Meta.model._meta.concrete_fields}
+        return [name for name in cls.selected_fields(request) if name in columns] + list(extra)
+    
+    def get_fields(self):
+        fields = super().get_fields()
+        # Only the top-level serializer is trimmed, not the same class nested elsewhere
+        if self.root is not self and getattr(self.root, 'child', None) is not self:
+            return fields
+        requested = self.requested_fields(self.context.get('request'))
+        if requested is not None:
+            for name in set(fields) - requested:
+                fields.pop(name)
+        return fields
\ No newline at end of file
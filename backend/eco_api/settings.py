@@ -164,12 +164,121 @@ CORS_ALLOWED_ORIGINS = [
 CORS_ALLOW_CREDENTIALS = True
 
 # Celery Configuration
-CELERY_BROKER_URL = config('REDIS_URL', default='redis://localhost:6379/0')
-CELERY_RESULT_BACKEND = config('REDIS_URL', default='redis://localhost:6379/0')
+REDIS_URL = config('REDIS_URL', default='redis://localhost:6379/0')
+CELERY_BROKER_URL = config('CELERY_BROKER_URL', default=REDIS_URL)
+CELERY_RESULT_BACKEND = config('CELERY_RESULT_BACKEND', default=REDIS_URL)
 CELERY_ACCEPT_CONTENT = ['json']
 CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = TIME_ZONE
+# Run tasks inline without a broker (tests, local development without Redis)
+CELERY_TASK_ALWAYS_EAGER = config('CELERY_TASK_ALWAYS_EAGER', default=False, cast=bool)
+CELERY_TASK_EAGER_PROPAGATES = True
+# Concurrency limits: NLP tasks are CPU and memory heavy, don't let workers hoard them
+CELERY_WORKER_CONCURRENCY = config('CELERY_WORKER_CONCURRENCY', default=2, cast=int)
+CELERY_WORKER_PREFETCH_MULTIPLIER = 1
+CELERY_TASK_ACKS_LATE = True
+# Task modules outside INSTALLED_APPS, which autodiscovery doesn't reach
+CELERY_IMPORTS = ['nlp_module.tasks']
+INVOICE_PROCESSING_RATE_LIMIT = config('INVOICE_PROCESSING_RATE_LIMIT', default='60/m')
+
+# Cache (shared across workers in production so result caching works everywhere)
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    } if DEBUG else {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': config('CACHE_URL', default=REDIS_URL),
+    }
+}
+
+# Invoice processing results are cached by content hash, code and factor versions
+INVOICE_RESULT_CACHE_TIMEOUT = config('INVOICE_RESULT_CACHE_TIMEOUT', default=7 * 24 * 3600, cast=int)
+
+# How often each process checks for MaterialCategory changes, i.e. the longest
+# a worker may keep scoring with outdated material factors
+FACTOR_TABLE_REFRESH_SECONDS = config('FACTOR_TABLE_REFRESH_SECONDS', default=30, cast=int)
+
+# Per-user analytics dashboard cache; entries are also dropped on every relevant write
+ANALYTICS_DASHBOARD_CACHE_TIMEOUT = config('ANALYTICS_DASHBOARD_CACHE_TIMEOUT', default=300, cast=int)
+
+# Trends: upper bound on buckets per response, and how long an unchanged ETag revision is kept
+ANALYTICS_TRENDS_MAX_BUCKETS = config('ANALYTICS_TRENDS_MAX_BUCKETS', default=1000, cast=int)
+ANALYTICS_TRENDS_REVISION_TIMEOUT = config('ANALYTICS_TRENDS_REVISION_TIMEOUT', default=86400, cast=int)
+
+# Extracted invoice items are written with bulk INSERTs of this many rows
+INVOICE_ITEM_BULK_BATCH_SIZE = config('INVOICE_ITEM_BULK_BATCH_SIZE', default=500, cast=int)
+
+# Files at least this large are streamed line by line with bounded memory
+# instead of being processed in memory with the rest of their batch
+INVOICE_STREAMING_MIN_FILE_SIZE = config('INVOICE_STREAMING_MIN_FILE_SIZE', default=2 * 1024 * 1024, cast=int)
+INVOICE_STREAM_CHUNK_SIZE = config('INVOICE_STREAM_CHUNK_SIZE', default=1000, cast=int)
+# Results with more items than this are not cached
+INVOICE_RESULT_CACHE_MAX_ITEMS = config('INVOICE_RESULT_CACHE_MAX_ITEMS', default=5000, cast=int)
+# Characters of extracted text kept on Invoice.extracted_text
+INVOICE_TEXT_PREVIEW_CHARS = config('INVOICE_TEXT_PREVIEW_CHARS', default=10_000, cast=int)
+
+# Uploaded invoice files are hashed as they stream in
+FILE_UPLOAD_HANDLERS = [
+    'invoices.hashing.HashingMemoryFileUploadHandler',
+    'invoices.hashing.HashingTemporaryFileUploadHandler',
+]
+
+# Bulk invoice upload
+INVOICE_BATCH_MAX_FILES = config('INVOICE_BATCH_MAX_FILES', default=5000, cast=int)
+INVOICE_BATCH_CHUNK_SIZE = config('INVOICE_BATCH_CHUNK_SIZE', default=50, cast=int)
+# Zip archives: limit on both the upload and its total uncompressed size, and the highest
+# compression ratio any member may have, so a small archive can't expand into a huge batch
+INVOICE_BATCH_MAX_ARCHIVE_BYTES = config('INVOICE_BATCH_MAX_ARCHIVE_BYTES', default=1024 * 1024 * 1024, cast=int)
+INVOICE_BATCH_MAX_COMPRESSION_RATIO = config('INVOICE_BATCH_MAX_COMPRESSION_RATIO', default=100, cast=int)
+
+# What-if simulations: carbon avoided per kWh of energy saved, and the share of a
+# purchased good's carbon attributed to its supplier's own energy use
+SIMULATION_GRID_CARBON_KG_PER_KWH = config('SIMULATION_GRID_CARBON_KG_PER_KWH', default=0.4, cast=float)
+SIMULATION_SUPPLIER_ENERGY_CARBON_SHARE = config('SIMULATION_SUPPLIER_ENERGY_CARBON_SHARE', default=0.3, cast=float)
+# Monte Carlo mode: log-normal sigma of material factors and quantities, draw limits,
+# and the relative 95% interval half-width at which sampling stops early
+SIMULATION_FACTOR_UNCERTAINTY = config('SIMULATION_FACTOR_UNCERTAINTY', default=0.2, cast=float)
+SIMULATION_QUANTITY_UNCERTAINTY = config('SIMULATION_QUANTITY_UNCERTAINTY', default=0.1, cast=float)
+SIMULATION_MONTE_CARLO_DEFAULT_DRAWS = config('SIMULATION_MONTE_CARLO_DEFAULT_DRAWS', default=10_000, cast=int)
+SIMULATION_MONTE_CARLO_MAX_DRAWS = config('SIMULATION_MONTE_CARLO_MAX_DRAWS', default=100_000, cast=int)
+SIMULATION_MONTE_CARLO_BATCH_SIZE = config('SIMULATION_MONTE_CARLO_BATCH_SIZE', default=5_000, cast=int)
+SIMULATION_MONTE_CARLO_TOLERANCE = config('SIMULATION_MONTE_CARLO_TOLERANCE', default=0.002, cast=float)
+# Parameter sweeps: scenarios evaluated per request, and how many of them may be saved
+SIMULATION_SWEEP_MAX_SCENARIOS = config('SIMULATION_SWEEP_MAX_SCENARIOS', default=1000, cast=int)
+SIMULATION_SWEEP_MAX_PERSISTED = config('SIMULATION_SWEEP_MAX_PERSISTED', default=10, cast=int)
+# Background simulation jobs: concurrent jobs per user, after how long a job that stopped
+# reporting no longer counts, and how long (and how often) result requests may long-poll.
+# A long-poll holds one of gunicorn's sync workers the whole time, so keep it to a few seconds
+SIMULATION_MAX_ACTIVE_PER_USER = config('SIMULATION_MAX_ACTIVE_PER_USER', default=2, cast=int)
+SIMULATION_JOB_STALE_SECONDS = config('SIMULATION_JOB_STALE_SECONDS', default=1800, cast=int)
+SIMULATION_RESULTS_MAX_WAIT = config('SIMULATION_RESULTS_MAX_WAIT', default=5, cast=float)
+SIMULATION_RESULTS_POLL_INTERVAL = config('SIMULATION_RESULTS_POLL_INTERVAL', default=0.5, cast=float)
+# Baseline snapshots kept per process (count and total array bytes), and how long the
+# invoice revisions that retire them live in the shared cache
+SIMULATION_BASELINE_CACHE_MAX_ENTRIES = config('SIMULATION_BASELINE_CACHE_MAX_ENTRIES', default=64, cast=int)
+SIMULATION_BASELINE_CACHE_MAX_BYTES = config('SIMULATION_BASELINE_CACHE_MAX_BYTES', default=256 * 1024 * 1024, cast=int)
+SIMULATION_BASELINE_REVISION_TIMEOUT = config('SIMULATION_BASELINE_REVISION_TIMEOUT', default=86400, cast=int)
+
+# NLP models (loaded once per process, see nlp_module.registry)
+NLP_SPACY_MODEL = config('NLP_SPACY_MODEL', default='en_core_web_sm')
+NLP_CLASSIFIER_MODEL = config('NLP_CLASSIFIER_MODEL', default='distilbert-base-uncased')
+# Batching for spaCy nlp.pipe; keep n_process at 1 inside Celery prefork workers,
+# which are daemonic and cannot start child processes
+NLP_PIPE_BATCH_SIZE = config('NLP_PIPE_BATCH_SIZE', default=256, cast=int)
+NLP_PIPE_N_PROCESS = config('NLP_PIPE_N_PROCESS', default=1, cast=int)
+NLP_PRELOAD_MODELS = config('NLP_PRELOAD_MODELS', default='spacy,classifier', cast=lambda v: [s.strip() for s in v.split(',') if s.strip()])
+
+# PDF/image text extraction (see nlp_module.text_extraction). Pages are spread
+# over a process pool outside Celery prefork workers. Inside them, pages go out
+# as subtasks on TEXT_EXTRACTION_QUEUE when it is set, or are read sequentially.
+# That queue needs workers of its own (celery worker -Q text_extraction), never the
+# ones processing invoices, which block waiting for the pages
+TEXT_EXTRACTION_TIMEOUT = config('TEXT_EXTRACTION_TIMEOUT', default=120, cast=int)
+TEXT_EXTRACTION_WORKERS = config('TEXT_EXTRACTION_WORKERS', default=None, cast=lambda v: int(v) if v else None)
+TEXT_EXTRACTION_PAGES_PER_TASK = config('TEXT_EXTRACTION_PAGES_PER_TASK', default=4, cast=int)
+TEXT_EXTRACTION_QUEUE = config('TEXT_EXTRACTION_QUEUE', default='')
+TEXT_EXTRACTION_CACHE_DIR = config('TEXT_EXTRACTION_CACHE_DIR', default=os.path.join(MEDIA_ROOT, 'text_cache'))
 
 # AWS S3 Configuration (for production)
 if not DEBUG:
@@ -188,6 +297,7 @@ if not DEBUG:
 # File upload settings
 FILE_UPLOAD_MAX_MEMORY_SIZE = 10 * 1024 * 1024  # 10MB
 DATA_UPLOAD_MAX_MEMORY_SIZE = 10 * 1024 * 1024  # 10MB
+DATA_UPLOAD_MAX_NUMBER_FILES = config('DATA_UPLOAD_MAX_NUMBER_FILES', default=1000, cast=int)
 
 # Logging
 LOGGING = {
@@ -0,0 +1,22 @@
+"""
+Gunicorn configuration for eco_api.
+
+The application and its NLP models are loaded in the master process before
+workers are forked, so every worker shares the model pages copy-on-write
+instead of loading its own copy.
+"""
+
+import gc
+
+preload_app = True
+
+
+def when_ready(server):
+    """Warm up NLP models in the master, right before workers are forked."""
+    from nlp_module.registry import warm_up
+    
+    warm_up()
+    # Move everything loaded so far out of the GC's reach so collections in
+    # the workers don't touch (and therefore copy) the shared pages
+    gc.freeze()
+    server.log.info("NLP models loaded in master process")
\ No newline at end of file
@@ -0,0 +1,13 @@
+from django.contrib import admin
+
+from .models import MaterialCategory
+
+
+@admin.register(MaterialCategory)
+class MaterialCategoryAdmin(admin.ModelAdmin):
+    list_display = [
+        'name', 'carbon_factor_kg_co2_per_kg', 'water_factor_l_per_kg',
+        'energy_factor_kwh_per_kg', 'sustainability_rating', 'updated_at',
+    ]
+    search_fields = ['name']
+    filter_horizontal = ['alternatives']
\ No newline at end of file
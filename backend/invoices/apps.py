@@ -0,0 +1,15 @@
+from django.apps import AppConfig
+
+
+class InvoicesConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'invoices'
+    
+    def ready(self):
+        from nlp_module.invoice_processor import set_factor_table_provider
+        
+        from . import signals  # noqa: F401
+        from .factor_table import get_factor_table
+        
+        # Score invoices with the MaterialCategory table instead of the built-in factors
+        set_factor_table_provider(get_factor_table)
\ No newline at end of file
@@ -0,0 +1,156 @@
+"""
+Bulk invoice upload: stream many files (or a zip archive) to storage and
+create their Invoice rows in one go.
+"""
+
+import logging
+import mimetypes
+import os
+import zipfile
+import zlib
+from typing import Iterator, List, Optional, Tuple
+
+from django.conf import settings
+from django.core.files import File
+from django.db import transaction
+from django.db.models import Count, Q
+from rest_framework import serializers
+
+from .hashing import HashingReader, file_content_hash
+from .models import Invoice, InvoiceBatch
+from .serializers import validate_invoice_file
+from .statistics import record_new_invoices
+from .tasks import enqueue_invoice_batch
+
+logger = logging.getLogger(__name__)
+
+
+# Raised while reading a damaged archive member
+ARCHIVE_MEMBER_ERRORS = (zipfile.BadZipFile, OSError, EOFError, zlib.error)
+
+
+class ArchiveMember:
+    """Reader of one zip member that records corruption instead of raising it.
+    
+    A member that turns out to be damaged partway through just ends, so
+    storage finishes writing it and the caller can delete it by name.
+    The member is only opened once read.
+    """
+    
+    def __init__(self, zf: zipfile.ZipFile, info: zipfile.ZipInfo):
+        self._zf = zf
+        self._info = info
+        self._member = None
+        self.error = None
+    
+    def read(self, size=-1):
+        if self.error is not None:
+            return b''
+        try:
+            if self._member is None:
+                self._member = self._zf.open(self._info)
+            return self._member.read(size)
+        except ARCHIVE_MEMBER_ERRORS as e:
+            self.error = e
+            return b''
+    
+    def close(self):
+        if self._member is not None:
+            self._member.close()
+
+
+def _iter_archive_members(archive) -> Iterator[Tuple[str, int, str, object]]:
+    """Yield (name, size, content_type, ArchiveMember) for every file in a zip archive."""
+    with zipfile.ZipFile(archive) as zf:
+        for info in zf.infolist():
+            if info.is_dir():
+                continue
+            name = os.path.basename(info.filename)
+            # Skip hidden files and OS metadata (e.g. __MACOSX/._foo.pdf)
+            if not name or name.startswith('.') or info.filename.startswith('__MACOSX/'):
+                continue
+            content_type = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+            member = ArchiveMember(zf, info)
+            try:
+                yield name, info.file_size, content_type, member
+            finally:
+                member.close()
+
+
+def _iter_uploads(files, archive) -> Iterator[Tuple[str, int, str, object]]:
+    """Yield (name, size, content_type, file) for every uploaded invoice file."""
+    for upload in files or []:
+        yield upload.name, upload.size, upload.content_type, upload
+    if archive is not None:
+        yield from _iter_archive_members(archive)
+
+
+def create_invoice_batch(user, files: Optional[List] = None, archive=None) -> InvoiceBatch:
+    """Store every uploaded file, create their invoices in bulk and queue processing.
+    
+    Damaged archive members are rejected one by one; if creating the batch
+    fails, every file stored for it is deleted again.
+    """
+    max_files = settings.INVOICE_BATCH_MAX_FILES
+    file_field = Invoice._meta.get_field('file')
+    storage = file_field.storage
+    
+    invoices = []
+    rejected = []
+    try:
+        for name, size, content_type, fileobj in _iter_uploads(files, archive):
+            if len(invoices) >= max_files:
+                rejected.append({'file_name': name, 'error': f'Batch is limited to {max_files} files'})
+                continue
+            
+            try:
+                validate_invoice_file(size, content_type)
+            except serializers.ValidationError as e:
+                rejected.append({'file_name': name, 'error': ' '.join(str(d) for d in e.detail)})
+                continue
+            
+            # Storage backends copy the file in chunks, so nothing is held in memory;
+            # archive members are hashed on the way through
+            reader = fileobj if hasattr(fileobj, 'content_hash') else HashingReader(fileobj)
+            stored_name = storage.save(file_field.generate_filename(None, name), File(reader, name=name))
+            if getattr(fileobj, 'error', None) is not None:
+                storage.delete(stored_name)
+                rejected.append({'file_name': name, 'error': f'Damaged archive member: {fileobj.error}'})
+                continue
+            invoices.append(Invoice(
+                user=user,
+                file=stored_name,
+                file_name=name,
+                file_size=size,
+                file_type=content_type,
+                content_hash=file_content_hash(fileobj) if reader is fileobj else reader.hexdigest(),
+            ))
+        
+        with transaction.atomic():
+            batch = InvoiceBatch.objects.create(user=user, total_files=len(invoices), rejected_files=rejected)
+            for invoice in invoices:
+                invoice.batch = batch
+            Invoice.objects.bulk_create(invoices, batch_size=settings.INVOICE_BATCH_CHUNK_SIZE)
+            # bulk_create skips the post_save handler that counts single uploads
+            record_new_invoices(user.id, len(invoices))
+            
+            invoice_ids = list(batch.invoices.order_by('id').values_list('id', flat=True))
+            enqueue_invoice_batch(invoice_ids)
+    except Exception:
+        # No invoice refers to the stored files
+        for invoice in invoices:
+            storage.delete(invoice.file.name)
+        raise
+    
+    logger.info(f"Created invoice batch {batch.id} with {len(invoices)} files ({len(rejected)} rejected)")
+    return batch
+
+
+def get_batch_with_progress(batch_id: int, user) -> Optional[InvoiceBatch]:
+    """Return the batch annotated with per-status invoice counts."""
+    return InvoiceBatch.objects.filter(id=batch_id, user=user).annotate(
+        uploaded=Count('invoices', filter=Q(invoices__status='uploaded')),
+        processing=Count('invoices', filter=Q(invoices__status='processing')),
+        processed=Count('invoices', filter=Q(invoices__status='processed')),
+        failed=Count('invoices', filter=Q(invoices__status='failed')),
+    ).first()
\ No newline at end of file
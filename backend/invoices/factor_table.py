@@ -0,0 +1,109 @@
+"""
+Material factor table backed by MaterialCategory.
+
+Each process keeps one immutable snapshot of the table in memory, so item
+scoring never touches the database. Changes to MaterialCategory bump a
+revision counter in the shared cache; processes compare it at most every
+FACTOR_TABLE_REFRESH_SECONDS and reload when it moved, which bounds how long
+any worker keeps scoring with outdated factors.
+"""
+
+import logging
+import threading
+import time
+from typing import Dict, List, Optional
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DatabaseError
+
+from .models import MaterialCategory
+from nlp_module.factor_table import DEFAULT_FACTOR_TABLE, FactorTable
+
+logger = logging.getLogger(__name__)
+
+REVISION_CACHE_KEY = 'material-factor-table:revision'
+
+
+def material_key(name: str) -> str:
+    """Material type used on invoice items for a category name ("Recycled Paper" -> "recycled_paper")."""
+    return '_'.join(name.lower().split())
+
+
+def load_factor_table() -> FactorTable:
+    """Build a snapshot from MaterialCategory, falling back to the built-in factors."""
+    try:
+        rows = list(MaterialCategory.objects.values_list(
+            'name', 'carbon_factor_kg_co2_per_kg', 'water_factor_l_per_kg',
+            'energy_factor_kwh_per_kg', 'sustainability_rating',
+        ))
+        links = list(MaterialCategory.alternatives.through.objects.values_list(
+            'from_materialcategory__name', 'to_materialcategory__name',
+        ))
+    except DatabaseError as e:
+        logger.warning(f"Could not load material categories, using default factors: {e}")
+        return DEFAULT_FACTOR_TABLE
+    
+    if not rows:
+        return DEFAULT_FACTOR_TABLE
+    
+    factors: Dict[str, Dict] = {}
+    for name, carbon, water, energy, rating in rows:
+        factors[material_key(name)] = {
+            'carbon_factor': float(carbon),
+            'water_factor': float(water),
+            'energy_factor': float(energy),
+            'sustainability_rating': rating,
+        }
+    
+    alternatives: Dict[str, List[str]] = {}
+    for material, alternative in links:
+        alternatives.setdefault(material_key(material), []).append(material_key(alternative))
+    return FactorTable(factors, source='database', alternatives=alternatives)
+
+
+class FactorTableService:
+    """Hands out the current factor table snapshot, reloading it when it goes stale."""
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._table: Optional[FactorTable] = None
+        self._revision = None
+        self._checked_at = 0.0
+    
+    def get(self) -> FactorTable:
+        """Return the current snapshot; checks the shared revision at most every refresh interval."""
+        table = self._table
+        if table is not None and time.monotonic() - self._checked_at < settings.FACTOR_TABLE_REFRESH_SECONDS:
+            return table
+        
+        with self._lock:
+            now = time.monotonic()
+            if self._table is None or now - self._checked_at >= settings.FACTOR_TABLE_REFRESH_SECONDS:
+                revision = cache.get(REVISION_CACHE_KEY)
+                if self._table is None or revision != self._revision:
+                    self._table = load_factor_table()
+                    self._revision = revision
+                    logger.info(f"Loaded material factor table {self._table!r} (revision {revision})")
+                self._checked_at = now
+            return self._table
+    
+    def invalidate(self) -> None:
+        """Make every process reload the table; call once the change is committed."""
+        try:
+            cache.incr(REVISION_CACHE_KEY)
+        except ValueError:
+            # Key missing (first change, or the cache was flushed)
+            cache.set(REVISION_CACHE_KEY, 1, timeout=None)
+        
+        # This process doesn't need to wait for the refresh interval
+        with self._lock:
+            self._checked_at = 0.0
+
+
+factor_tables = FactorTableService()
+
+
+def get_factor_table() -> FactorTable:
+    """Return the current material factor table snapshot."""
+    return factor_tables.get()
\ No newline at end of file
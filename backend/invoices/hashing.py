@@ -0,0 +1,69 @@
+"""
+Content hashing for uploaded invoice files.
+
+The upload handlers hash each chunk as Django receives it, so the digest is
+ready by the time the view runs and the file never has to be re-read.
+"""
+
+import hashlib
+
+from django.core.files.uploadhandler import MemoryFileUploadHandler, TemporaryFileUploadHandler
+
+HASH_ALGORITHM = 'sha256'
+
+
+class HashingUploadHandlerMixin:
+    """Attach a ``content_hash`` to every file received by the handler."""
+    
+    def new_file(self, *args, **kwargs):
+        self._digest = hashlib.new(HASH_ALGORITHM)
+        return super().new_file(*args, **kwargs)
+    
+    def receive_data_chunk(self, raw_data, start):
+        # Only hash data this handler actually keeps (the memory handler
+        # passes large files on to the next handler in the chain)
+        if getattr(self, 'activated', True):
+            self._digest.update(raw_data)
+        return super().receive_data_chunk(raw_data, start)
+    
+    def file_complete(self, file_size):
+        uploaded_file = super().file_complete(file_size)
+        if uploaded_file is not None:
+            uploaded_file.content_hash = self._digest.hexdigest()
+        return uploaded_file
+
+
+class HashingMemoryFileUploadHandler(HashingUploadHandlerMixin, MemoryFileUploadHandler):
+    """In-memory upload handler that hashes file content as it arrives."""
+
+
+class HashingTemporaryFileUploadHandler(HashingUploadHandlerMixin, TemporaryFileUploadHandler):
+    """Temporary-file upload handler that hashes file content as it arrives."""
+
+
+class HashingReader:
+    """File-like wrapper that hashes everything read through it."""
+    
+    def __init__(self, fileobj):
+        self._fileobj = fileobj
+        self._digest = hashlib.new(HASH_ALGORITHM)
+    
+    def read(self, size=-1):
+        data = self._fileobj.read(size)
+        self._digest.update(data)
+        return data
+    
+    def hexdigest(self) -> str:
+        return self._digest.hexdigest()
+
+
+def file_content_hash(fileobj) -> str:
+    """Return the content hash of a file, reusing the one computed during upload."""
+    content_hash = getattr(fileobj, 'content_hash', None)
+    if content_hash:
+        return content_hash
+    
+    digest = hashlib.new(HASH_ALGORITHM)
+    for chunk in fileobj.chunks():
+        digest.update(chunk)
+    return digest.hexdigest()
\ No newline at end of file
@@ -0,0 +1,218 @@
+"""
+Microbenchmarks for the invoice NLP pipeline.
+    
+    python manage.py benchmark_nlp matcher --count 1000000
+    python manage.py benchmark_nlp extraction --count 20
+    python manage.py benchmark_nlp streaming --size-mb 200 --max-rss-mb 150
+    python manage.py benchmark_nlp impact --count 100000
+"""
+
+import os
+import random
+import re
+import tempfile
+import time
+from decimal import Decimal
+
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+
+from nlp_module.extraction import scan_invoice
+from nlp_module.impact_engine import IMPACT_RTOL
+from nlp_module.invoice_processor import MATERIAL_KEYWORDS, InvoiceProcessor
+from nlp_module.registry import current_rss_bytes
+
+DESCRIPTION_WORDS = [
+    'box', 'pack', 'roll', 'sheet', 'carpet', 'tile', 'bag', 'premium', 'office',
+    'industrial', 'supplies', 'large', 'small', 'blue', 'letter', 'shipping', 'widget',
+]
+
+
+def _synthetic_descriptions(count: int, seed: int, keyword_share: float = 0.5):
+    """Generate item descriptions, ``keyword_share`` of them containing a material keyword."""
+    rng = random.Random(seed)
+    keywords = [keyword for keywords in MATERIAL_KEYWORDS.values() for keyword in keywords]
+    descriptions = []
+    for _ in range(count):
+        words = rng.choices(DESCRIPTION_WORDS, k=rng.randint(2, 6))
+        if rng.random() < keyword_share:
+            words.insert(rng.randrange(len(words) + 1), rng.choice(keywords))
+        descriptions.append(' '.join(words).title())
+    return descriptions
+
+
+def _synthetic_invoice_lines(lines: int, seed: int, keyword_share: float = 0.5):
+    """Yield the lines of a plain-text invoice with a header and ``lines`` item lines."""
+    rng = random.Random(seed)
+    yield f"INVOICE # INV{rng.randint(1000, 9999)}"
+    yield "From: Acme Industrial Supplies Ltd"
+    yield "Date: 2024-01-15"
+    yield "Due: 2024-02-15"
+    # Generated in blocks so huge statements never sit in memory
+    for block in range(0, lines, 10_000):
+        for description in _synthetic_descriptions(min(10_000, lines - block), seed + block, keyword_share):
+            quantity = rng.randint(1, 500)
+            price = rng.randint(1, 10000) / 100
+            yield f"{description}  {quantity}  ${price:.2f}  ${quantity * price:.2f}"
+    yield "Total: $123456.78"
+
+
+def _synthetic_invoice(lines: int, seed: int) -> str:
+    """Generate a plain-text invoice with a header and the given number of item lines."""
+    return '\n'.join(_synthetic_invoice_lines(lines, seed))
+
+
+# The line item regex used before the single-pass scanner
+LEGACY_ITEM_PATTERN = r'([^0-9]+)\s+(\d+\.?\d*)\s+\$?(\d+\.?\d*)\s+\$?(\d+\.?\d*)'
+
+
+def _per_item_impact(processor: InvoiceProcessor, items, materials):
+    """The previous scoring: one calculate_environmental_impact call per item."""
+    totals = [0.0, 0.0, 0.0]
+    for item, material in zip(items, materials):
+        impact = processor.calculate_environmental_impact(item, material)
+        item.update(impact)
+        totals[0] += impact['carbon_footprint_kg']
+        totals[1] += impact['water_footprint_l']
+        totals[2] += impact['energy_footprint_kwh']
+    
+    score = 0.0
+    weight = 0.0
+    for item in items:
+        rating = processor.material_factors.get(item['material_type'], {}).get('sustainability_rating', 5)
+        score += rating * item['weight_kg']
+        weight += item['weight_kg']
+    return totals + [score / weight if weight else 0.0]
+
+
+def _linear_scan(description: str):
+    """The previous classifier: substring scan over every keyword in dict order."""
+    description_lower = description.lower()
+    for material, keywords in MATERIAL_KEYWORDS.items():
+        if any(keyword in description_lower for keyword in keywords):
+            return material
+    return None
+
+
+class Command(BaseCommand):
+    help = 'Run throughput benchmarks for the invoice NLP pipeline'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('target', choices=['matcher', 'extraction', 'streaming', 'impact'], help='Component to benchmark')
+        parser.add_argument('--count', type=int, default=1_000_000, help='Number of synthetic inputs')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--size-mb', type=int, default=200, help='Size of the streamed statement')
+        parser.add_argument('--max-rss-mb', type=int, help='Fail if streaming grows RSS by more than this')
+    
+    def handle(self, *args, **options):
+        getattr(self, f"benchmark_{options['target']}")(options)
+    
+    def _report(self, label: str, count: int, elapsed: float, unit: str):
+        self.stdout.write(f"{label:<24} {elapsed:8.3f}s  {count / elapsed:14,.0f} {unit}/s")
+    
+    def benchmark_matcher(self, options):
+        count = options['count']
+        descriptions = _synthetic_descriptions(count, options['seed'])
+        matcher = InvoiceProcessor().material_matcher
+        
+        started = time.perf_counter()
+        for description in descriptions:
+            _linear_scan(description)
+        self._report('linear substring scan', count, time.perf_counter() - started, 'descriptions')
+        
+        started = time.perf_counter()
+        for description in descriptions:
+            matcher.match(description)
+        self._report('compiled matcher', count, time.perf_counter() - started, 'descriptions')
+    
+    def benchmark_extraction(self, options):
+        count = min(options['count'], 1000)
+        invoices = [_synthetic_invoice(10_000, options['seed'] + i) for i in range(count)]
+        lines = sum(text.count('\n') + 1 for text in invoices)
+        
+        started = time.perf_counter()
+        for text in invoices:
+            scan_invoice(text.splitlines())
+        self._report(f'{count} x 10k-line invoices', lines, time.perf_counter() - started, 'lines')
+        
+        # Pathological lines: long digit-free runs with no item columns
+        self.stdout.write('pathological line (chars -> seconds):')
+        for length in (5_000, 10_000, 20_000):
+            line = 'ab ' * (length // 3) + '1 x'
+            started = time.perf_counter()
+            scan_invoice([line])
+            scanner = time.perf_counter() - started
+            started = time.perf_counter()
+            re.search(LEGACY_ITEM_PATTERN, line)
+            legacy = time.perf_counter() - started
+            self.stdout.write(f"  {length:>7,}  scanner {scanner:8.4f}s  legacy regex {legacy:8.4f}s")
+    
+    def benchmark_streaming(self, options):
+        processor = InvoiceProcessor()
+        target_bytes = options['size_mb'] * 1024 * 1024
+        
+        # Every description hits the keyword table, so spaCy is not needed and
+        # the numbers reflect the pipeline itself
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, 'statement.txt')
+            with open(path, 'w', encoding='utf-8') as f:
+                lines = _synthetic_invoice_lines(10 ** 9, options['seed'], keyword_share=1.0)
+                while f.tell() < target_bytes:
+                    f.write(next(lines) + '\n')
+            size = os.path.getsize(path)
+            
+            baseline = current_rss_bytes()
+            peak = baseline
+            
+            def sink(items):
+                nonlocal peak
+                peak = max(peak, current_rss_bytes())
+            
+            started = time.perf_counter()
+            result = processor.stream_invoice(path, sink)
+            elapsed = time.perf_counter() - started
+        
+        growth_mb = (peak - baseline) / (1024 * 1024)
+        self._report(f"{size / (1024 * 1024):.0f} MB statement", result['item_count'], elapsed, 'items')
+        self.stdout.write(f"peak RSS growth {growth_mb:.1f} MB (baseline {baseline / (1024 * 1024):.1f} MB)")
+        
+        if options['max_rss_mb'] is not None and growth_mb > options['max_rss_mb']:
+            raise CommandError(f"RSS grew by {growth_mb:.1f} MB, above the {options['max_rss_mb']} MB ceiling")
+    
+    def benchmark_impact(self, options):
+        count = options['count']
+        rng = random.Random(options['seed'])
+        processor = InvoiceProcessor()
+        engine = processor.impact_engine
+        materials = rng.choices(list(processor.material_factors) + ['unknown'], k=count)
+        items = [{'quantity': Decimal(rng.randint(1, 500))} for _ in range(count)]
+        
+        started = time.perf_counter()
+        expected = _per_item_impact(processor, items, materials)
+        legacy = time.perf_counter() - started
+        self._report('per-item loop', count, legacy, 'items')
+        
+        # Encoding happens once per invoice when items are classified
+        started = time.perf_counter()
+        codes = engine.encode(materials)
+        weights = engine.item_weights(items)
+        encoding = time.perf_counter() - started
+        self._report('encode codes + weights', count, encoding, 'items')
+        
+        started = time.perf_counter()
+        impact = engine.compute(codes, weights)
+        vectorized = time.perf_counter() - started
+        self._report('vectorized engine', count, vectorized, 'items')
+        self.stdout.write(f"speedup {legacy / vectorized:,.0f}x ({legacy / (vectorized + encoding):,.1f}x including encoding)")
+        
+        actual = list(impact.totals[0, :3]) + [impact.scores[0]]
+        if not np.allclose(actual, expected, rtol=IMPACT_RTOL, atol=0):
+            raise CommandError(f"Vectorized totals {actual} differ from per-item totals {expected}")
+        
+        # The same items as a batch of 100-item invoices
+        invoice_index = np.arange(count) // 100
+        started = time.perf_counter()
+        batch = engine.compute(codes, weights, invoice_index)
+        self._report(f'{len(batch.totals)} invoice batch', count, time.perf_counter() - started, 'items')
+        if not np.allclose(batch.totals.sum(axis=0), impact.totals[0], rtol=IMPACT_RTOL, atol=0):
+            raise CommandError("Batch totals differ from single-invoice totals")
\ No newline at end of file
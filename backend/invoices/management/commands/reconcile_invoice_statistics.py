@@ -0,0 +1,56 @@
+"""
+Verify the incrementally maintained invoice statistics against a full recompute.
+    
+    python manage.py reconcile_invoice_statistics
+    python manage.py reconcile_invoice_statistics --user 12 --fix
+"""
+
+from django.core.management.base import BaseCommand, CommandError
+
+from invoices.statistics import (
+    TOTALS,
+    compute_invoice_statistics,
+    rebuild_invoice_statistics,
+    stored_invoice_statistics,
+)
+
+
+def _nonzero(statistics):
+    """Drop all-zero entries, which both sides may or may not keep."""
+    return {
+        user_id: {key: values for key, values in contribution.items() if any(values)}
+        for user_id, contribution in statistics.items()
+    }
+
+
+class Command(BaseCommand):
+    help = 'Compare invoice statistics with a recompute from the invoices, optionally repairing them'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, action='append', dest='user_ids', help='Only check this user (repeatable)')
+        parser.add_argument('--fix', action='store_true', help='Rewrite the statistics of users that differ')
+    
+    def handle(self, *args, **options):
+        expected = _nonzero(compute_invoice_statistics(options['user_ids']))
+        stored = _nonzero(stored_invoice_statistics(options['user_ids']))
+        
+        mismatched = []
+        for user_id in sorted(expected.keys() | stored.keys()):
+            want = expected.get(user_id, {})
+            have = stored.get(user_id, {})
+            differences = [key for key in sorted(want.keys() | have.keys()) if want.get(key) != have.get(key)]
+            if not differences:
+                continue
+            mismatched.append(user_id)
+            for key in differences:
+                label = 'totals' if key == TOTALS else f"material {key[1]!r}"
+                self.stdout.write(f"user {user_id} {label}: stored {have.get(key)}, expected {want.get(key)}")
+        
+        if not mismatched:
+            self.stdout.write(self.style.SUCCESS(f"Invoice statistics match for {len(expected)} users"))
+            return
+        if not options['fix']:
+            raise CommandError(f"Invoice statistics differ for {len(mismatched)} users; rerun with --fix to repair")
+        
+        rebuild_invoice_statistics(mismatched)
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt invoice statistics for {len(mismatched)} users"))
\ No newline at end of file
@@ -0,0 +1,38 @@
+"""
+Create MaterialCategory rows for the built-in material factors.
+    
+    python manage.py seed_material_categories
+    python manage.py seed_material_categories --update
+"""
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from invoices.models import MaterialCategory
+from nlp_module.factor_table import DEFAULT_MATERIAL_FACTORS
+
+
+class Command(BaseCommand):
+    help = 'Seed material categories from the built-in impact factors'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--update', action='store_true', help='Overwrite factors of existing categories')
+    
+    @transaction.atomic
+    def handle(self, *args, **options):
+        created = updated = 0
+        for name, factors in DEFAULT_MATERIAL_FACTORS.items():
+            values = {
+                'carbon_factor_kg_co2_per_kg': factors['carbon_factor'],
+                'water_factor_l_per_kg': factors['water_factor'],
+                'energy_factor_kwh_per_kg': factors['energy_factor'],
+                'sustainability_rating': factors['sustainability_rating'],
+            }
+            if options['update']:
+                _, was_created = MaterialCategory.objects.update_or_create(name=name, defaults=values)
+                updated += not was_created
+            else:
+                _, was_created = MaterialCategory.objects.get_or_create(name=name, defaults=values)
+            created += was_created
+        
+        self.stdout.write(self.style.SUCCESS(f"Created {created} and updated {updated} material categories"))
\ No newline at end of file
@@ -7,12 +7,14 @@ class Invoice(models.Model):
     """Model for storing uploaded invoices."""
     
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='invoices')
+    batch = models.ForeignKey('InvoiceBatch', on_delete=models.SET_NULL, blank=True, null=True, related_name='invoices')
     
     # File information
     file = models.FileField(upload_to='invoices/')
     file_name = models.CharField(max_length=255)
     file_size = models.IntegerField(help_text='File size in bytes')
     file_type = models.CharField(max_length=50, help_text='MIME type of the file')
+    content_hash = models.CharField(max_length=64, blank=True, null=True, db_index=True, help_text='SHA-256 of the file content')
     
     # Invoice metadata
     invoice_number = models.CharField(max_length=100, blank=True, null=True)
@@ -48,15 +50,48 @@ class Invoice(models.Model):
         verbose_name = _('Invoice')
         verbose_name_plural = _('Invoices')
         ordering = ['-created_at']
+        indexes = [
+            # Per-user invoice list, newest first
+            models.Index(fields=['user', '-created_at', '-id'], name='invoice_user_created_idx'),
+            models.Index(fields=['user', 'status'], name='invoice_user_status_idx'),
+            # Processed invoices are the ones analytics and rollups read
+            models.Index(
+                fields=['user', 'invoice_date'], condition=models.Q(status='processed'),
+                name='invoice_processed_idx',
+            ),
+        ]
     
     def __str__(self):
         return f"Invoice {self.invoice_number or self.file_name} - {self.user.username}"
 
 
+class InvoiceBatch(models.Model):
+    """Model for a bulk upload of many invoices processed together."""
+    
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='invoice_batches')
+    
+    # Upload summary
+    total_files = models.IntegerField(default=0)
+    rejected_files = models.JSONField(default=list, blank=True)
+    
+    # Timestamps
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        verbose_name = _('Invoice Batch')
+        verbose_name_plural = _('Invoice Batches')
+        ordering = ['-created_at']
+    
+    def __str__(self):
+        return f"Batch {self.id} ({self.total_files} files) - {self.user.username}"
+
+
 class InvoiceItem(models.Model):
     """Model for individual items in an invoice."""
     
-    invoice = models.ForeignKey(Invoice, on_delete=models.CASCADE, related_name='items')
+    # Indexed by invoiceitem_created_idx, which leads with the invoice
+    invoice = models.ForeignKey(Invoice, on_delete=models.CASCADE, related_name='items', db_index=False)
     
     # Item details
     description = models.CharField(max_length=500)
@@ -81,6 +116,10 @@ class InvoiceItem(models.Model):
     class Meta:
         verbose_name = _('Invoice Item')
         verbose_name_plural = _('Invoice Items')
+        indexes = [
+            # Keyset pages of an invoice's items; also serves joins through the invoice
+            models.Index(fields=['invoice', '-created_at', '-id'], name='invoiceitem_created_idx'),
+        ]
     
     def __str__(self):
         return f"{self.description} - {self.invoice.invoice_number}"
@@ -157,4 +196,47 @@ class Supplier(models.Model):
         ordering = ['name']
     
     def __str__(self):
-        return self.name 
\ No newline at end of file
+        return self.name 
+
+
+class InvoiceStatistics(models.Model):
+    """Per-user invoice totals, maintained incrementally by invoices.statistics."""
+    
+    user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='invoice_statistics')
+    
+    # Invoice counts
+    total_invoices = models.IntegerField(default=0)
+    processed_invoices = models.IntegerField(default=0)
+    
+    # Impact of the items of processed invoices
+    total_carbon_kg = models.DecimalField(max_digits=15, decimal_places=3, default=0)
+    total_water_l = models.DecimalField(max_digits=15, decimal_places=3, default=0)
+    total_energy_kwh = models.DecimalField(max_digits=15, decimal_places=3, default=0)
+    
+    class Meta:
+        verbose_name = _('Invoice Statistics')
+        verbose_name_plural = _('Invoice Statistics')
+    
+    def __str__(self):
+        return f"Invoice statistics - {self.user.username}"
+
+
+class MaterialStatistics(models.Model):
+    """Per-user, per-material totals over the items of processed invoices."""
+    
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='material_statistics')
+    material_type = models.CharField(max_length=100)
+    
+    item_count = models.IntegerField(default=0)
+    quantity = models.DecimalField(max_digits=15, decimal_places=2, default=0)
+    carbon_footprint_kg = models.DecimalField(max_digits=15, decimal_places=3, default=0)
+    water_footprint_l = models.DecimalField(max_digits=15, decimal_places=3, default=0)
+    energy_footprint_kwh = models.DecimalField(max_digits=15, decimal_places=3, default=0)
+    
+    class Meta:
+        verbose_name = _('Material Statistics')
+        verbose_name_plural = _('Material Statistics')
+        unique_together = ['user', 'material_type']
+    
+    def __str__(self):
+        return f"{self.material_type} - {self.user.username}"
\ No newline at end of file
@@ -0,0 +1,243 @@
+"""
+Invoice processing service shared by the API views and background tasks.
+"""
+
+import logging
+from itertools import islice
+from typing import Dict, Iterable, Iterator, List
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import OperationalError, transaction
+from django.utils import timezone
+
+from .hashing import file_content_hash
+from .models import Invoice, InvoiceItem
+from .statistics import track_invoice_statistics
+from analytics.rollups import track_invoice_rollups
+from nlp_module.invoice_processor import PROCESSOR_VERSION, InvoiceProcessor, get_invoice_processor
+
+logger = logging.getLogger(__name__)
+
+
+def process_invoice(invoice: Invoice) -> Invoice:
+    """Run the NLP pipeline on an invoice and persist the extracted data."""
+    return process_invoices([invoice])[0]
+
+
+def process_invoices(invoices: List[Invoice]) -> List[Invoice]:
+    """Run the NLP pipeline on several invoices at once and persist each result.
+    
+    Item classification is batched across all the invoices, so a chunk of a
+    bulk upload makes a single pass through spaCy. Large files are streamed
+    one at a time instead, see ``stream_invoice``.
+    """
+    if not invoices:
+        return invoices
+    
+    min_streaming_size = settings.INVOICE_STREAMING_MIN_FILE_SIZE
+    batched = [invoice for invoice in invoices if invoice.file_size < min_streaming_size]
+    streamed = [invoice for invoice in invoices if invoice.file_size >= min_streaming_size]
+    
+    if batched:
+        try:
+            # Process the invoices with the shared, already-warm processor,
+            # pinned to one factor table version for the whole batch
+            processor = get_invoice_processor().pinned()
+            results = _process_with_cache(processor, batched)
+        except OperationalError:
+            # Transient database errors are retried by the task queue
+            raise
+        except Exception as e:
+            results = [{'processing_status': 'failed', 'error': str(e)} for _ in batched]
+        
+        for invoice, result in zip(batched, results):
+            _apply_result(invoice, result)
+    
+    for invoice in streamed:
+        stream_invoice(invoice)
+    
+    return invoices
+
+
+def stream_invoice(invoice: Invoice) -> Invoice:
+    """Process an invoice with bounded memory, writing items as they are scored.
+    
+    The whole run happens in one transaction, so a failure halfway through
+    leaves the previous items in place rather than a partial set.
+    """
+    max_cached_items = settings.INVOICE_RESULT_CACHE_MAX_ITEMS
+    batch_size = settings.INVOICE_ITEM_BULK_BATCH_SIZE
+    
+    try:
+        processor = get_invoice_processor().pinned()
+        key = result_cache_key(_ensure_content_hash(invoice), processor)
+        cached = cache.get(key)
+        if cached is not None:
+            _apply_result(invoice, cached)
+            return invoice
+        
+        # Items are kept for the result cache only while there are few enough to cache
+        kept_items: List[Dict] = []
+        cacheable = True
+        
+        def persist(items: List[Dict]) -> None:
+            nonlocal cacheable
+            InvoiceItem.objects.bulk_create(list(_iter_item_rows(invoice, items)), batch_size=batch_size)
+            if cacheable:
+                kept_items.extend(items)
+                if len(kept_items) > max_cached_items:
+                    cacheable = False
+                    kept_items.clear()
+        
+        with transaction.atomic(), track_invoice_rollups(invoice), track_invoice_statistics(invoice):
+            invoice.items.all().delete()
+            result = processor.stream_invoice(invoice.file.path, persist, content_hash=invoice.content_hash)
+            _set_processed_fields(invoice, result)
+            invoice.save(update_fields=PROCESSED_FIELDS)
+        
+        if cacheable:
+            result['items'] = kept_items
+            cache.set(key, result, timeout=settings.INVOICE_RESULT_CACHE_TIMEOUT)
+        logger.info(f"Streamed invoice {invoice.id}: {result['item_count']} items")
+    
+    except OperationalError:
+        # Transient database errors are retried by the task queue
+        raise
+    except Exception as e:
+        logger.error(f"Error processing invoice {invoice.id}: {e}")
+        mark_invoice_failed(invoice, str(e))
+    
+    return invoice
+
+
+def result_cache_key(content_hash: str, processor: InvoiceProcessor) -> str:
+    """Cache key for a processing result; changes with the code or the factor table."""
+    return f"invoice-result:{content_hash}:{PROCESSOR_VERSION}:{processor.factor_table_version}"
+
+
+def _ensure_content_hash(invoice: Invoice) -> str:
+    """Return the invoice's content hash, computing it for older uploads."""
+    if not invoice.content_hash:
+        with invoice.file.open('rb') as f:
+            invoice.content_hash = file_content_hash(f)
+        Invoice.objects.filter(id=invoice.id).update(content_hash=invoice.content_hash)
+    return invoice.content_hash
+
+
+def _process_with_cache(processor: InvoiceProcessor, invoices: List[Invoice]) -> List[Dict]:
+    """Process invoices, reusing cached results for content already seen."""
+    keys = [result_cache_key(_ensure_content_hash(invoice), processor) for invoice in invoices]
+    cached = cache.get_many(keys)
+    
+    # Duplicate uploads within the same batch only need processing once
+    missing = {}
+    for invoice, key in zip(invoices, keys):
+        if key not in cached:
+            missing.setdefault(key, invoice)
+    
+    if missing:
+        fresh = processor.process_invoices(
+            [invoice.file.path for invoice in missing.values()],
+            content_hashes=[invoice.content_hash for invoice in missing.values()],
+        )
+        fresh = dict(zip(missing, fresh))
+        cached.update(fresh)
+        
+        # Huge item lists would bloat the cache for little gain
+        successful = {
+            key: result for key, result in fresh.items()
+            if result['processing_status'] == 'success'
+            and len(result['items']) <= settings.INVOICE_RESULT_CACHE_MAX_ITEMS
+        }
+        if successful:
+            cache.set_many(successful, timeout=settings.INVOICE_RESULT_CACHE_TIMEOUT)
+    
+    logger.info(f"Processed {len(invoices)} invoices, {len(invoices) - len(missing)} from cache")
+    return [cached[key] for key in keys]
+
+
+# Fields written when an invoice finishes processing
+PROCESSED_FIELDS = [
+    'invoice_number', 'invoice_date', 'due_date', 'total_amount', 'supplier_name',
+    'extracted_text', 'status', 'processed_at', 'updated_at',
+]
+FAILED_FIELDS = ['status', 'processing_errors', 'updated_at']
+
+
+def _iter_item_rows(invoice: Invoice, items: Iterable[Dict]) -> Iterator[InvoiceItem]:
+    """Build unsaved InvoiceItem rows from extracted item dicts."""
+    for item_data in items:
+        yield InvoiceItem(
+            invoice=invoice,
+            description=item_data.get('description', ''),
+            quantity=item_data.get('quantity', 0),
+            unit_price=item_data.get('unit_price', 0),
+            total_price=item_data.get('total_price', 0),
+            material_type=item_data.get('material_type', 'unknown'),
+            weight_kg=item_data.get('weight_kg', 0),
+            carbon_footprint_kg=item_data.get('carbon_footprint_kg', 0),
+            water_footprint_l=item_data.get('water_footprint_l', 0),
+            energy_footprint_kwh=item_data.get('energy_footprint_kwh', 0),
+        )
+
+
+def replace_invoice_items(invoice: Invoice, items: Iterable[Dict]) -> int:
+    """Replace an invoice's items with bulk INSERTs. Call inside a transaction."""
+    batch_size = settings.INVOICE_ITEM_BULK_BATCH_SIZE
+    invoice.items.all().delete()
+    
+    created = 0
+    rows = _iter_item_rows(invoice, items)
+    while True:
+        chunk = list(islice(rows, batch_size))
+        if not chunk:
+            break
+        InvoiceItem.objects.bulk_create(chunk, batch_size=batch_size)
+        created += len(chunk)
+    return created
+
+
+def mark_invoice_failed(invoice: Invoice, error: str) -> None:
+    """Record a processing failure, touching only the status columns."""
+    invoice.status = 'failed'
+    invoice.processing_errors = error
+    with transaction.atomic(), track_invoice_statistics(invoice):
+        invoice.save(update_fields=FAILED_FIELDS)
+
+
+def _set_processed_fields(invoice: Invoice, result: Dict) -> None:
+    """Copy extracted metadata from a successful result onto the invoice."""
+    metadata = result['metadata']
+    invoice.invoice_number = metadata.get('invoice_number')
+    invoice.invoice_date = metadata.get('invoice_date')
+    invoice.due_date = metadata.get('due_date')
+    invoice.total_amount = metadata.get('total_amount')
+    invoice.supplier_name = metadata.get('supplier_name')
+    # A bounded preview of the text, not the whole document
+    invoice.extracted_text = result.get('text_preview', '')
+    invoice.status = 'processed'
+    invoice.processed_at = timezone.now()
+
+
+def _apply_result(invoice: Invoice, result: Dict) -> None:
+    """Persist a processing result onto its invoice."""
+    try:
+        if result['processing_status'] == 'success':
+            # Update invoice with extracted data
+            _set_processed_fields(invoice, result)
+            
+            # Items are replaced atomically, so reprocessing never leaves a mix;
+            # the rollups and statistics move by the difference in the same transaction
+            with transaction.atomic(), track_invoice_rollups(invoice), track_invoice_statistics(invoice):
+                invoice.save(update_fields=PROCESSED_FIELDS)
+                replace_invoice_items(invoice, result.get('items', []))
+        else:
+            mark_invoice_failed(invoice, result.get('error', 'Unknown error'))
+    
+    except OperationalError:
+        # Transient database errors are retried by the task queue
+        raise
+    except Exception as e:
+        logger.error(f"Error processing invoice {invoice.id}: {e}")
+        mark_invoice_failed(invoice, str(e))
\ No newline at end of file
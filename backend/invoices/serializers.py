@@ -1,8 +1,26 @@
+import zipfile
+
+from django.conf import settings
 from rest_framework import serializers
-from .models import Invoice, InvoiceItem, MaterialCategory, Supplier
 
+from eco_api.serializers import SelectableFieldsMixin
+from .hashing import file_content_hash
+from .models import Invoice, InvoiceBatch, InvoiceItem, MaterialCategory, Supplier
+
+MAX_INVOICE_FILE_SIZE = 10 * 1024 * 1024  # 10MB
+ALLOWED_INVOICE_FILE_TYPES = ['application/pdf', 'image/jpeg', 'image/png', 'text/plain']
+
+
+def validate_invoice_file(size, content_type):
+    """Validate the size and type of a single invoice file."""
+    if size > MAX_INVOICE_FILE_SIZE:
+        raise serializers.ValidationError("File size must be less than 10MB")
+    
+    if content_type not in ALLOWED_INVOICE_FILE_TYPES:
+        raise serializers.ValidationError("File type not supported. Please upload PDF, JPEG, PNG, or text files.")
 
-class InvoiceItemSerializer(serializers.ModelSerializer):
+
+class InvoiceItemSerializer(SelectableFieldsMixin, serializers.ModelSerializer):
     """Serializer for invoice items."""
     
     class Meta:
@@ -38,6 +56,22 @@ class InvoiceSerializer(serializers.ModelSerializer):
         ]
 
 
+class InvoiceSummarySerializer(SelectableFieldsMixin, serializers.ModelSerializer):
+    """Slim serializer for invoice lists, without items or extracted text."""
+    
+    # Annotated by the list view
+    item_count = serializers.IntegerField(read_only=True)
+    
+    class Meta:
+        model = Invoice
+        fields = [
+            'id', 'file_name', 'file_type', 'invoice_number', 'invoice_date',
+            'total_amount', 'currency', 'supplier_name', 'status', 'item_count',
+            'created_at', 'processed_at'
+        ]
+        read_only_fields = fields
+
+
 class InvoiceUploadSerializer(serializers.ModelSerializer):
     """Serializer for invoice upload."""
     
@@ -47,15 +81,7 @@ class InvoiceUploadSerializer(serializers.ModelSerializer):
     
     def validate_file(self, value):
         """Validate uploaded file."""
-        # Check file size (10MB limit)
-        if value.size > 10 * 1024 * 1024:
-            raise serializers.ValidationError("File size must be less than 10MB")
-        
-        # Check file type
-        allowed_types = ['application/pdf', 'image/jpeg', 'image/png', 'text/plain']
-        if value.content_type not in allowed_types:
-            raise serializers.ValidationError("File type not supported. Please upload PDF, JPEG, PNG, or text files.")
-        
+        validate_invoice_file(value.size, value.content_type)
         return value
     
     def create(self, validated_data):
@@ -69,10 +95,77 @@ class InvoiceUploadSerializer(serializers.ModelSerializer):
         validated_data['file_name'] = file_obj.name
         validated_data['file_size'] = file_obj.size
         validated_data['file_type'] = file_obj.content_type
+        validated_data['content_hash'] = file_content_hash(file_obj)
         
         return super().create(validated_data)
 
 
+class InvoiceBatchUploadSerializer(serializers.Serializer):
+    """Serializer for bulk invoice upload (many files and/or a zip archive)."""
+    
+    files = serializers.ListField(child=serializers.FileField(), required=False, allow_empty=True)
+    archive = serializers.FileField(required=False)
+    
+    def validate_archive(self, value):
+        """Validate the uploaded zip archive."""
+        if not zipfile.is_zipfile(value):
+            raise serializers.ValidationError("Archive must be a zip file.")
+        value.seek(0)
+        
+        # Checked against the central directory before anything is extracted;
+        # members can't decompress past the sizes declared there
+        max_bytes = settings.INVOICE_BATCH_MAX_ARCHIVE_BYTES
+        max_ratio = settings.INVOICE_BATCH_MAX_COMPRESSION_RATIO
+        limit = f"{max_bytes // (1024 * 1024)}MB"
+        if value.size > max_bytes:
+            raise serializers.ValidationError(f"Archive must be less than {limit}.")
+        with zipfile.ZipFile(value) as zf:
+            members = [info for info in zf.infolist() if not info.is_dir()]
+        if sum(info.file_size for info in members) > max_bytes:
+            raise serializers.ValidationError(f"Archive contents must be less than {limit} uncompressed.")
+        if any(info.file_size > max_ratio * max(info.compress_size, 1) for info in members):
+            raise serializers.ValidationError(f"Archive members may not be compressed more than {max_ratio}:1.")
+        value.seek(0)
+        return value
+    
+    def validate(self, attrs):
+        if not attrs.get('files') and not attrs.get('archive'):
+            raise serializers.ValidationError("Upload at least one file or a zip archive.")
+        return attrs
+
+
+class InvoiceBatchSerializer(serializers.ModelSerializer):
+    """Serializer for invoice batch progress."""
+    
+    uploaded = serializers.IntegerField(read_only=True)
+    processing = serializers.IntegerField(read_only=True)
+    processed = serializers.IntegerField(read_only=True)
+    failed = serializers.IntegerField(read_only=True)
+    progress = serializers.SerializerMethodField()
+    status = serializers.SerializerMethodField()
+    
+    class Meta:
+        model = InvoiceBatch
+        fields = [
+            'id', 'total_files', 'rejected_files',
+            'uploaded', 'processing', 'processed', 'failed', 'progress', 'status',
+            'created_at', 'updated_at'
+        ]
+        read_only_fields = fields
+    
+    def get_progress(self, obj):
+        if not obj.total_files:
+            return 100.0
+        return round((obj.processed + obj.failed) / obj.total_files * 100, 2)
+    
+    def get_status(self, obj):
+        if obj.processed + obj.failed >= obj.total_files:
+            return 'completed'
+        if obj.processing or obj.processed or obj.failed:
+            return 'processing'
+        return 'queued'
+
+
 class MaterialCategorySerializer(serializers.ModelSerializer):
     """Serializer for material categories."""
     
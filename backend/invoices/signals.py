@@ -0,0 +1,44 @@
+"""
+Signal handlers for the invoices app.
+"""
+
+from django.db import transaction
+from django.db.models import QuerySet
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from .factor_table import factor_tables
+from .models import Invoice, MaterialCategory
+from .statistics import record_new_invoices, remove_invoice_statistics
+
+
+@receiver(post_save, sender=MaterialCategory)
+@receiver(post_delete, sender=MaterialCategory)
+def invalidate_factor_table(sender, **kwargs):
+    """Reload the material factor table everywhere once the change is committed."""
+    # Bumping the revision before commit would let other workers reload the old rows
+    transaction.on_commit(factor_tables.invalidate)
+
+
+@receiver(m2m_changed, sender=MaterialCategory.alternatives.through)
+def invalidate_factor_table_alternatives(sender, action, **kwargs):
+    """Alternatives are part of the factor table snapshot too."""
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        transaction.on_commit(factor_tables.invalidate)
+
+
+@receiver(post_save, sender=Invoice)
+def count_new_invoice(sender, instance, created, raw=False, **kwargs):
+    """Count an uploaded invoice in its owner's statistics."""
+    if created and not raw:
+        record_new_invoices(instance.user_id)
+
+
+@receiver(pre_delete, sender=Invoice)
+def remove_deleted_invoice_from_statistics(sender, instance, origin=None, **kwargs):
+    """Subtract a deleted invoice from the statistics, in the deleting transaction."""
+    origin_model = origin.model if isinstance(origin, QuerySet) else type(origin)
+    if origin is not None and origin_model is not Invoice:
+        # Cascading from the user: their statistics are deleted with them
+        return
+    remove_invoice_statistics(instance)
\ No newline at end of file
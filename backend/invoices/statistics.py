@@ -0,0 +1,216 @@
+"""
+Per-user invoice statistics, maintained incrementally.
+
+Every invoice counts towards its owner's InvoiceStatistics row; a processed
+invoice also adds its items to the totals there and to one MaterialStatistics
+row per material. When an invoice is created, processed, fails or is deleted,
+only the difference between its old and new contribution is applied, with
+F() updates. ``compute_invoice_statistics`` recomputes everything from the
+invoices for reconciliation.
+"""
+
+import logging
+from contextlib import contextmanager
+from decimal import Decimal
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Q, Sum, Value
+from django.db.models.functions import Coalesce
+
+from .models import Invoice, InvoiceItem, InvoiceStatistics, MaterialStatistics
+
+logger = logging.getLogger(__name__)
+
+UNKNOWN_MATERIAL = 'unknown'
+
+ZERO = Decimal('0')
+
+# Contribution keys:
+#   ('totals',)              -> [invoices, processed, carbon, water, energy]
+#   ('material', material)   -> [items, quantity, carbon, water, energy]
+# Counts are ints, the rest Decimals
+Contribution = Dict[Tuple, List]
+
+TOTALS = ('totals',)
+
+TOTALS_FIELDS = ['total_invoices', 'processed_invoices', 'total_carbon_kg', 'total_water_l', 'total_energy_kwh']
+MATERIAL_FIELDS = ['item_count', 'quantity', 'carbon_footprint_kg', 'water_footprint_l', 'energy_footprint_kwh']
+
+_MATERIAL_AGGREGATES = {
+    'items': Count('id'),
+    'quantity': Sum('quantity'),
+    'carbon': Sum('carbon_footprint_kg'),
+    'water': Sum('water_footprint_l'),
+    'energy': Sum('energy_footprint_kwh'),
+}
+
+
+def _material_values(row: Dict) -> List:
+    return [row['items']] + [row[name] or ZERO for name in ('quantity', 'carbon', 'water', 'energy')]
+
+
+def _add_material(contribution: Contribution, material: str, values: List) -> None:
+    key = ('material', material)
+    if key in contribution:
+        values = [a + b for a, b in zip(contribution[key], values)]
+    contribution[key] = values
+    totals = contribution[TOTALS]
+    contribution[TOTALS] = totals[:2] + [a + b for a, b in zip(totals[2:], values[2:])]
+
+
+def invoice_statistics_contribution(invoice_id: int) -> Contribution:
+    """Read what an invoice currently adds to its owner's statistics, straight from the database."""
+    invoice = Invoice.objects.filter(id=invoice_id).values('status').first()
+    if invoice is None:
+        return {}
+    
+    processed = invoice['status'] == 'processed'
+    contribution: Contribution = {TOTALS: [1, int(processed), ZERO, ZERO, ZERO]}
+    if processed:
+        # Items of unprocessed or failed invoices are not counted
+        materials = InvoiceItem.objects.filter(invoice_id=invoice_id).values('material_type').annotate(
+            **_MATERIAL_AGGREGATES,
+        )
+        for row in materials:
+            _add_material(contribution, row['material_type'] or UNKNOWN_MATERIAL, _material_values(row))
+    return contribution
+
+
+def contribution_delta(old: Contribution, new: Contribution) -> Contribution:
+    """new - old, without the entries that didn't change."""
+    delta = {}
+    for key in old.keys() | new.keys():
+        before = old.get(key)
+        after = new.get(key)
+        if before is None:
+            values = after
+        elif after is None:
+            values = [-value for value in before]
+        else:
+            values = [a - b for a, b in zip(after, before)]
+        if any(values):
+            delta[key] = values
+    return delta
+
+
+def _increment(model, lookup: Dict, fields: List[str], values: List) -> None:
+    """Add values to the row matching ``lookup``, creating it on first use."""
+    increments = {field: F(field) + value for field, value in zip(fields, values)}
+    if model.objects.filter(**lookup).update(**increments):
+        return
+    try:
+        with transaction.atomic():
+            model.objects.create(**lookup, **dict(zip(fields, values)))
+    except IntegrityError:
+        # Another transaction created it first
+        model.objects.filter(**lookup).update(**increments)
+
+
+def apply_statistics(user_id: int, delta: Contribution) -> None:
+    """Add a contribution (or delta) to the user's statistics rows. Call inside a transaction."""
+    materials = []
+    for key, values in delta.items():
+        if key == TOTALS:
+            _increment(InvoiceStatistics, {'user_id': user_id}, TOTALS_FIELDS, values)
+        else:
+            _increment(MaterialStatistics, {'user_id': user_id, 'material_type': key[1]}, MATERIAL_FIELDS, values)
+            materials.append(key[1])
+    
+    if materials:
+        # Materials whose last item went away
+        MaterialStatistics.objects.filter(user_id=user_id, material_type__in=materials, item_count__lte=0).delete()
+
+
+@contextmanager
+def track_invoice_statistics(invoice: Invoice) -> Iterator[None]:
+    """Apply the change in an invoice's statistics made inside the block.
+    
+    Use inside the transaction that changes the invoice's status or items,
+    so the statistics commit or roll back together with them.
+    """
+    before = invoice_statistics_contribution(invoice.id)
+    yield
+    delta = contribution_delta(before, invoice_statistics_contribution(invoice.id))
+    if delta:
+        apply_statistics(invoice.user_id, delta)
+
+
+def record_new_invoices(user_id: int, count: int = 1) -> None:
+    """Count newly uploaded invoices, which have no items yet."""
+    if count:
+        apply_statistics(user_id, {TOTALS: [count, 0, ZERO, ZERO, ZERO]})
+
+
+def remove_invoice_statistics(invoice: Invoice) -> None:
+    """Subtract an invoice's contribution, e.g. right before it is deleted."""
+    delta = contribution_delta(invoice_statistics_contribution(invoice.id), {})
+    if delta:
+        apply_statistics(invoice.user_id, delta)
+
+
+def compute_invoice_statistics(user_ids: Optional[Iterable[int]] = None) -> Dict[int, Contribution]:
+    """Recompute every user's statistics from their invoices, with grouped aggregates."""
+    invoices = Invoice.objects.all()
+    items = InvoiceItem.objects.filter(invoice__status='processed')
+    if user_ids is not None:
+        invoices = invoices.filter(user_id__in=user_ids)
+        items = items.filter(invoice__user_id__in=user_ids)
+    
+    statistics: Dict[int, Contribution] = {}
+    counts = invoices.order_by().values('user_id').annotate(
+        total=Count('id'), processed=Count('id', filter=Q(status='processed')),
+    )
+    for row in counts:
+        statistics[row['user_id']] = {TOTALS: [row['total'], row['processed'], ZERO, ZERO, ZERO]}
+    
+    materials = items.order_by().values(
+        'invoice__user_id', material=Coalesce('material_type', Value(UNKNOWN_MATERIAL)),
+    ).annotate(**_MATERIAL_AGGREGATES)
+    for row in materials:
+        _add_material(statistics[row['invoice__user_id']], row['material'], _material_values(row))
+    return statistics
+
+
+def stored_invoice_statistics(user_ids: Optional[Iterable[int]] = None) -> Dict[int, Contribution]:
+    """Read the maintained statistics rows in the same shape as compute_invoice_statistics."""
+    totals = InvoiceStatistics.objects.all()
+    materials = MaterialStatistics.objects.all()
+    if user_ids is not None:
+        totals = totals.filter(user_id__in=user_ids)
+        materials = materials.filter(user_id__in=user_ids)
+    
+    statistics: Dict[int, Contribution] = {}
+    for row in totals.values('user_id', *TOTALS_FIELDS):
+        statistics[row['user_id']] = {TOTALS: [row[field] for field in TOTALS_FIELDS]}
+    for row in materials.values('user_id', 'material_type', *MATERIAL_FIELDS):
+        contribution = statistics.setdefault(row['user_id'], {})
+        contribution[('material', row['material_type'])] = [row[field] for field in MATERIAL_FIELDS]
+    return statistics
+
+
+@transaction.atomic
+def rebuild_invoice_statistics(user_ids: Optional[Iterable[int]] = None) -> int:
+    """Replace the stored statistics with a full recompute; returns the number of users written."""
+    statistics = compute_invoice_statistics(user_ids)
+    totals = InvoiceStatistics.objects.all()
+    materials = MaterialStatistics.objects.all()
+    if user_ids is not None:
+        totals = totals.filter(user_id__in=user_ids)
+        materials = materials.filter(user_id__in=user_ids)
+    totals.delete()
+    materials.delete()
+    
+    InvoiceStatistics.objects.bulk_create([
+        InvoiceStatistics(user_id=user_id, **dict(zip(TOTALS_FIELDS, contribution[TOTALS])))
+        for user_id, contribution in statistics.items()
+    ], batch_size=500)
+    MaterialStatistics.objects.bulk_create([
+        MaterialStatistics(user_id=user_id, material_type=key[1], **dict(zip(MATERIAL_FIELDS, values)))
+        for user_id, contribution in statistics.items()
+        for key, values in contribution.items()
+        if key != TOTALS
+    ], batch_size=500)
+    
+    logger.info(f"Rebuilt invoice statistics for {len(statistics)} users")
+    return len(statistics)
\ No newline at end of file
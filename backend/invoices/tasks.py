@@ -0,0 +1,89 @@
+"""
+Background tasks for invoice processing.
+"""
+
+import logging
+
+from celery import shared_task
+from django.conf import settings
+from django.db import OperationalError, transaction
+
+from .models import Invoice
+from .processing import process_invoice, process_invoices
+
+logger = logging.getLogger(__name__)
+
+# Statuses from which an invoice may be picked up for processing
+CLAIMABLE_STATUSES = ['uploaded', 'failed']
+
+
+def _claim_invoice(task, invoice_id: int) -> bool:
+    """Atomically move an invoice to 'processing'; False if someone else owns it."""
+    claimable = list(CLAIMABLE_STATUSES)
+    if task.request.retries or (task.request.delivery_info or {}).get('redelivered'):
+        # Our own earlier attempt left the invoice in 'processing'
+        claimable.append('processing')
+    
+    return bool(Invoice.objects.filter(id=invoice_id, status__in=claimable).update(status='processing'))
+
+
+@shared_task(
+    bind=True,
+    autoretry_for=(OperationalError,),
+    retry_backoff=True,
+    retry_backoff_max=600,
+    retry_jitter=True,
+    max_retries=5,
+    acks_late=True,
+    rate_limit=settings.INVOICE_PROCESSING_RATE_LIMIT,
+)
+def process_invoice_task(self, invoice_id: int) -> dict:
+    """Process a single invoice. Safe to deliver more than once for the same id."""
+    # Claiming first makes duplicate deliveries no-ops
+    if not _claim_invoice(self, invoice_id):
+        logger.info(f"Invoice {invoice_id} already processed or in progress, skipping")
+        return {'invoice_id': invoice_id, 'status': 'skipped'}
+    
+    invoice = Invoice.objects.get(id=invoice_id)
+    process_invoice(invoice)
+    
+    return {'invoice_id': invoice_id, 'status': invoice.status}
+
+
+@shared_task(
+    bind=True,
+    autoretry_for=(OperationalError,),
+    retry_backoff=True,
+    retry_backoff_max=600,
+    retry_jitter=True,
+    max_retries=5,
+    acks_late=True,
+)
+def process_invoice_chunk_task(self, invoice_ids: list) -> dict:
+    """Process a chunk of a bulk upload in one task, skipping invoices already handled."""
+    claimed = [invoice_id for invoice_id in invoice_ids if _claim_invoice(self, invoice_id)]
+    invoices = process_invoices(list(Invoice.objects.filter(id__in=claimed).order_by('id')))
+    
+    processed = sum(1 for invoice in invoices if invoice.status == 'processed')
+    return {
+        'processed': processed,
+        'failed': len(invoices) - processed,
+        'skipped': len(invoice_ids) - len(claimed),
+    }
+
+
+def enqueue_invoice_processing(invoice_id: int) -> None:
+    """Queue an invoice for processing once the current transaction commits."""
+    transaction.on_commit(lambda: process_invoice_task.delay(invoice_id))
+
+
+def enqueue_invoice_batch(invoice_ids: list) -> None:
+    """Queue a bulk upload for processing in chunks once the transaction commits."""
+    chunk_size = settings.INVOICE_BATCH_CHUNK_SIZE
+    chunks = [invoice_ids[i:i + chunk_size] for i in range(0, len(invoice_ids), chunk_size)]
+    
+    def send():
+        for chunk in chunks:
+            process_invoice_chunk_task.delay(chunk)
+    
+    transaction.on_commit(send)
\ No newline at end of file
@@ -6,14 +6,19 @@ app_name = 'invoices'
 urlpatterns = [
     # Invoice management
     path('upload/', views.InvoiceUploadView.as_view(), name='upload'),
+    path('batch-upload/', views.InvoiceBatchUploadView.as_view(), name='batch-upload'),
+    path('batches/<int:batch_id>/', views.InvoiceBatchStatusView.as_view(), name='batch-status'),
     path('', views.InvoiceListView.as_view(), name='list'),
     path('<int:pk>/', views.InvoiceDetailView.as_view(), name='detail'),
+    path('<int:invoice_id>/items/', views.InvoiceItemListView.as_view(), name='items'),
     path('<int:invoice_id>/status/', views.InvoiceProcessingStatusView.as_view(), name='status'),
+    path('<int:invoice_id>/alternatives/', views.invoice_alternatives, name='alternatives'),
     path('<int:invoice_id>/reprocess/', views.reprocess_invoice, name='reprocess'),
     path('<int:invoice_id>/delete/', views.delete_invoice, name='delete'),
     
     # Statistics
     path('statistics/', views.invoice_statistics, name='statistics'),
+    path('nlp/metrics/', views.nlp_model_metrics, name='nlp-metrics'),
     
     # Material categories and suppliers
     path('materials/', views.MaterialCategoryListView.as_view(), name='materials'),
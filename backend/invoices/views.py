@@ -3,21 +3,27 @@ from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from django.shortcuts import get_object_or_404
-from django.db.models import Sum, Avg
-from django.utils import timezone
+from django.db.models import Sum, Count, F
 import os
 
-from .models import Invoice, InvoiceItem, MaterialCategory, Supplier
+from .models import Invoice, InvoiceItem, InvoiceStatistics, MaterialCategory, MaterialStatistics, Supplier
+from .batches import create_invoice_batch, get_batch_with_progress
 from .serializers import (
     InvoiceSerializer,
+    InvoiceSummarySerializer,
     InvoiceUploadSerializer,
+    InvoiceBatchUploadSerializer,
+    InvoiceBatchSerializer,
     InvoiceItemSerializer,
     MaterialCategorySerializer,
     SupplierSerializer,
     InvoiceProcessingResultSerializer,
     EnvironmentalImpactSerializer
 )
-from nlp_module.invoice_processor import InvoiceProcessor
+from .tasks import enqueue_invoice_processing
+from eco_api.pagination import KeysetPagination
+from nlp_module.invoice_processor import get_invoice_processor
+from nlp_module.registry import registry
 
 
 class InvoiceUploadView(APIView):
@@ -30,74 +36,83 @@ class InvoiceUploadView(APIView):
         if serializer.is_valid():
             invoice = serializer.save()
             
-            # Start async processing
-            self.process_invoice_async(invoice)
+            # Hand processing off to the task queue
+            enqueue_invoice_processing(invoice.id)
             
             return Response({
                 'message': 'Invoice uploaded successfully',
                 'invoice_id': invoice.id,
-                'status': 'processing'
+                'status': invoice.status
             }, status=status.HTTP_201_CREATED)
         
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+
+class InvoiceBatchUploadView(APIView):
+    """View for uploading many invoices (files and/or a zip archive) at once."""
     
-    def process_invoice_async(self, invoice):
-        """Process invoice asynchronously."""
-        try:
-            # Update status to processing
-            invoice.status = 'processing'
-            invoice.save()
-            
-            # Process the invoice
-            processor = InvoiceProcessor()
-            result = processor.process_invoice(invoice.file.path)
+    permission_classes = [permissions.IsAuthenticated]
+    
+    def post(self, request):
+        serializer = InvoiceBatchUploadSerializer(data=request.data)
+        if serializer.is_valid():
+            batch = create_invoice_batch(
+                request.user,
+                files=serializer.validated_data.get('files'),
+                archive=serializer.validated_data.get('archive'),
+            )
             
-            if result['processing_status'] == 'success':
-                # Update invoice with extracted data
-                metadata = result['metadata']
-                invoice.invoice_number = metadata.get('invoice_number')
-                invoice.invoice_date = metadata.get('invoice_date')
-                invoice.due_date = metadata.get('due_date')
-                invoice.total_amount = metadata.get('total_amount')
-                invoice.supplier_name = metadata.get('supplier_name')
-                invoice.extracted_text = str(result.get('items', []))
-                invoice.status = 'processed'
-                invoice.processed_at = timezone.now()
-                invoice.save()
-                
-                # Create invoice items
-                for item_data in result.get('items', []):
-                    InvoiceItem.objects.create(
-                        invoice=invoice,
-                        description=item_data.get('description', ''),
-                        quantity=item_data.get('quantity', 0),
-                        unit_price=item_data.get('unit_price', 0),
-                        total_price=item_data.get('total_price', 0),
-                        material_type=item_data.get('material_type', 'unknown'),
-                        weight_kg=item_data.get('weight_kg', 0),
-                        carbon_footprint_kg=item_data.get('carbon_footprint_kg', 0),
-                        water_footprint_l=item_data.get('water_footprint_l', 0),
-                        energy_footprint_kwh=item_data.get('energy_footprint_kwh', 0),
-                    )
-            else:
-                invoice.status = 'failed'
-                invoice.processing_errors = result.get('error', 'Unknown error')
-                invoice.save()
-                
-        except Exception as e:
-            invoice.status = 'failed'
-            invoice.processing_errors = str(e)
-            invoice.save()
+            return Response({
+                'message': 'Invoice batch uploaded successfully',
+                'batch_id': batch.id,
+                'total_files': batch.total_files,
+                'rejected_files': batch.rejected_files,
+            }, status=status.HTTP_202_ACCEPTED)
+        
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+
+class InvoiceBatchStatusView(APIView):
+    """View for polling the progress of a bulk upload."""
+    
+    permission_classes = [permissions.IsAuthenticated]
+    
+    def get(self, request, batch_id):
+        batch = get_batch_with_progress(batch_id, request.user)
+        if batch is None:
+            return Response({'error': 'Batch not found'}, status=status.HTTP_404_NOT_FOUND)
+        
+        return Response(InvoiceBatchSerializer(batch).data)
 
 
 class InvoiceListView(generics.ListAPIView):
     """View for listing user's invoices."""
     
-    serializer_class = InvoiceSerializer
+    serializer_class = InvoiceSummarySerializer
+    permission_classes = [permissions.IsAuthenticated]
+    pagination_class = KeysetPagination
+    
+    def get_queryset(self):
+        # Load only the selected summary columns; never the extracted text
+        queryset = Invoice.objects.filter(user=self.request.user).only(
+            *InvoiceSummarySerializer.only_fields(self.request, 'created_at')
+        )
+        if 'item_count' in InvoiceSummarySerializer.selected_fields(self.request):
+            queryset = queryset.annotate(item_count=Count('items'))
+        return queryset
+
+
+class InvoiceItemListView(generics.ListAPIView):
+    """View for paging through the items of one invoice."""
+    
+    serializer_class = InvoiceItemSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = KeysetPagination
     
     def get_queryset(self):
-        return Invoice.objects.filter(user=self.request.user)
+        return InvoiceItem.objects.filter(
+            invoice_id=self.kwargs['invoice_id'], invoice__user=self.request.user,
+        ).only(*InvoiceItemSerializer.only_fields(self.request, 'created_at'))
 
 
 class InvoiceDetailView(generics.RetrieveAPIView):
@@ -107,7 +122,8 @@ class InvoiceDetailView(generics.RetrieveAPIView):
     permission_classes = [permissions.IsAuthenticated]
     
     def get_queryset(self):
-        return Invoice.objects.filter(user=self.request.user)
+        # The serializer nests items and reads user.username
+        return Invoice.objects.filter(user=self.request.user).select_related('user').prefetch_related('items')
 
 
 class InvoiceProcessingStatusView(APIView):
@@ -131,7 +147,7 @@ class MaterialCategoryListView(generics.ListAPIView):
     
     serializer_class = MaterialCategorySerializer
     permission_classes = [permissions.IsAuthenticated]
-    queryset = MaterialCategory.objects.all()
+    queryset = MaterialCategory.objects.prefetch_related('alternatives')
 
 
 class SupplierListView(generics.ListAPIView):
@@ -145,48 +161,77 @@ class SupplierListView(generics.ListAPIView):
 @api_view(['GET'])
 @permission_classes([permissions.IsAuthenticated])
 def invoice_statistics(request):
-    """Get invoice statistics for the user."""
-    user = request.user
-    
-    # Get total invoices
-    total_invoices = Invoice.objects.filter(user=user).count()
-    processed_invoices = Invoice.objects.filter(user=user, status='processed').count()
-    
-    # Get environmental impact totals
-    impact_data = InvoiceItem.objects.filter(
-        invoice__user=user,
-        invoice__status='processed'
-    ).aggregate(
-        total_carbon=Sum('carbon_footprint_kg'),
-        total_water=Sum('water_footprint_l'),
-        total_energy=Sum('energy_footprint_kwh'),
-        avg_sustainability=Avg('invoice__items__material_type')
-    )
-    
-    # Get material breakdown
-    material_breakdown = InvoiceItem.objects.filter(
-        invoice__user=user,
-        invoice__status='processed'
-    ).values('material_type').annotate(
-        total_carbon=Sum('carbon_footprint_kg'),
-        total_water=Sum('water_footprint_l'),
-        total_energy=Sum('energy_footprint_kwh'),
-        count=Sum('quantity')
+    """Get invoice statistics for the user, from the incrementally maintained tables."""
+    statistics = InvoiceStatistics.objects.filter(user=request.user).first() or InvoiceStatistics()
+    material_breakdown = MaterialStatistics.objects.filter(user=request.user).order_by('-carbon_footprint_kg').values(
+        'material_type',
+        'item_count',
+        total_carbon=F('carbon_footprint_kg'),
+        total_water=F('water_footprint_l'),
+        total_energy=F('energy_footprint_kwh'),
+        count=F('quantity'),
     )
     
+    total_invoices = statistics.total_invoices
+    processed_invoices = statistics.processed_invoices
     return Response({
         'total_invoices': total_invoices,
         'processed_invoices': processed_invoices,
         'processing_rate': (processed_invoices / total_invoices * 100) if total_invoices > 0 else 0,
         'environmental_impact': {
-            'total_carbon_kg': impact_data['total_carbon'] or 0,
-            'total_water_l': impact_data['total_water'] or 0,
-            'total_energy_kwh': impact_data['total_energy'] or 0,
+            'total_carbon_kg': statistics.total_carbon_kg,
+            'total_water_l': statistics.total_water_l,
+            'total_energy_kwh': statistics.total_energy_kwh,
         },
         'material_breakdown': list(material_breakdown),
     })
 
 
+@api_view(['GET'])
+@permission_classes([permissions.IsAdminUser])
+def nlp_model_metrics(request):
+    """Report load time and memory usage of this worker's NLP models."""
+    return Response(registry.metrics())
+
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def invoice_alternatives(request, invoice_id):
+    """Suggest better-rated alternatives for every material on an invoice."""
+    invoice = get_object_or_404(Invoice, id=invoice_id, user=request.user)
+    factor_table = get_invoice_processor().factor_table
+    
+    # One aggregate per material; alternatives come from the precomputed index
+    materials = invoice.items.values('material_type').annotate(
+        item_count=Count('id'),
+        weight_kg=Sum('weight_kg'),
+    ).order_by('material_type')
+    
+    results = []
+    for row in materials:
+        weight_kg = float(row['weight_kg'] or 0)
+        alternatives = []
+        for alternative in factor_table.alternatives.get(row['material_type'], ()):
+            alternatives.append({
+                **alternative,
+                'carbon_savings_kg': -alternative['carbon_delta_per_kg'] * weight_kg,
+                'water_savings_l': -alternative['water_delta_per_kg'] * weight_kg,
+                'energy_savings_kwh': -alternative['energy_delta_per_kg'] * weight_kg,
+            })
+        results.append({
+            'material_type': row['material_type'],
+            'item_count': row['item_count'],
+            'weight_kg': weight_kg,
+            'alternatives': alternatives,
+        })
+    
+    return Response({
+        'invoice_id': invoice.id,
+        'factor_table_version': factor_table.version,
+        'materials': results,
+    })
+
+
 @api_view(['POST'])
 @permission_classes([permissions.IsAuthenticated])
 def reprocess_invoice(request, invoice_id):
@@ -200,11 +245,10 @@ def reprocess_invoice(request, invoice_id):
     
     # Clear previous errors and reprocess
     invoice.processing_errors = None
-    invoice.save()
+    invoice.save(update_fields=['processing_errors', 'updated_at'])
     
     # Start reprocessing
-    upload_view = InvoiceUploadView()
-    upload_view.process_invoice_async(invoice)
+    enqueue_invoice_processing(invoice.id)
     
     return Response({
         'message': 'Invoice reprocessing started',
@@ -228,4 +272,4 @@ def delete_invoice(request, invoice_id):
     
     return Response({
         'message': 'Invoice deleted successfully'
-    }, status=status.HTTP_204_NO_CONTENT) 
\ No newline at end of file
+    }, status=status.HTTP_204_NO_CONTENT)
\ No newline at end of file
@@ -0,0 +1,147 @@
+"""
+Single-pass extraction of invoice metadata and line items.
+
+All patterns are compiled once at import time. Text is scanned line by line:
+metadata patterns only ever see the first MAX_LINE_LENGTH characters of a
+line, and line items are parsed with a tokenizer instead of a backtracking
+regex, so the work per line is bounded and total time is linear in the size
+of the invoice no matter how hostile the input is.
+"""
+
+import re
+from decimal import Decimal
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Longest prefix of a line that metadata patterns are run against
+MAX_LINE_LENGTH = 1024
+
+# Patterns for each metadata field, most specific first
+METADATA_PATTERNS = {
+    'invoice_number': [
+        re.compile(r'invoice\s*(?:number|no\.?)\s*[:#]?\s*(\w+)', re.IGNORECASE),
+        re.compile(r'invoice\s*#?\s*(\w+)', re.IGNORECASE),
+        re.compile(r'#\s*(\w+)'),
+    ],
+    'total_amount': [
+        re.compile(r'\btotal\s*:?\s*\$?(\d+\.?\d*)', re.IGNORECASE),
+        re.compile(r'\bamount\s*due\s*:?\s*\$?(\d+\.?\d*)', re.IGNORECASE),
+        re.compile(r'\bgrand\s*total\s*:?\s*\$?(\d+\.?\d*)', re.IGNORECASE),
+    ],
+    'supplier_name': [
+        re.compile(r'\bfrom\s*:?\s*(.+)', re.IGNORECASE),
+        re.compile(r'\bsupplier\s*:?\s*(.+)', re.IGNORECASE),
+        re.compile(r'\bvendor\s*:?\s*(.+)', re.IGNORECASE),
+    ],
+}
+
+# Cheap pre-check on the lowercased line: lines without any of these can't
+# match a metadata pattern (case-sensitive search is several times faster)
+METADATA_HINT_PATTERN = re.compile(r'#|amount|from|invoice|supplier|total|vendor')
+
+# ISO dates are tried first so "2024-01-15" is not read as "24-01-15"
+DATE_PATTERN = re.compile(r'\b(\d{4}-\d{2}-\d{2}|\d{1,2}[/-]\d{1,2}[/-]\d{2,4})\b')
+
+# Line item columns: quantity, unit price, total price
+QUANTITY_PATTERN = re.compile(r'\d+\.?\d*')
+PRICE_PATTERN = re.compile(r'\$?(\d+\.?\d*)')
+DIGIT_PATTERN = re.compile(r'\d')
+
+
+def parse_item_line(line: str) -> Optional[Dict]:
+    """Parse a line of the form "Description  Qty  Price  Total" into an item.
+    
+    The description is the run of digit-free words right before the first
+    three consecutive numeric columns. Anything after the total is ignored.
+    """
+    tokens = line.split()
+    for i in range(1, len(tokens) - 2):
+        if not tokens[i][0].isdigit() or not QUANTITY_PATTERN.fullmatch(tokens[i]):
+            continue
+        unit_price = PRICE_PATTERN.fullmatch(tokens[i + 1])
+        total_price = PRICE_PATTERN.match(tokens[i + 2])
+        if not unit_price or not total_price:
+            continue
+        
+        start = i
+        while start > 0 and not DIGIT_PATTERN.search(tokens[start - 1]):
+            start -= 1
+        if start == i:
+            continue
+        
+        return {
+            'description': ' '.join(tokens[start:i]),
+            'quantity': Decimal(tokens[i]),
+            'unit_price': Decimal(unit_price.group(1)),
+            'total_price': Decimal(total_price.group(1)),
+        }
+    
+    return None
+
+
+class InvoiceTextScanner:
+    """Pulls invoice metadata and line items out of text in one pass over its lines.
+    
+    Feed lines in document order; each call returns the line item found on
+    that line, if any, and ``metadata`` reflects everything seen so far.
+    """
+    
+    def __init__(self):
+        self._matches = {field: [None] * len(patterns) for field, patterns in METADATA_PATTERNS.items()}
+        # Patterns still worth trying: anything after the best match so far can't win
+        self._pending = {field: len(patterns) for field, patterns in METADATA_PATTERNS.items()}
+        self._dates: List[str] = []
+    
+    def feed(self, line: str) -> Optional[Dict]:
+        """Scan one line for metadata and return its line item, if it has one."""
+        head = line[:MAX_LINE_LENGTH]
+        
+        if METADATA_HINT_PATTERN.search(head.lower()):
+            self._scan_metadata(head)
+        
+        if len(self._dates) < 2:
+            self._dates.extend(DATE_PATTERN.findall(head)[:2 - len(self._dates)])
+        
+        return parse_item_line(line)
+    
+    def _scan_metadata(self, head: str) -> None:
+        for field, pending in self._pending.items():
+            patterns = METADATA_PATTERNS[field]
+            for index in range(pending):
+                if self._matches[field][index] is None:
+                    match = patterns[index].search(head)
+                    if match:
+                        self._matches[field][index] = match.group(1)
+                        self._pending[field] = index
+                        break
+    
+    @property
+    def metadata(self) -> Dict:
+        """Metadata extracted from the lines fed so far."""
+        metadata = {}
+        for field, matches in self._matches.items():
+            value = next((match for match in matches if match is not None), None)
+            if value is not None:
+                metadata[field] = value
+        
+        if 'total_amount' in metadata:
+            metadata['total_amount'] = Decimal(metadata['total_amount'])
+        if 'supplier_name' in metadata:
+            metadata['supplier_name'] = metadata['supplier_name'].strip()
+        
+        if self._dates:
+            metadata['invoice_date'] = self._dates[0]
+            if len(self._dates) > 1:
+                metadata['due_date'] = self._dates[1]
+        
+        return metadata
+
+
+def scan_invoice(lines: Iterable[str]) -> Tuple[Dict, List[Dict]]:
+    """Extract metadata and line items from invoice lines in a single pass."""
+    scanner = InvoiceTextScanner()
+    items = []
+    for line in lines:
+        item = scanner.feed(line)
+        if item is not None:
+            items.append(item)
+    return scanner.metadata, items
\ No newline at end of file
@@ -0,0 +1,145 @@
+"""
+Immutable snapshots of the material impact factor table.
+"""
+
+import hashlib
+import json
+from types import MappingProxyType
+from typing import Dict, List, Mapping, Optional, Tuple
+
+from .impact_engine import ImpactEngine
+
+# Built-in factors, used until the database provides a table of its own
+DEFAULT_MATERIAL_FACTORS = {
+    'plastic': {
+        'carbon_factor': 2.5,  # kg CO2 per kg
+        'water_factor': 100,   # liters per kg
+        'energy_factor': 15,   # kWh per kg
+        'sustainability_rating': 3
+    },
+    'paper': {
+        'carbon_factor': 0.8,
+        'water_factor': 50,
+        'energy_factor': 5,
+        'sustainability_rating': 7
+    },
+    'recycled_paper': {
+        'carbon_factor': 0.4,
+        'water_factor': 25,
+        'energy_factor': 2.5,
+        'sustainability_rating': 9
+    },
+    'aluminum': {
+        'carbon_factor': 8.1,
+        'water_factor': 200,
+        'energy_factor': 50,
+        'sustainability_rating': 4
+    },
+    'steel': {
+        'carbon_factor': 1.8,
+        'water_factor': 150,
+        'energy_factor': 20,
+        'sustainability_rating': 6
+    },
+    'glass': {
+        'carbon_factor': 0.7,
+        'water_factor': 80,
+        'energy_factor': 8,
+        'sustainability_rating': 8
+    },
+    'wood': {
+        'carbon_factor': 0.3,
+        'water_factor': 30,
+        'energy_factor': 3,
+        'sustainability_rating': 8
+    },
+    'cotton': {
+        'carbon_factor': 2.1,
+        'water_factor': 10000,
+        'energy_factor': 12,
+        'sustainability_rating': 5
+    },
+    'organic_cotton': {
+        'carbon_factor': 1.5,
+        'water_factor': 7000,
+        'energy_factor': 8,
+        'sustainability_rating': 7
+    },
+    'polyester': {
+        'carbon_factor': 3.2,
+        'water_factor': 200,
+        'energy_factor': 18,
+        'sustainability_rating': 4
+    }
+}
+
+# Alternatives kept per material
+MAX_ALTERNATIVES = 5
+
+
+def _build_alternatives(factors: Dict[str, Dict], explicit: Dict[str, List[str]]) -> Dict[str, Tuple[Mapping, ...]]:
+    """Pre-sort the better-rated substitutes of every material.
+    
+    Candidates are the material's configured alternatives when it has any,
+    every other material otherwise. Deltas are per kg, alternative minus
+    current, so negative values are savings.
+    """
+    index = {}
+    for material, current in factors.items():
+        candidates = [name for name in explicit.get(material, []) if name in factors] or list(factors)
+        alternatives = []
+        for candidate in candidates:
+            alternative = factors[candidate]
+            improvement = alternative['sustainability_rating'] - current['sustainability_rating']
+            if candidate == material or improvement <= 0:
+                continue
+            alternatives.append(MappingProxyType({
+                'material': candidate,
+                'sustainability_rating': alternative['sustainability_rating'],
+                'improvement': improvement,
+                'carbon_factor': alternative['carbon_factor'],
+                'water_factor': alternative['water_factor'],
+                'energy_factor': alternative['energy_factor'],
+                'carbon_delta_per_kg': alternative['carbon_factor'] - current['carbon_factor'],
+                'water_delta_per_kg': alternative['water_factor'] - current['water_factor'],
+                'energy_delta_per_kg': alternative['energy_factor'] - current['energy_factor'],
+            }))
+        
+        # Highest improvement first, then the biggest carbon saving
+        alternatives.sort(key=lambda alt: (-alt['improvement'], alt['carbon_delta_per_kg']))
+        index[material] = tuple(alternatives[:MAX_ALTERNATIVES])
+    return index
+
+
+class FactorTable:
+    """Read-only material factors plus the arrays derived from them.
+    
+    A snapshot never changes after it is built, so threads can share it
+    without locking; new factors mean a new snapshot with a new version.
+    """
+    
+    def __init__(self, material_factors: Dict[str, Dict], source: str = 'defaults',
+                 alternatives: Optional[Dict[str, List[str]]] = None):
+        factors = {material: dict(values) for material, values in material_factors.items()}
+        alternatives = {material: sorted(names) for material, names in (alternatives or {}).items() if names}
+        
+        # Changes whenever any factor or alternative changes; part of every result cache key
+        self.version = hashlib.sha256(
+            json.dumps([factors, alternatives], sort_keys=True).encode()
+        ).hexdigest()[:16]
+        self.source = source
+        self.factors = MappingProxyType({material: MappingProxyType(values) for material, values in factors.items()})
+        
+        # Dense factor matrix for scoring whole invoices at once
+        self.engine = ImpactEngine(factors)
+        
+        # Material -> its better-rated substitutes, best first
+        self.alternatives: Mapping[str, Tuple[Mapping, ...]] = MappingProxyType(
+            _build_alternatives(factors, alternatives)
+        )
+    
+    def __repr__(self):
+        return f"<FactorTable {self.version} ({len(self.factors)} materials from {self.source})>"
+
+
+DEFAULT_FACTOR_TABLE = FactorTable(DEFAULT_MATERIAL_FACTORS)
\ No newline at end of file
@@ -2,239 +2,226 @@
 Invoice processing module using NLP to extract environmental impact data.
 """
 
-import re
+import hashlib
 import logging
-from typing import Dict, List, Optional, Tuple
+import os
+from typing import Callable, Dict, List, Optional, Tuple
 from decimal import Decimal
-import spacy
-from transformers import pipeline
 import pandas as pd
 import numpy as np
 from datetime import datetime
+import threading
+
+from .extraction import InvoiceTextScanner, scan_invoice
+from .factor_table import DEFAULT_FACTOR_TABLE, FactorTable
+from .impact_engine import CARBON, ENERGY, WATER, ImpactEngine, sustainability_scores
+from .material_matcher import MaterialMatcher
+from .registry import get_setting, registry
+from .text_extraction import text_extraction_stage
 
 logger = logging.getLogger(__name__)
 
+# Keyword-based classification, compiled into a MaterialMatcher
+MATERIAL_KEYWORDS = {
+    'plastic': ['plastic', 'pvc', 'polyethylene', 'polypropylene', 'pet', 'abs'],
+    'paper': ['paper', 'cardboard', 'card', 'sheet'],
+    'recycled_paper': ['recycled', 'recycled paper', 'eco-friendly paper'],
+    'aluminum': ['aluminum', 'aluminium', 'aluminum can', 'aluminium can'],
+    'steel': ['steel', 'iron', 'metal'],
+    'glass': ['glass', 'bottle', 'jar'],
+    'wood': ['wood', 'wooden', 'timber', 'lumber'],
+    'cotton': ['cotton', 'fabric', 'textile'],
+    'organic_cotton': ['organic cotton', 'organic fabric'],
+    'polyester': ['polyester', 'poly', 'synthetic fabric'],
+}
+
+
+def _source_fingerprint() -> str:
+    """Fingerprint the nlp_module sources so cached results expire with code changes."""
+    digest = hashlib.sha256()
+    package_dir = os.path.dirname(os.path.abspath(__file__))
+    for name in sorted(os.listdir(package_dir)):
+        if name.endswith('.py'):
+            with open(os.path.join(package_dir, name), 'rb') as f:
+                digest.update(f.read())
+    return digest.hexdigest()[:16]
+
+
+# Version of the extraction/classification code, part of every result cache key
+PROCESSOR_VERSION = _source_fingerprint()
+
+# Material classification only reads named entities. NER in the en_core_web
+# pipelines has its own tok2vec, so these components can be skipped.
+CLASSIFICATION_DISABLED_PIPES = ['tagger', 'parser', 'attribute_ruler', 'lemmatizer']
+
+# Callable returning the current FactorTable; installed by the invoices app
+_factor_table_provider: Optional[Callable[[], FactorTable]] = None
+
+
+def set_factor_table_provider(provider: Optional[Callable[[], FactorTable]]) -> None:
+    """Install the callable that supplies the current material factor table."""
+    global _factor_table_provider
+    _factor_table_provider = provider
+
 
 class InvoiceProcessor:
     """Main class for processing invoices and extracting environmental data."""
     
-    def __init__(self):
-        """Initialize the invoice processor with NLP models."""
-        try:
-            # Load spaCy model for entity extraction
-            self.nlp = spacy.load("en_core_web_sm")
-            logger.info("Loaded spaCy model successfully")
-        except OSError:
-            logger.warning("spaCy model not found, downloading...")
-            spacy.cli.download("en_core_web_sm")
-            self.nlp = spacy.load("en_core_web_sm")
+    def __init__(self, factor_table: Optional[FactorTable] = None):
+        """Initialize the invoice processor.
         
-        # Initialize transformers pipeline for text classification
-        try:
-            self.classifier = pipeline("text-classification", model="distilbert-base-uncased")
-            logger.info("Loaded transformers model successfully")
-        except Exception as e:
-            logger.warning(f"Could not load transformers model: {e}")
-            self.classifier = None
+        NLP models are not loaded here; they come from the process-wide
+        registry on first use so every processor shares the same instances.
+        Material factors come from the installed factor table provider
+        (see ``set_factor_table_provider``) unless a table is given.
+        """
+        # Fixed for pinned processors, otherwise read from the provider on each access
+        self._factor_table = factor_table
+        # Keyword matchers by factor table version, shared with pinned copies
+        self._matchers: Dict[str, MaterialMatcher] = {}
+    
+    @property
+    def factor_table(self) -> FactorTable:
+        """The material factor table this processor currently scores with."""
+        if self._factor_table is not None:
+            return self._factor_table
+        if _factor_table_provider is not None:
+            return _factor_table_provider()
+        return DEFAULT_FACTOR_TABLE
+    
+    def pinned(self) -> 'InvoiceProcessor':
+        """Return a processor bound to the current factor table.
         
-        # Material categories and their environmental impact factors
-        self.material_factors = {
-            'plastic': {
-                'carbon_factor': 2.5,  # kg CO2 per kg
-                'water_factor': 100,   # liters per kg
-                'energy_factor': 15,   # kWh per kg
-                'sustainability_rating': 3
-            },
-            'paper': {
-                'carbon_factor': 0.8,
-                'water_factor': 50,
-                'energy_factor': 5,
-                'sustainability_rating': 7
-            },
-            'recycled_paper': {
-                'carbon_factor': 0.4,
-                'water_factor': 25,
-                'energy_factor': 2.5,
-                'sustainability_rating': 9
-            },
-            'aluminum': {
-                'carbon_factor': 8.1,
-                'water_factor': 200,
-                'energy_factor': 50,
-                'sustainability_rating': 4
-            },
-            'steel': {
-                'carbon_factor': 1.8,
-                'water_factor': 150,
-                'energy_factor': 20,
-                'sustainability_rating': 6
-            },
-            'glass': {
-                'carbon_factor': 0.7,
-                'water_factor': 80,
-                'energy_factor': 8,
-                'sustainability_rating': 8
-            },
-            'wood': {
-                'carbon_factor': 0.3,
-                'water_factor': 30,
-                'energy_factor': 3,
-                'sustainability_rating': 8
-            },
-            'cotton': {
-                'carbon_factor': 2.1,
-                'water_factor': 10000,
-                'energy_factor': 12,
-                'sustainability_rating': 5
-            },
-            'organic_cotton': {
-                'carbon_factor': 1.5,
-                'water_factor': 7000,
-                'energy_factor': 8,
-                'sustainability_rating': 7
-            },
-            'polyester': {
-                'carbon_factor': 3.2,
-                'water_factor': 200,
-                'energy_factor': 18,
-                'sustainability_rating': 4
-            }
-        }
+        Use it for any multi-step run so a table refresh halfway through
+        can't mix factors from two versions in one result.
+        """
+        processor = InvoiceProcessor(self.factor_table)
+        processor._matchers = self._matchers
+        return processor
+    
+    @property
+    def material_factors(self):
+        """Read-only mapping of material type to its impact factors."""
+        return self.factor_table.factors
+    
+    @property
+    def factor_table_version(self) -> str:
+        return self.factor_table.version
+    
+    @property
+    def impact_engine(self) -> ImpactEngine:
+        return self.factor_table.engine
+    
+    @property
+    def material_matcher(self) -> MaterialMatcher:
+        """Keyword matcher for the current factor table's materials, built once per version."""
+        table = self.factor_table
+        matcher = self._matchers.get(table.version)
+        if matcher is None:
+            matcher = MaterialMatcher.from_materials(table.factors, MATERIAL_KEYWORDS)
+            if len(self._matchers) >= 4:
+                self._matchers.clear()
+            self._matchers[table.version] = matcher
+        return matcher
+    
+    @property
+    def nlp(self):
+        """Shared spaCy pipeline, loaded on first access."""
+        return registry.get('spacy')
+    
+    @property
+    def classifier(self):
+        """Shared transformers classifier, or None if it could not be loaded."""
+        return registry.get('classifier')
     
-    def extract_text_from_file(self, file_path: str) -> str:
+    def extract_text_from_file(self, file_path: str, content_hash: Optional[str] = None) -> str:
         """Extract text from uploaded file (PDF, image, etc.)."""
         try:
-            # For now, assume text is already extracted
-            # In production, implement OCR and PDF processing
-            with open(file_path, 'r', encoding='utf-8') as f:
-                return f.read()
+            return text_extraction_stage.extract(file_path, content_hash)
         except Exception as e:
             logger.error(f"Error extracting text from file: {e}")
             return ""
     
     def extract_invoice_metadata(self, text: str) -> Dict:
         """Extract basic invoice metadata using regex patterns."""
-        metadata = {}
-        
-        # Extract invoice number
-        invoice_patterns = [
-            r'invoice\s*#?\s*(\w+)',
-            r'invoice\s*number\s*:?\s*(\w+)',
-            r'#\s*(\w+)',
-        ]
-        for pattern in invoice_patterns:
-            match = re.search(pattern, text, re.IGNORECASE)
-            if match:
-                metadata['invoice_number'] = match.group(1)
-                break
-        
-        # Extract dates
-        date_patterns = [
-            r'(\d{1,2}[/-]\d{1,2}[/-]\d{2,4})',
-            r'(\d{4}-\d{2}-\d{2})',
-        ]
-        dates = []
-        for pattern in date_patterns:
-            matches = re.findall(pattern, text)
-            dates.extend(matches)
-        
-        if dates:
-            metadata['invoice_date'] = dates[0]
-            if len(dates) > 1:
-                metadata['due_date'] = dates[1]
-        
-        # Extract total amount
-        amount_patterns = [
-            r'total\s*:?\s*\$?(\d+\.?\d*)',
-            r'amount\s*due\s*:?\s*\$?(\d+\.?\d*)',
-            r'grand\s*total\s*:?\s*\$?(\d+\.?\d*)',
-        ]
-        for pattern in amount_patterns:
-            match = re.search(pattern, text, re.IGNORECASE)
-            if match:
-                metadata['total_amount'] = Decimal(match.group(1))
-                break
-        
-        # Extract supplier information
-        supplier_patterns = [
-            r'from\s*:?\s*([^\n]+)',
-            r'supplier\s*:?\s*([^\n]+)',
-            r'vendor\s*:?\s*([^\n]+)',
-        ]
-        for pattern in supplier_patterns:
-            match = re.search(pattern, text, re.IGNORECASE)
-            if match:
-                metadata['supplier_name'] = match.group(1).strip()
-                break
-        
-        return metadata
+        return scan_invoice(text.splitlines())[0]
     
     def extract_items(self, text: str) -> List[Dict]:
         """Extract individual items from invoice text."""
-        items = []
-        
-        # Split text into lines and look for item patterns
-        lines = text.split('\n')
-        
-        for line in lines:
-            # Look for patterns like: "Item Description Qty Price Total"
-            item_pattern = r'([^0-9]+)\s+(\d+\.?\d*)\s+\$?(\d+\.?\d*)\s+\$?(\d+\.?\d*)'
-            match = re.search(item_pattern, line)
-            
-            if match:
-                item = {
-                    'description': match.group(1).strip(),
-                    'quantity': Decimal(match.group(2)),
-                    'unit_price': Decimal(match.group(3)),
-                    'total_price': Decimal(match.group(4)),
-                }
-                items.append(item)
+        return scan_invoice(text.splitlines())[1]
+    
+    def _match_keywords(self, text: str) -> Optional[str]:
+        """Return the material whose keywords appear in the text, if any."""
+        return self.material_matcher.match(text)
+    
+    def _classify_doc(self, doc) -> str:
+        """Classify a material from the named entities of a spaCy doc."""
+        # Look for material-related entities
+        for ent in doc.ents:
+            if ent.label_ in ['PRODUCT', 'ORG', 'MISC']:
+                material = self._match_keywords(ent.text)
+                if material:
+                    return material
         
-        return items
+        # Default to unknown material
+        return 'unknown'
     
     def classify_material(self, description: str) -> str:
         """Classify material type from item description using NLP."""
-        description_lower = description.lower()
-        
-        # Keyword-based classification
-        material_keywords = {
-            'plastic': ['plastic', 'pvc', 'polyethylene', 'polypropylene', 'pet', 'abs'],
-            'paper': ['paper', 'cardboard', 'card', 'sheet'],
-            'recycled_paper': ['recycled', 'recycled paper', 'eco-friendly paper'],
-            'aluminum': ['aluminum', 'aluminium', 'aluminum can', 'aluminium can'],
-            'steel': ['steel', 'iron', 'metal'],
-            'glass': ['glass', 'bottle', 'jar'],
-            'wood': ['wood', 'wooden', 'timber', 'lumber'],
-            'cotton': ['cotton', 'fabric', 'textile'],
-            'organic_cotton': ['organic cotton', 'organic fabric'],
-            'polyester': ['polyester', 'poly', 'synthetic fabric'],
-        }
+        return self.classify_materials([description])[0]
+    
+    def classify_materials(self, descriptions: List[str], batch_size: Optional[int] = None,
+                           n_process: Optional[int] = None) -> List[str]:
+        """Classify many item descriptions at once, returning materials in input order.
         
-        for material, keywords in material_keywords.items():
-            if any(keyword in description_lower for keyword in keywords):
-                return material
+        Descriptions resolved by the keyword table never reach spaCy; the rest
+        go through a single ``nlp.pipe`` call with unused components disabled for
+        that call.
+        """
+        matcher = self.material_matcher
+        materials = [matcher.match(description) for description in descriptions]
+        misses = [i for i, material in enumerate(materials) if material is None]
+        if not misses:
+            return materials
         
-        # Use spaCy for more sophisticated classification
-        doc = self.nlp(description)
+        nlp = self.nlp
+        disabled = [name for name in CLASSIFICATION_DISABLED_PIPES if name in nlp.pipe_names]
+        # Disabled for this call only: select_pipes() would change the model every thread shares
+        docs = nlp.pipe(
+            (descriptions[i] for i in misses),
+            batch_size=batch_size or get_setting('NLP_PIPE_BATCH_SIZE', 256),
+            n_process=n_process or get_setting('NLP_PIPE_N_PROCESS', 1),
+            disable=disabled,
+        )
+        # nlp.pipe preserves input order, even with n_process > 1
+        for i, doc in zip(misses, docs):
+            materials[i] = self._classify_doc(doc)
         
-        # Look for material-related entities
-        for ent in doc.ents:
-            if ent.label_ in ['PRODUCT', 'ORG', 'MISC']:
-                ent_text = ent.text.lower()
-                for material, keywords in material_keywords.items():
-                    if any(keyword in ent_text for keyword in keywords):
-                        return material
+        return materials
+    
+    def classify_invoice_batch(self, invoices_items: List[List[Dict]], batch_size: Optional[int] = None,
+                               n_process: Optional[int] = None) -> List[List[str]]:
+        """Classify the items of several invoices in one batched pass."""
+        descriptions = [item['description'] for items in invoices_items for item in items]
+        materials = self.classify_materials(descriptions, batch_size=batch_size, n_process=n_process)
         
-        # Default to unknown material
-        return 'unknown'
+        # Split the flat result back into one list per invoice
+        results = []
+        offset = 0
+        for items in invoices_items:
+            results.append(materials[offset:offset + len(items)])
+            offset += len(items)
+        return results
     
-    def calculate_environmental_impact(self, item: Dict) -> Dict:
+    def calculate_environmental_impact(self, item: Dict, material_type: Optional[str] = None) -> Dict:
         """Calculate environmental impact for an item."""
-        material_type = self.classify_material(item['description'])
+        if material_type is None:
+            material_type = self.classify_material(item['description'])
         quantity = item.get('quantity', 1)
         
-        # Default weight assumption (1 kg per unit if not specified)
-        weight_kg = item.get('weight_kg', quantity)
+        # Default weight assumption (1 kg per unit if not specified). Quantities
+        # are parsed as Decimal, factors are floats
+        weight_kg = float(item.get('weight_kg', quantity))
         
         impact = {
             'material_type': material_type,
@@ -254,97 +241,183 @@ class InvoiceProcessor:
     
     def process_invoice(self, file_path: str) -> Dict:
         """Main method to process an invoice and extract all relevant data."""
-        try:
-            # Extract text from file
-            text = self.extract_text_from_file(file_path)
-            if not text:
-                raise ValueError("Could not extract text from file")
-            
-            # Extract metadata
-            metadata = self.extract_invoice_metadata(text)
-            
-            # Extract items
-            items = self.extract_items(text)
-            
-            # Calculate environmental impact for each item
-            processed_items = []
-            total_carbon = 0
-            total_water = 0
-            total_energy = 0
-            
-            for item in items:
-                impact = self.calculate_environmental_impact(item)
-                item.update(impact)
-                processed_items.append(item)
+        return self.process_invoices([file_path])[0]
+    
+    def process_invoices(self, file_paths: List[str], content_hashes: Optional[List[Optional[str]]] = None) -> List[Dict]:
+        """Process several invoices, classifying all of their items in one batch.
+        
+        ``content_hashes``, when given, key the extracted-text cache so files
+        don't need to be hashed again.
+        """
+        if content_hashes is None:
+            content_hashes = [None] * len(file_paths)
+        
+        preview_chars = get_setting('INVOICE_TEXT_PREVIEW_CHARS', 10_000)
+        parsed = []
+        for file_path, content_hash in zip(file_paths, content_hashes):
+            try:
+                # Extract text from file
+                text = self.extract_text_from_file(file_path, content_hash)
+                if not text:
+                    raise ValueError("Could not extract text from file")
                 
-                total_carbon += impact['carbon_footprint_kg']
-                total_water += impact['water_footprint_l']
-                total_energy += impact['energy_footprint_kwh']
-            
-            # Calculate overall invoice impact
-            invoice_impact = {
-                'total_carbon_footprint_kg': total_carbon,
-                'total_water_footprint_l': total_water,
-                'total_energy_footprint_kwh': total_energy,
-                'sustainability_score': self.calculate_sustainability_score(processed_items),
-            }
-            
-            return {
-                'metadata': metadata,
-                'items': processed_items,
-                'environmental_impact': invoice_impact,
-                'processing_status': 'success',
-            }
-            
+                # Extract metadata and items in a single pass
+                metadata, items = scan_invoice(text.splitlines())
+                parsed.append((metadata, items, text[:preview_chars], None))
+            except Exception as e:
+                parsed.append((None, [], None, e))
+        
+        try:
+            materials = self.classify_invoice_batch([items for _, items, _, _ in parsed])
         except Exception as e:
-            logger.error(f"Error processing invoice: {e}")
-            return {
-                'processing_status': 'failed',
-                'error': str(e),
-            }
+            logger.error(f"Error classifying invoice items: {e}")
+            return [self._failed_result(e) for _ in parsed]
+        
+        results = []
+        for (metadata, items, preview, error), item_materials in zip(parsed, materials):
+            if error is None:
+                try:
+                    result = self._build_result(metadata, items, item_materials)
+                    result['text_preview'] = preview
+                    results.append(result)
+                    continue
+                except Exception as e:
+                    error = e
+            results.append(self._failed_result(error))
+        
+        return results
+    
+    def _failed_result(self, error: Exception) -> Dict:
+        logger.error(f"Error processing invoice: {error}")
+        return {
+            'processing_status': 'failed',
+            'error': str(error),
+        }
+    
+    def stream_invoice(self, file_path: str, item_sink: Callable[[List[Dict]], None],
+                       content_hash: Optional[str] = None, chunk_size: Optional[int] = None) -> Dict:
+        """Process an invoice of any size with bounded memory.
+        
+        Lines are read lazily from the extracted text; items are classified,
+        scored and handed to ``item_sink`` in chunks of ``chunk_size``, then
+        dropped. The result carries the totals and an item count instead of
+        the items, and raises instead of returning a failed result so the
+        caller can roll back whatever the sink already wrote.
+        """
+        chunk_size = chunk_size or get_setting('INVOICE_STREAM_CHUNK_SIZE', 1000)
+        preview_chars = get_setting('INVOICE_TEXT_PREVIEW_CHARS', 10_000)
+        text_path = text_extraction_stage.extract_to_path(file_path, content_hash)
+        
+        scanner = InvoiceTextScanner()
+        totals = self._new_totals()
+        preview = []
+        preview_left = preview_chars
+        chunk = []
+        has_text = False
+        
+        with open(text_path, encoding='utf-8', errors='replace') as f:
+            for line in f:
+                has_text = True
+                if preview_left > 0:
+                    preview.append(line[:preview_left])
+                    preview_left -= len(preview[-1])
+                
+                item = scanner.feed(line.rstrip('\r\n'))
+                if item is not None:
+                    chunk.append(item)
+                    if len(chunk) >= chunk_size:
+                        self._score_chunk(chunk, totals)
+                        item_sink(chunk)
+                        chunk = []
+        
+        if chunk:
+            self._score_chunk(chunk, totals)
+            item_sink(chunk)
+        
+        if not has_text:
+            raise ValueError("Could not extract text from file")
+        
+        return {
+            'metadata': scanner.metadata,
+            'item_count': totals['item_count'],
+            'environmental_impact': self._impact_summary(totals),
+            'text_preview': ''.join(preview),
+            'processing_status': 'success',
+        }
+    
+    def _new_totals(self) -> Dict:
+        return {
+            'item_count': 0,
+            # Summed impact columns, see nlp_module.impact_engine
+            'impact': np.zeros(5),
+        }
+    
+    def _score_chunk(self, items: List[Dict], totals: Dict, materials: Optional[List[str]] = None) -> None:
+        """Classify (unless materials are given) and score items in place, adding to the totals."""
+        if materials is None:
+            materials = self.classify_materials([item['description'] for item in items])
+        
+        engine = self.impact_engine
+        weights = engine.item_weights(items)
+        impact = engine.compute(engine.encode(materials), weights)
+        
+        for item, material_type, weight_kg, row in zip(items, materials, weights.tolist(), impact.items.tolist()):
+            item['material_type'] = material_type
+            item['weight_kg'] = weight_kg
+            item['carbon_footprint_kg'] = row[CARBON]
+            item['water_footprint_l'] = row[WATER]
+            item['energy_footprint_kwh'] = row[ENERGY]
+        
+        totals['impact'] += impact.totals[0]
+        totals['item_count'] += len(items)
+    
+    def _impact_summary(self, totals: Dict) -> Dict:
+        """Overall invoice impact from accumulated totals."""
+        impact = totals['impact']
+        return {
+            'total_carbon_footprint_kg': float(impact[CARBON]),
+            'total_water_footprint_l': float(impact[WATER]),
+            'total_energy_footprint_kwh': float(impact[ENERGY]),
+            'sustainability_score': float(sustainability_scores(impact)[0]),
+        }
+    
+    def _build_result(self, metadata: Dict, items: List[Dict], materials: List[str]) -> Dict:
+        """Calculate item and invoice impact from already-classified items."""
+        totals = self._new_totals()
+        self._score_chunk(items, totals, materials)
+        
+        return {
+            'metadata': metadata,
+            'items': items,
+            'environmental_impact': self._impact_summary(totals),
+            'processing_status': 'success',
+        }
     
     def calculate_sustainability_score(self, items: List[Dict]) -> float:
         """Calculate overall sustainability score for the invoice."""
         if not items:
             return 0.0
         
-        total_score = 0
-        total_weight = 0
-        
-        for item in items:
-            material_type = item.get('material_type', 'unknown')
-            weight = item.get('weight_kg', 1)
-            
-            if material_type in self.material_factors:
-                score = self.material_factors[material_type]['sustainability_rating']
-            else:
-                score = 5  # Default neutral score
-            
-            total_score += score * weight
-            total_weight += weight
-        
-        return total_score / total_weight if total_weight > 0 else 0.0
+        engine = self.impact_engine
+        codes = engine.encode(item.get('material_type', 'unknown') for item in items)
+        weights = np.fromiter((float(item.get('weight_kg', 1)) for item in items), dtype=np.float64, count=len(items))
+        return float(engine.compute(codes, weights).scores[0])
     
     def get_material_alternatives(self, material_type: str) -> List[Dict]:
         """Get alternative materials with better environmental impact."""
-        if material_type not in self.material_factors:
-            return []
-        
-        current_rating = self.material_factors[material_type]['sustainability_rating']
-        alternatives = []
-        
-        for alt_material, factors in self.material_factors.items():
-            if alt_material != material_type and factors['sustainability_rating'] > current_rating:
-                improvement = factors['sustainability_rating'] - current_rating
-                alternatives.append({
-                    'material': alt_material,
-                    'sustainability_rating': factors['sustainability_rating'],
-                    'improvement': improvement,
-                    'carbon_factor': factors['carbon_factor'],
-                    'water_factor': factors['water_factor'],
-                    'energy_factor': factors['energy_factor'],
-                })
-        
-        # Sort by improvement (highest first)
-        alternatives.sort(key=lambda x: x['improvement'], reverse=True)
-        return alternatives[:5]  # Return top 5 alternatives 
\ No newline at end of file
+        # Precomputed when the factor table is loaded
+        return [dict(alternative) for alternative in self.factor_table.alternatives.get(material_type, ())]
+
+
+_shared_processor = None
+_shared_processor_lock = threading.Lock()
+
+
+def get_invoice_processor() -> InvoiceProcessor:
+    """Return the process-wide InvoiceProcessor instance."""
+    global _shared_processor
+    if _shared_processor is None:
+        with _shared_processor_lock:
+            if _shared_processor is None:
+                _shared_processor = InvoiceProcessor()
+    return _shared_processor
\ No newline at end of file
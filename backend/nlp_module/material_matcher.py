@@ -0,0 +1,91 @@
+"""
+Precompiled keyword matcher for material classification.
+"""
+
+import re
+from typing import Dict, Iterable, List, Optional
+
+
+def _trie_pattern(keywords: Iterable[str]) -> str:
+    """Compile keywords into a prefix-trie regex.
+    
+    Python's re engine tries a flat alternation branch by branch at every
+    position; factoring out shared prefixes lets it reject most positions
+    after a single character. Optional suffixes are greedy, so the longest
+    keyword starting at a position is preferred.
+    """
+    trie: Dict = {}
+    for keyword in keywords:
+        node = trie
+        for char in keyword:
+            node = node.setdefault(char, {})
+        node[''] = True
+    
+    def build(node: Dict) -> str:
+        branches = []
+        for char, child in sorted(node.items()):
+            if char:
+                branches.append((r'\s+' if char == ' ' else re.escape(char)) + build(child))
+        if not branches:
+            return ''
+        pattern = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+        # A keyword ends here, so everything after this node is optional
+        return f'(?:{pattern})?' if '' in node else pattern
+    
+    return build(trie)
+
+
+class MaterialMatcher:
+    """Classifies item descriptions with a single precompiled regex.
+    
+    All keywords are compiled into one trie-shaped pattern anchored on word
+    boundaries, so "pet" no longer matches "carpet". When several keywords
+    appear in a description the longest one wins ("recycled paper" beats
+    "paper"), with ties going to the earliest occurrence.
+    """
+    
+    def __init__(self, keywords: Dict[str, List[str]]):
+        self._material_by_keyword: Dict[str, str] = {}
+        for material, material_keywords in keywords.items():
+            for keyword in material_keywords:
+                self._material_by_keyword.setdefault(self._normalize(keyword), material)
+        
+        self._pattern = None
+        if self._material_by_keyword:
+            # Allow simple plurals ("bottles", "glasses") without matching inside words
+            self._pattern = re.compile(rf'\b({_trie_pattern(self._material_by_keyword)})(?:e?s)?\b')
+    
+    @classmethod
+    def from_materials(cls, materials: Iterable[str], keywords: Dict[str, List[str]]) -> 'MaterialMatcher':
+        """Build a matcher for the given materials, using each name as a keyword too."""
+        table = {}
+        for material in materials:
+            table[material] = [material.replace('_', ' ')] + list(keywords.get(material, []))
+        
+        # Keep keyword-only materials so classification doesn't depend on the factor table
+        for material, material_keywords in keywords.items():
+            table.setdefault(material, list(material_keywords))
+        return cls(table)
+    
+    @staticmethod
+    def _normalize(keyword: str) -> str:
+        return ' '.join(keyword.lower().split())
+    
+    def match(self, text: str) -> Optional[str]:
+        """Return the material for the longest keyword found in the text, if any."""
+        if self._pattern is None:
+            return None
+        
+        best = None
+        for match in self._pattern.finditer(text.lower()):
+            keyword = match.group(1)
+            if best is None or len(keyword) > len(best):
+                best = keyword
+        
+        if best is None:
+            return None
+        material = self._material_by_keyword.get(best)
+        if material is None:
+            # Matched across irregular whitespace
+            material = self._material_by_keyword[self._normalize(best)]
+        return material
\ No newline at end of file
@@ -0,0 +1,145 @@
+"""
+Process-wide registry for the NLP models used by the invoice processor.
+
+Models are loaded lazily on first use, exactly once per process, and shared
+by every request handled by that process. Calling ``warm_up()`` before the
+server forks its workers lets them share the loaded pages copy-on-write.
+"""
+
+import logging
+import os
+import resource
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Callable, Dict, Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def get_setting(name: str, default):
+    """Read a Django setting, falling back to the default outside Django."""
+    try:
+        from django.conf import settings
+        if settings.configured:
+            return getattr(settings, name, default)
+    except ImportError:
+        pass
+    return default
+
+
+def current_rss_bytes() -> int:
+    """Return the resident set size of the current process in bytes."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        # Peak RSS is the best we can do without procfs (KiB on Linux, bytes on macOS)
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class ModelRegistry:
+    """Loads each registered model once per process and hands out the shared instance."""
+    
+    def __init__(self):
+        self._loaders: Dict[str, Callable] = {}
+        self._models: Dict[str, object] = {}
+        self._metrics: Dict[str, Dict] = {}
+        self._locks: Dict[str, threading.Lock] = {}
+        self._registry_lock = threading.Lock()
+    
+    def register(self, name: str, loader: Callable) -> None:
+        """Register a zero-argument loader under the given model name."""
+        with self._registry_lock:
+            self._loaders[name] = loader
+            self._locks.setdefault(name, threading.Lock())
+    
+    def get(self, name: str):
+        """Return the shared model instance, loading it on first use."""
+        try:
+            return self._models[name]
+        except KeyError:
+            pass
+        
+        if name not in self._loaders:
+            raise KeyError(f"No NLP model registered under '{name}'")
+        
+        with self._locks[name]:
+            # Another thread may have finished loading while we waited
+            if name in self._models:
+                return self._models[name]
+            
+            rss_before = current_rss_bytes()
+            started = time.perf_counter()
+            model = self._loaders[name]()
+            elapsed = time.perf_counter() - started
+            
+            self._metrics[name] = {
+                'loaded': model is not None,
+                'load_seconds': round(elapsed, 4),
+                'rss_delta_bytes': max(current_rss_bytes() - rss_before, 0),
+                'loaded_at': datetime.now(timezone.utc).isoformat(),
+                'pid': os.getpid(),
+            }
+            self._models[name] = model
+            logger.info(f"Loaded NLP model '{name}' in {elapsed:.2f}s")
+        
+        return model
+    
+    def is_loaded(self, name: str) -> bool:
+        """Check whether a model has already been loaded in this process."""
+        return name in self._models
+    
+    def warm_up(self, names: Optional[Iterable[str]] = None) -> None:
+        """Eagerly load the given models (all registered models by default)."""
+        if names is None:
+            names = list(self._loaders)
+        for name in names:
+            self.get(name)
+    
+    def metrics(self) -> Dict:
+        """Return load time and memory metrics for every registered model."""
+        models = {}
+        for name in self._loaders:
+            models[name] = self._metrics.get(name, {'loaded': False})
+        
+        return {
+            'pid': os.getpid(),
+            'rss_bytes': current_rss_bytes(),
+            'models': models,
+        }
+
+
+def _load_spacy_model():
+    """Load the spaCy pipeline, downloading it on first run if missing."""
+    import spacy
+    
+    model_name = get_setting('NLP_SPACY_MODEL', 'en_core_web_sm')
+    try:
+        return spacy.load(model_name)
+    except OSError:
+        logger.warning("spaCy model not found, downloading...")
+        spacy.cli.download(model_name)
+        return spacy.load(model_name)
+
+
+def _load_text_classifier():
+    """Load the transformers text-classification pipeline, if available."""
+    try:
+        from transformers import pipeline
+        return pipeline("text-classification", model=get_setting('NLP_CLASSIFIER_MODEL', 'distilbert-base-uncased'))
+    except Exception as e:
+        logger.warning(f"Could not load transformers model: {e}")
+        return None
+
+
+registry = ModelRegistry()
+registry.register('spacy', _load_spacy_model)
+registry.register('classifier', _load_text_classifier)
+
+
+def warm_up(names: Optional[Iterable[str]] = None) -> None:
+    """Pre-load NLP models, e.g. in a pre-fork server hook."""
+    if names is None:
+        names = get_setting('NLP_PRELOAD_MODELS', ['spacy', 'classifier'])
+    registry.warm_up(names)
\ No newline at end of file
@@ -0,0 +1,17 @@
+"""
+Celery tasks for the NLP module.
+
+Registered through CELERY_IMPORTS, since nlp_module isn't a Django app.
+"""
+
+from typing import List, Tuple
+
+from celery import shared_task
+
+from .text_extraction import extract_pdf_page_range
+
+
+@shared_task
+def extract_pdf_pages_task(file_path: str, first_page: int, last_page: int, deadline: float) -> List[Tuple[int, str]]:
+    """Extract one page range of a PDF for a worker extracting the whole document."""
+    return extract_pdf_page_range(file_path, first_page, last_page, deadline)
\ No newline at end of file
@@ -0,0 +1,270 @@
+"""
+Text extraction stage for uploaded invoices.
+
+Digital PDFs are read from their embedded text layer; OCR is only used for
+pages without one, and for images. PDF pages are extracted in ranges: over a
+process pool in servers and scripts, and as Celery subtasks on
+TEXT_EXTRACTION_QUEUE inside Celery workers, which can't start processes.
+Every page checks the per-document deadline and OCR only gets the time that
+is left. Extracted text is cached on disk by content hash so a document is
+never OCR'd twice.
+"""
+
+import hashlib
+import logging
+import multiprocessing
+import os
+import tempfile
+import time
+from concurrent.futures import FIRST_EXCEPTION, ProcessPoolExecutor, wait
+from typing import Callable, Dict, List, Optional, Tuple
+
+from .registry import get_setting
+
+logger = logging.getLogger(__name__)
+
+# Bump to invalidate every cached extraction
+TEXT_EXTRACTION_VERSION = 1
+
+# Pages with fewer non-whitespace characters than this are treated as scans
+MIN_TEXT_LAYER_CHARS = 20
+
+OCR_RESOLUTION = 300
+
+
+class TextExtractionError(Exception):
+    """Raised when text cannot be extracted from a document."""
+
+
+class TextExtractionTimeout(TextExtractionError):
+    """Raised when a document takes longer than the configured timeout."""
+
+
+def detect_file_type(file_path: str) -> str:
+    """Detect the document type from its leading bytes, falling back to the extension."""
+    with open(file_path, 'rb') as f:
+        header = f.read(8)
+    
+    if header.startswith(b'%PDF'):
+        return 'pdf'
+    if header.startswith(b'\x89PNG') or header.startswith(b'\xff\xd8\xff'):
+        return 'image'
+    
+    extension = os.path.splitext(file_path)[1].lower()
+    if extension == '.pdf':
+        return 'pdf'
+    if extension in ('.png', '.jpg', '.jpeg', '.tif', '.tiff'):
+        return 'image'
+    return 'text'
+
+
+def _ocr_image(image, timeout: Optional[float] = None) -> str:
+    """OCR a PIL image after binarizing it with OpenCV."""
+    import cv2
+    import numpy as np
+    import pytesseract
+    
+    gray = cv2.cvtColor(np.array(image.convert('RGB')), cv2.COLOR_RGB2GRAY)
+    _, binary = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    return pytesseract.image_to_string(binary, timeout=timeout or 0)
+
+
+def _time_left(deadline: Optional[float], page: int) -> Optional[float]:
+    if deadline is None:
+        return None
+    remaining = deadline - time.time()
+    if remaining <= 0:
+        raise TextExtractionTimeout(f"PDF extraction ran out of time at page {page + 1}")
+    return remaining
+
+
+def extract_pdf_page_range(file_path: str, first_page: int, last_page: int,
+                           deadline: Optional[float] = None) -> List[Tuple[int, str]]:
+    """Extract pages [first_page, last_page) of a PDF, OCR-ing pages with no text layer.
+    
+    ``deadline`` is a ``time.time()`` timestamp, so it holds in other
+    processes and on other hosts. Runs in pool workers and Celery subtasks,
+    so it only takes picklable, JSON-serializable arguments.
+    """
+    import pdfplumber
+    
+    pages = []
+    with pdfplumber.open(file_path) as pdf:
+        for number in range(first_page, last_page):
+            remaining = _time_left(deadline, number)
+            page = pdf.pages[number]
+            text = page.extract_text() or ''
+            if len(''.join(text.split())) < MIN_TEXT_LAYER_CHARS:
+                try:
+                    text = _ocr_image(page.to_image(resolution=OCR_RESOLUTION).original, timeout=remaining)
+                except RuntimeError as e:
+                    # pytesseract signals its timeout with a RuntimeError
+                    raise TextExtractionTimeout(f"OCR of page {number + 1} ran out of time") from e
+            pages.append((number, text))
+            page.flush_cache()
+    return pages
+
+
+def _pdf_page_count(file_path: str) -> int:
+    import pdfplumber
+    
+    with pdfplumber.open(file_path) as pdf:
+        return len(pdf.pages)
+
+
+def _hash_file(file_path: str) -> str:
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+_pool = None
+
+
+def _get_pool() -> Optional[ProcessPoolExecutor]:
+    """Return the shared extraction pool, or None where child processes aren't allowed."""
+    global _pool
+    # Celery prefork children are daemonic and cannot start processes of their own
+    if multiprocessing.current_process().daemon:
+        return None
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=get_setting('TEXT_EXTRACTION_WORKERS', None))
+    return _pool
+
+
+def _extract_in_pool(pool: ProcessPoolExecutor, file_path: str, ranges: List[Tuple[int, int]],
+                     deadline: float, timeout: float) -> Dict[int, str]:
+    """Extract page ranges across the process pool.
+    
+    Ranges still running at the deadline can't be cancelled, but they stop
+    at their next page check (OCR is bounded by the deadline too), so they
+    free the pool shortly after it instead of holding it for whole ranges.
+    """
+    futures = [pool.submit(extract_pdf_page_range, file_path, first, last, deadline) for first, last in ranges]
+    done, pending = wait(futures, timeout=max(deadline - time.time(), 0), return_when=FIRST_EXCEPTION)
+    if pending:
+        for future in pending:
+            future.cancel()
+        if not any(future.exception() for future in done):
+            raise TextExtractionTimeout(f"PDF extraction exceeded {timeout}s")
+    
+    pages: Dict[int, str] = {}
+    for future in done:
+        pages.update(future.result())
+    return pages
+
+
+def _extract_in_subtasks(queue: str, file_path: str, ranges: List[Tuple[int, int]],
+                         deadline: float, timeout: float) -> Dict[int, str]:
+    """Extract page ranges as a group of Celery subtasks and wait for all of them.
+    
+    The subtasks must be consumed by workers other than the one waiting
+    here; otherwise a busy worker pool can end up waiting on itself.
+    """
+    from celery import group
+    from celery.exceptions import TimeoutError as CeleryTimeoutError
+    
+    from .tasks import extract_pdf_pages_task
+    
+    result = group(
+        extract_pdf_pages_task.s(file_path, first, last, deadline).set(queue=queue, expires=timeout)
+        for first, last in ranges
+    ).apply_async()
+    pages: Dict[int, str] = {}
+    try:
+        for range_pages in result.get(timeout=max(deadline - time.time(), 0), disable_sync_subtasks=False):
+            pages.update((number, text) for number, text in range_pages)
+    except CeleryTimeoutError:
+        result.revoke()
+        raise TextExtractionTimeout(f"PDF extraction exceeded {timeout}s")
+    except Exception:
+        result.revoke()
+        raise
+    return pages
+
+
+def extract_pdf_text(file_path: str, timeout: float) -> str:
+    """Extract text from a PDF, spreading its pages over a process pool or Celery subtasks."""
+    deadline = time.time() + timeout
+    page_count = _pdf_page_count(file_path)
+    chunk = max(get_setting('TEXT_EXTRACTION_PAGES_PER_TASK', 4), 1)
+    ranges = [(start, min(start + chunk, page_count)) for start in range(0, page_count, chunk)]
+    
+    pool = _get_pool() if len(ranges) > 1 else None
+    queue = get_setting('TEXT_EXTRACTION_QUEUE', '')
+    if pool is not None:
+        pages = _extract_in_pool(pool, file_path, ranges, deadline, timeout)
+    elif len(ranges) > 1 and queue and multiprocessing.current_process().daemon:
+        pages = _extract_in_subtasks(queue, file_path, ranges, deadline, timeout)
+    else:
+        pages = {}
+        for first_page, last_page in ranges:
+            pages.update(extract_pdf_page_range(file_path, first_page, last_page, deadline))
+    
+    return '\n'.join(pages[number] for number in sorted(pages))
+
+
+def extract_image_text(file_path: str, timeout: float) -> str:
+    """OCR a scanned invoice image."""
+    from PIL import Image
+    
+    with Image.open(file_path) as image:
+        try:
+            return _ocr_image(image, timeout=timeout)
+        except RuntimeError as e:
+            # pytesseract signals its timeout with a RuntimeError
+            raise TextExtractionTimeout(str(e)) from e
+
+
+class TextExtractionStage:
+    """Turns uploaded documents into plain text files, with a disk cache."""
+    
+    def __init__(self, cache_dir: Optional[str] = None):
+        self.cache_dir = cache_dir
+        self._extractors: Dict[str, Callable[[str, float], str]] = {}
+    
+    def register(self, file_type: str, extractor: Callable[[str, float], str]) -> None:
+        """Register an extractor ``(file_path, timeout) -> text`` for a file type."""
+        self._extractors[file_type] = extractor
+    
+    def _cache_path(self, content_hash: str) -> str:
+        cache_dir = self.cache_dir or get_setting('TEXT_EXTRACTION_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'invoice_text'))
+        return os.path.join(cache_dir, f'v{TEXT_EXTRACTION_VERSION}', content_hash[:2], f'{content_hash}.txt')
+    
+    def extract_to_path(self, file_path: str, content_hash: Optional[str] = None) -> str:
+        """Return the path of a UTF-8 text file holding the document's text."""
+        file_type = detect_file_type(file_path)
+        if file_type == 'text':
+            # Already text, nothing to extract or cache
+            return file_path
+        
+        cache_path = self._cache_path(content_hash or _hash_file(file_path))
+        if os.path.exists(cache_path):
+            return cache_path
+        
+        extractor = self._extractors.get(file_type)
+        if extractor is None:
+            raise TextExtractionError(f"No text extractor registered for '{file_type}' files")
+        text = extractor(file_path, get_setting('TEXT_EXTRACTION_TIMEOUT', 120))
+        
+        # Write then rename so concurrent readers never see a partial file
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        handle, tmp_path = tempfile.mkstemp(dir=os.path.dirname(cache_path), suffix='.tmp')
+        with os.fdopen(handle, 'w', encoding='utf-8') as f:
+            f.write(text)
+        os.replace(tmp_path, cache_path)
+        
+        logger.info(f"Extracted {len(text)} characters from {file_type} {file_path}")
+        return cache_path
+    
+    def extract(self, file_path: str, content_hash: Optional[str] = None) -> str:
+        """Return the document's text."""
+        with open(self.extract_to_path(file_path, content_hash), encoding='utf-8') as f:
+            return f.read()
+
+
+text_extraction_stage = TextExtractionStage()
+text_extraction_stage.register('pdf', extract_pdf_text)
+text_extraction_stage.register('image', extract_image_text)
\ No newline at end of file
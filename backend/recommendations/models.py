@@ -48,6 +48,19 @@ class Recommendation(models.Model):
     
     class Meta:
         ordering = ['-priority', '-created_at']
+        indexes = [
+            # Keyset pages of the recommendation list
+            models.Index(fields=['user', '-created_at', '-id'], name='rec_user_created_idx'),
+            models.Index(
+                fields=['user', '-created_at'], condition=models.Q(is_implemented=True),
+                name='rec_implemented_idx',
+            ),
+            # Open recommendations are what the list and stats views mostly show
+            models.Index(
+                fields=['user', '-created_at'], condition=models.Q(is_implemented=False, is_dismissed=False),
+                name='rec_open_idx',
+            ),
+        ]
     
     def __str__(self):
         return f"{self.title} - {self.get_priority_display()}"
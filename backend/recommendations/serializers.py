@@ -1,8 +1,10 @@
 from rest_framework import serializers
+
+from eco_api.serializers import SelectableFieldsMixin
 from .models import Recommendation, RecommendationAction
 
 
-class RecommendationSerializer(serializers.ModelSerializer):
+class RecommendationSerializer(SelectableFieldsMixin, serializers.ModelSerializer):
     """Serializer for Recommendation model."""
     
     class Meta:
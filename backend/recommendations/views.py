@@ -11,15 +11,19 @@ from .serializers import (
     RecommendationActionSerializer,
     RecommendationStatsSerializer
 )
+from eco_api.pagination import KeysetPagination
 
 
 class RecommendationListView(generics.ListCreateAPIView):
     """View for listing and creating recommendations."""
     serializer_class = RecommendationSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = KeysetPagination
     
     def get_queryset(self):
-        return Recommendation.objects.filter(user=self.request.user)
+        return Recommendation.objects.filter(user=self.request.user).only(
+            *RecommendationSerializer.only_fields(self.request, 'created_at')
+        )
     
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
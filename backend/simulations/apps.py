@@ -3,4 +3,7 @@ from django.apps import AppConfig
 
 class SimulationsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
-    name = 'simulations' 
\ No newline at end of file
+    name = 'simulations' 
+    
+    def ready(self):
+        from . import signals  # noqa: F401
\ No newline at end of file
@@ -0,0 +1,171 @@
+"""
+Baseline snapshots shared across simulation runs.
+
+Loading a baseline reads every item of the invoices involved; users iterate
+on parameters over the same invoices many times. Each process keeps recent
+baselines in a size-bounded LRU, keyed by user, invoice set, factor table
+version and the revisions of what the baseline was read from: one per
+invoice, plus one per user for baselines over all their processed invoices.
+Saving or deleting an invoice retires its revisions in the shared cache, so
+every process stops using snapshots that include it. A hit costs one shared
+cache read and no database queries.
+"""
+
+import logging
+import threading
+import uuid
+from collections import OrderedDict
+from typing import Hashable, List, Optional, Tuple
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import FloatField, Value
+from django.db.models.functions import Cast, Coalesce
+
+from .engine import Baseline, SimulationError, build_baseline
+from invoices.factor_table import get_factor_table, material_key
+from invoices.models import InvoiceItem
+from nlp_module.factor_table import FactorTable
+
+logger = logging.getLogger(__name__)
+
+
+def _float_column(name: str):
+    return Coalesce(Cast(name, FloatField()), Value(0.0))
+
+
+def load_baseline(user_id: int, invoice_ids: Optional[List[int]] = None,
+                  factor_table: Optional[FactorTable] = None) -> Baseline:
+    """Items of the given invoices (or of all the user's processed invoices) as a baseline, from the database."""
+    items = InvoiceItem.objects.filter(invoice__user_id=user_id, invoice__status='processed')
+    if invoice_ids:
+        items = items.filter(invoice_id__in=invoice_ids)
+    
+    rows = list(items.order_by().values_list(
+        'material_type', 'invoice__supplier_name',
+        # Items are weighed by quantity when the invoice gave no weight, as when they were scored
+        Coalesce(Cast('weight_kg', FloatField()), Cast('quantity', FloatField()), Value(0.0)),
+        _float_column('total_price'), _float_column('carbon_footprint_kg'),
+        _float_column('water_footprint_l'), _float_column('energy_footprint_kwh'),
+    ))
+    if not rows:
+        raise SimulationError('No processed invoice items to simulate against')
+    
+    materials, suppliers, weights, costs, carbon, water, energy = zip(*rows)
+    return build_baseline(
+        (factor_table or get_factor_table()).engine,
+        [material_key(material or 'unknown') for material in materials], suppliers,
+        weights, costs, np.column_stack([carbon, water, energy]),
+    )
+
+
+def _nbytes(baseline: Baseline) -> int:
+    return sum(getattr(baseline, field).nbytes for field in (
+        'factors', 'material_codes', 'supplier_codes', 'weights', 'costs', 'impacts',
+    ))
+
+
+class BaselineCache:
+    """In-process LRU of baselines, bounded by entry count and by total array bytes."""
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries: 'OrderedDict[Hashable, Baseline]' = OrderedDict()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+    
+    def get(self, key: Hashable) -> Optional[Baseline]:
+        with self._lock:
+            baseline = self._entries.get(key)
+            if baseline is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return baseline
+    
+    def put(self, key: Hashable, baseline: Baseline) -> None:
+        size = _nbytes(baseline)
+        if size > settings.SIMULATION_BASELINE_CACHE_MAX_BYTES:
+            return
+        # Runs copy the arrays before changing them; this makes sure nothing else does
+        for array in (baseline.factors, baseline.material_codes, baseline.supplier_codes, baseline.weights, baseline.costs,
+                      baseline.impacts):
+            array.setflags(write=False)
+        
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= _nbytes(previous)
+            self._entries[key] = baseline
+            self._bytes += size
+            while (len(self._entries) > settings.SIMULATION_BASELINE_CACHE_MAX_ENTRIES
+                   or self._bytes > settings.SIMULATION_BASELINE_CACHE_MAX_BYTES):
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= _nbytes(evicted)
+    
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+    
+    def __len__(self):
+        return len(self._entries)
+    
+    @property
+    def nbytes(self) -> int:
+        return self._bytes
+
+
+baseline_cache = BaselineCache()
+
+
+def _user_revision_key(user_id: int) -> str:
+    return f"simulation-baseline-revision:user:{user_id}"
+
+
+def _invoice_revision_key(invoice_id: int) -> str:
+    return f"simulation-baseline-revision:invoice:{invoice_id}"
+
+
+def _revisions(keys: List[str]) -> Tuple[str, ...]:
+    """Current revision of each key, starting a new one for keys that are missing."""
+    revisions = cache.get_many(keys)
+    for key in keys:
+        if key not in revisions:
+            # Lost or never set: a new revision, so snapshots read under the old one stop matching
+            revision = uuid.uuid4().hex
+            if not cache.add(key, revision, timeout=settings.SIMULATION_BASELINE_REVISION_TIMEOUT):
+                revision = cache.get(key) or revision
+            revisions[key] = revision
+    return tuple(revisions[key] for key in keys)
+
+
+def get_baseline(user_id: int, invoice_ids: Optional[List[int]] = None) -> Baseline:
+    """The baseline for these invoices (or all processed ones), from the snapshot cache when current."""
+    invoice_set = tuple(sorted(set(invoice_ids))) if invoice_ids else None
+    if invoice_set is None:
+        revision_keys = [_user_revision_key(user_id)]
+    else:
+        revision_keys = [_invoice_revision_key(invoice_id) for invoice_id in invoice_set]
+    factor_table = get_factor_table()
+    # Revisions are read before the items, so a change made while loading retires this snapshot
+    key = (user_id, invoice_set, factor_table.version, _revisions(revision_keys))
+    
+    baseline = baseline_cache.get(key)
+    if baseline is None:
+        baseline = load_baseline(user_id, list(invoice_set) if invoice_set else None, factor_table)
+        baseline_cache.put(key, baseline)
+        logger.info(
+            f"Loaded simulation baseline for user {user_id} ({baseline.size} items, "
+            f"{len(baseline_cache)} snapshots cached)"
+        )
+    return baseline
+
+
+def invalidate_baselines(user_id: int, invoice_id: int) -> None:
+    """Retire snapshots that include an invoice once the current transaction commits."""
+    transaction.on_commit(lambda: cache.delete_many([_user_revision_key(user_id), _invoice_revision_key(invoice_id)]))
\ No newline at end of file
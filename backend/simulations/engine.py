@@ -0,0 +1,362 @@
+"""
+Vectorized what-if simulation over a baseline of invoice items.
+
+A baseline holds one row per invoice item in parallel arrays: material and
+supplier codes, weight, cost and the carbon/water/energy recorded when the
+invoice was processed. A scenario is an ordered list of transforms, each a
+masked array operation over every item at once, so a simulation costs a few
+NumPy passes however many items the baseline holds.
+
+Nothing here touches the database; ``simulations.runner`` loads baselines and
+turns SimulationParameter rows into scenarios.
+"""
+
+from typing import Callable, Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+from nlp_module.impact_engine import CARBON as FACTOR_CARBON, ENERGY as FACTOR_ENERGY, ImpactEngine
+
+# Columns of Baseline.impacts and Outcome.impacts; per-material totals add COST
+CARBON, WATER, ENERGY, COST = range(4)
+METRICS = ('carbon', 'water', 'energy')
+
+# Percentiles reported by Monte Carlo runs
+PERCENTILES = (5, 50, 95)
+
+
+class SimulationError(ValueError):
+    """A scenario that cannot be applied to its baseline; reported back to the client."""
+
+
+class Baseline(NamedTuple):
+    """Current state of a set of invoice items, one array row per item."""
+    materials: Tuple[str, ...]   # material code -> material type
+    suppliers: Tuple[str, ...]   # supplier code -> supplier name ('' when unknown)
+    factors: np.ndarray          # (materials, 3) carbon, water, energy per kg; zero without factors
+    known_materials: int         # codes below this have factors and can be substituted in
+    material_codes: np.ndarray   # (n,)
+    supplier_codes: np.ndarray   # (n,)
+    weights: np.ndarray          # (n,) kg
+    costs: np.ndarray            # (n,)
+    impacts: np.ndarray          # (n, 3) carbon kg, water l, energy kWh
+    
+    @property
+    def size(self) -> int:
+        return len(self.weights)
+    
+    def material_code(self, material: str) -> Optional[int]:
+        try:
+            return self.materials.index(material)
+        except ValueError:
+            return None
+    
+    def supplier_code(self, supplier: str) -> Optional[int]:
+        try:
+            return self.suppliers.index(supplier)
+        except ValueError:
+            return None
+
+
+def build_baseline(engine: ImpactEngine, materials: Sequence[str], suppliers: Sequence[str],
+                   weights: Sequence[float], costs: Sequence[float], impacts: Sequence[Sequence[float]]) -> Baseline:
+    """Encode item columns into a baseline.
+    
+    Materials keep the factor engine's codes; materials the engine has no
+    factors for get codes after those, so breakdowns still name them.
+    """
+    material_index = dict(engine.codes)
+    material_codes = np.fromiter(
+        (material_index.setdefault(material, len(material_index)) for material in materials),
+        dtype=np.intp, count=len(materials),
+    )
+    supplier_index: Dict[str, int] = {}
+    supplier_codes = np.fromiter(
+        (supplier_index.setdefault(supplier or '', len(supplier_index)) for supplier in suppliers),
+        dtype=np.intp, count=len(suppliers),
+    )
+    
+    known = len(engine.materials)
+    factors = np.zeros((len(material_index), 3))
+    factors[:known] = engine.matrix[:known, FACTOR_CARBON:FACTOR_ENERGY + 1]
+    factors.setflags(write=False)
+    
+    return Baseline(
+        materials=tuple(material_index),
+        suppliers=tuple(supplier_index),
+        factors=factors,
+        known_materials=known,
+        material_codes=material_codes,
+        supplier_codes=supplier_codes,
+        weights=np.asarray(weights, dtype=np.float64).reshape(-1),
+        costs=np.asarray(costs, dtype=np.float64).reshape(-1),
+        impacts=np.asarray(impacts, dtype=np.float64).reshape(-1, 3),
+    )
+
+
+def compact_baseline(baseline: Baseline) -> Baseline:
+    """Merge the items that share a material and a supplier into one row.
+    
+    Transforms select and change items by material or supplier only, so they
+    treat the items of such a group alike and the group's totals come out
+    the same as its items' would; the one exception is the zero floor on
+    carbon after energy savings, applied per group instead of per item.
+    Sweeps evaluate many scenarios against this much smaller baseline.
+    """
+    suppliers = max(len(baseline.suppliers), 1)
+    groups, inverse = np.unique(baseline.material_codes * suppliers + baseline.supplier_codes, return_inverse=True)
+    
+    def total(values: np.ndarray) -> np.ndarray:
+        return np.bincount(inverse, weights=values, minlength=len(groups))
+    
+    return baseline._replace(
+        material_codes=groups // suppliers,
+        supplier_codes=groups % suppliers,
+        weights=total(baseline.weights),
+        costs=total(baseline.costs),
+        impacts=np.column_stack([total(baseline.impacts[:, column]) for column in (CARBON, WATER, ENERGY)]),
+    )
+
+
+class Transform(NamedTuple):
+    kind: str      # 'quantity', 'material', 'supplier', 'energy' or 'scale'
+    target: str    # material, supplier or metric the transform applies to ('' for all items)
+    value: object  # scale factor, or the replacement material
+    label: str     # human-readable description, for implementation steps
+
+
+class Scenario:
+    """Changes to apply to a baseline, in the order they were added.
+    
+    ``grid_carbon_kg_per_kwh`` is the carbon avoided per kWh of energy saved.
+    """
+    
+    def __init__(self, grid_carbon_kg_per_kwh: float = 0.0):
+        self.grid_carbon_kg_per_kwh = grid_carbon_kg_per_kwh
+        self.transforms: List[Transform] = []
+        self.implementation_cost = 0.0
+    
+    def scale_quantity(self, factor: float, material: str = '', label: str = '') -> None:
+        """Buy ``factor`` times as much (of one material, or of everything)."""
+        self.transforms.append(Transform('quantity', material, float(factor), label))
+    
+    def substitute(self, material: str, replacement: str, label: str = '') -> None:
+        """Buy the same weight of ``replacement`` instead of ``material``."""
+        self.transforms.append(Transform('material', material, replacement, label))
+    
+    def change_supplier(self, supplier: str, carbon_factor: float, label: str = '') -> None:
+        """Move a supplier's items to one whose goods carry ``carbon_factor`` times the carbon."""
+        self.transforms.append(Transform('supplier', supplier, float(carbon_factor), label))
+    
+    def scale_energy(self, factor: float, material: str = '', label: str = '') -> None:
+        """Use ``factor`` times the energy; the saved energy's grid carbon goes too."""
+        self.transforms.append(Transform('energy', material, float(factor), label))
+    
+    def scale_metric(self, metric: str, factor: float, label: str = '') -> None:
+        """Scale one of carbon, water, energy or cost across all items."""
+        if metric not in METRICS + ('cost',):
+            raise SimulationError(f"Unknown metric {metric!r}")
+        self.transforms.append(Transform('scale', metric, float(factor), label))
+    
+    def add_implementation_cost(self, cost: float) -> None:
+        self.implementation_cost += float(cost)
+
+
+class Outcome(NamedTuple):
+    """Simulated state of the baseline's items, plus how many items each transform touched."""
+    material_codes: np.ndarray
+    weights: np.ndarray
+    costs: np.ndarray
+    impacts: np.ndarray
+    affected: List[int]
+
+
+def _material_mask(baseline: Baseline, codes: np.ndarray, material: str) -> np.ndarray:
+    if not material:
+        return np.ones(len(codes), dtype=bool)
+    code = baseline.material_code(material)
+    if code is None:
+        return np.zeros(len(codes), dtype=bool)
+    return codes == code
+
+
+def simulate(baseline: Baseline, scenario: Scenario) -> Outcome:
+    """Apply a scenario's transforms to copies of the baseline arrays.
+    
+    Raises SimulationError when a transform matches no items or substitutes
+    a material without factors.
+    """
+    codes = baseline.material_codes.copy()
+    weights = baseline.weights.copy()
+    costs = baseline.costs.copy()
+    impacts = baseline.impacts.copy()
+    affected = []
+    
+    for transform in scenario.transforms:
+        if transform.kind == 'scale':
+            if transform.target == 'cost':
+                costs *= transform.value
+            else:
+                impacts[:, METRICS.index(transform.target)] *= transform.value
+            affected.append(len(codes))
+            continue
+        
+        if transform.kind == 'supplier':
+            code = baseline.supplier_code(transform.target)
+            mask = baseline.supplier_codes == code if code is not None else np.zeros(len(codes), dtype=bool)
+        else:
+            mask = _material_mask(baseline, codes, transform.target)
+        count = int(np.count_nonzero(mask))
+        if not count:
+            raise SimulationError(f"No items match {transform.target!r} in the baseline")
+        affected.append(count)
+        
+        if transform.kind == 'quantity':
+            weights[mask] *= transform.value
+            costs[mask] *= transform.value
+            impacts[mask] *= transform.value
+        elif transform.kind == 'material':
+            replacement = baseline.material_code(transform.value)
+            if replacement is None or replacement >= baseline.known_materials:
+                raise SimulationError(f"No impact factors for material {transform.value!r}")
+            codes[mask] = replacement
+            impacts[mask] = weights[mask, None] * baseline.factors[replacement]
+        elif transform.kind == 'supplier':
+            impacts[mask, CARBON] *= transform.value
+        elif transform.kind == 'energy':
+            saved = impacts[mask, ENERGY] * (1 - transform.value)
+            impacts[mask, ENERGY] -= saved
+            impacts[mask, CARBON] = np.maximum(impacts[mask, CARBON] - saved * scenario.grid_carbon_kg_per_kwh, 0)
+    
+    return Outcome(codes, weights, costs, impacts, affected)
+
+
+def totals(impacts: np.ndarray, costs: np.ndarray) -> Dict[str, float]:
+    """Carbon, water, energy and cost summed over all rows."""
+    sums = impacts.sum(axis=0)
+    return {'carbon': float(sums[CARBON]), 'water': float(sums[WATER]), 'energy': float(sums[ENERGY]),
+            'cost': float(costs.sum())}
+
+
+def _by_material(baseline: Baseline, codes: np.ndarray, values: np.ndarray) -> np.ndarray:
+    return np.bincount(codes, weights=values, minlength=len(baseline.materials))
+
+
+def summarize(baseline: Baseline, outcome: Outcome) -> Dict:
+    """Totals and per-material breakdowns of the baseline against the outcome.
+    
+    Returns {'base': totals, 'simulated': totals, 'breakdowns': {metric: {
+    'total': {...}, 'materials': {material: {'base', 'simulated'}}}}} where
+    totals hold carbon, water, energy and cost; only materials present on
+    either side are listed.
+    """
+    columns = {
+        metric: (baseline.impacts[:, index], outcome.impacts[:, index]) for index, metric in enumerate(METRICS)
+    }
+    columns['cost'] = (baseline.costs, outcome.costs)
+    
+    present = np.flatnonzero(_by_material(baseline, baseline.material_codes, None)
+                             + _by_material(baseline, outcome.material_codes, None))
+    summary = {'base': {}, 'simulated': {}, 'breakdowns': {}}
+    for metric, (base, simulated) in columns.items():
+        base_by_material = _by_material(baseline, baseline.material_codes, base)
+        simulated_by_material = _by_material(baseline, outcome.material_codes, simulated)
+        summary['base'][metric] = float(base.sum())
+        summary['simulated'][metric] = float(simulated.sum())
+        summary['breakdowns'][metric] = {
+            'total': {'base': round(summary['base'][metric], 3), 'simulated': round(summary['simulated'][metric], 3)},
+            'materials': {
+                baseline.materials[code]: {
+                    'base': round(float(base_by_material[code]), 3),
+                    'simulated': round(float(simulated_by_material[code]), 3),
+                }
+                for code in present
+            },
+        }
+    return summary
+
+
+def _material_totals(baseline: Baseline, codes: np.ndarray, impacts: np.ndarray, costs: np.ndarray) -> np.ndarray:
+    """(materials, 4) carbon, water, energy and cost summed per material code."""
+    totals = np.empty((len(baseline.materials), 4))
+    for column in (CARBON, WATER, ENERGY):
+        totals[:, column] = _by_material(baseline, codes, impacts[:, column])
+    totals[:, COST] = _by_material(baseline, codes, costs)
+    return totals
+
+
+class Uncertainty(NamedTuple):
+    """Log-normal spread (sigma of the log) around each material's factors and quantities."""
+    factor_sigma: float
+    quantity_sigma: float
+
+
+def monte_carlo(baseline: Baseline, outcome: Outcome, uncertainty: Uncertainty, rng: np.random.Generator,
+                max_draws: int, batch_size: int, tolerance: float,
+                on_batch: Optional[Callable[[int], None]] = None) -> Dict:
+    """Percentile bands of the base and simulated totals under factor and quantity uncertainty.
+    
+    Each draw scales every material's carbon, water and energy factors and
+    its quantity by median-one log-normal multipliers, the same for the base
+    and the simulated side, so reductions compare like with like. As both
+    sides are linear in those multipliers, a draw only needs the per-material
+    totals, and a batch is two small matrix products.
+    
+    Draws stop early once the 95% confidence interval of every simulated
+    mean is within ``tolerance`` of the mean. ``on_batch`` is called with
+    the number of draws so far after every batch.
+    """
+    present = np.flatnonzero(_by_material(baseline, baseline.material_codes, None)
+                             + _by_material(baseline, outcome.material_codes, None))
+    base = _material_totals(baseline, baseline.material_codes, baseline.impacts, baseline.costs)[present]
+    simulated = _material_totals(baseline, outcome.material_codes, outcome.impacts, outcome.costs)[present]
+    
+    base_draws = []
+    simulated_draws = []
+    # Running sums of the simulated totals and their squares, for the interval check
+    moments = np.zeros((2, 4))
+    drawn = 0
+    converged = False
+    while drawn < max_draws and not converged:
+        size = min(batch_size, max_draws - drawn)
+        # (draws, materials, 4); cost only varies with quantity
+        multipliers = np.ones((size, len(present), 4))
+        multipliers[:, :, :COST] = np.exp(uncertainty.factor_sigma * rng.standard_normal((size, len(present), 3)))
+        multipliers *= np.exp(uncertainty.quantity_sigma * rng.standard_normal((size, len(present), 1)))
+        base_draws.append(np.einsum('dmk,mk->dk', multipliers, base))
+        simulated_draws.append(np.einsum('dmk,mk->dk', multipliers, simulated))
+        drawn += size
+        
+        moments[0] += simulated_draws[-1].sum(axis=0)
+        moments[1] += np.square(simulated_draws[-1]).sum(axis=0)
+        mean = moments[0] / drawn
+        variance = np.maximum(moments[1] / drawn - mean ** 2, 0)
+        half_width = 1.96 * np.sqrt(variance / drawn)
+        converged = bool(np.all(half_width <= tolerance * np.abs(mean)))
+        if on_batch is not None:
+            on_batch(drawn)
+    
+    base_draws = np.concatenate(base_draws)
+    simulated_draws = np.concatenate(simulated_draws)
+    reductions = base_draws - simulated_draws
+    
+    def bands(values: np.ndarray) -> Dict[str, float]:
+        return {f'p{q}': round(float(value), 3) for q, value in zip(PERCENTILES, np.percentile(values, PERCENTILES))}
+    
+    return {
+        'draws': drawn,
+        'converged': converged,
+        'bands': {
+            metric: {
+                'base': bands(base_draws[:, column]),
+                'simulated': bands(simulated_draws[:, column]),
+                'reduction': bands(reductions[:, column]),
+            }
+            for column, metric in enumerate(METRICS + ('cost',))
+        },
+        # Share of draws in which the scenario lowers each total
+        'reduction_probability': {
+            metric: round(float(np.mean(reductions[:, column] > 0)), 4)
+            for column, metric in enumerate(METRICS + ('cost',))
+        },
+    }
\ No newline at end of file
@@ -0,0 +1,87 @@
+"""
+Lifecycle of background simulation jobs.
+
+A submitted simulation is 'queued' with a fresh job id, 'running' once a
+worker claims it, and ends 'completed', 'failed' or 'cancelled'. Progress is
+persisted on the Simulation while it runs; each progress write is also where
+the worker notices that the job was cancelled. Jobs whose row hasn't changed
+for SIMULATION_JOB_STALE_SECONDS (say, a worker died) stop counting towards
+the per-user cap and can be resubmitted.
+"""
+
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import QuerySet
+from django.utils import timezone
+
+from .models import Simulation
+
+ACTIVE_STATUSES = ['queued', 'running']
+
+
+class SimulationCancelled(Exception):
+    """The job was cancelled while it ran."""
+
+
+class SimulationLimitExceeded(Exception):
+    """The user already has as many simulations running as allowed."""
+
+
+class SimulationBusy(Exception):
+    """The simulation already has a job queued or running."""
+
+
+def active_simulations(user_id: int) -> QuerySet:
+    """The user's queued or running simulations that are still being worked on."""
+    fresh_since = timezone.now() - timedelta(seconds=settings.SIMULATION_JOB_STALE_SECONDS)
+    return Simulation.objects.filter(user_id=user_id, status__in=ACTIVE_STATUSES, updated_at__gte=fresh_since)
+
+
+class JobProgress:
+    """Persists a running job's progress fraction, and notices cancellation.
+    
+    Writes are skipped until progress moved by ``min_step``, so callers can
+    report as often as they like. A job that was cancelled, replaced by a
+    resubmission or deleted with its simulation is told so by
+    SimulationCancelled.
+    """
+    
+    def __init__(self, simulation_id: int, job_id: str, min_step: float = 0.05):
+        self.simulation_id = simulation_id
+        self.job_id = job_id
+        self.min_step = min_step
+        self.reported = 0.0
+    
+    def __call__(self, fraction: float) -> None:
+        if fraction - self.reported < self.min_step:
+            return
+        updated = Simulation.objects.filter(id=self.simulation_id, job_id=self.job_id, status='running').update(
+            progress=fraction, updated_at=timezone.now(),
+        )
+        if not updated:
+            raise SimulationCancelled(f"Simulation job {self.job_id} is no longer running")
+        self.reported = fraction
+
+
+def cancel_simulation(simulation: Simulation) -> bool:
+    """Cancel a queued or running job; False when there is nothing to cancel.
+    
+    A queued job is dropped when a worker picks it up; a running one stops
+    at its next progress report.
+    """
+    return bool(Simulation.objects.filter(id=simulation.id, status__in=ACTIVE_STATUSES).update(
+        status='cancelled', updated_at=timezone.now(),
+    ))
+
+
+def wait_for_simulation(simulation_id: int, timeout: float) -> None:
+    """Block until the simulation leaves the active statuses or ``timeout`` seconds pass."""
+    deadline = time.monotonic() + timeout
+    interval = settings.SIMULATION_RESULTS_POLL_INTERVAL
+    while time.monotonic() < deadline:
+        status = Simulation.objects.filter(id=simulation_id).values_list('status', flat=True).first()
+        if status not in ACTIVE_STATUSES:
+            return
+        time.sleep(min(interval, max(deadline - time.monotonic(), 0)))
\ No newline at end of file
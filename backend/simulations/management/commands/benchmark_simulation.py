@@ -0,0 +1,111 @@
+"""
+Time the simulation engine on a synthetic baseline.
+    
+    python manage.py benchmark_simulation --items 10000
+    python manage.py benchmark_simulation --items 100000 --max-ms 500
+    python manage.py benchmark_simulation --draws 100000 --max-monte-carlo-ms 1000
+    python manage.py benchmark_simulation --sweep 1000 --max-sweep-ms 500
+"""
+
+import statistics
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+
+from nlp_module.factor_table import DEFAULT_FACTOR_TABLE
+from simulations.engine import (
+    Scenario,
+    Uncertainty,
+    build_baseline,
+    compact_baseline,
+    monte_carlo,
+    simulate,
+    summarize,
+    totals,
+)
+
+SUPPLIERS = [f'Supplier {index}' for index in range(20)]
+
+
+class Command(BaseCommand):
+    help = 'Measure how long one simulation takes over a baseline of synthetic invoice items'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--items', type=int, default=10_000, help='Items in the baseline')
+        parser.add_argument('--iterations', type=int, default=50)
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--max-ms', type=float, default=100, help='p95 target per simulation')
+        parser.add_argument('--draws', type=int, default=0, help='Also time a Monte Carlo run of this many draws')
+        parser.add_argument('--max-monte-carlo-ms', type=float, default=1000, help='Target for the Monte Carlo run')
+        parser.add_argument('--sweep', type=int, default=0, help='Also time a sweep of this many scenarios')
+        parser.add_argument('--max-sweep-ms', type=float, default=1000, help='Target for the sweep')
+    
+    def handle(self, *args, **options):
+        rng = np.random.default_rng(options['seed'])
+        engine = DEFAULT_FACTOR_TABLE.engine
+        count = options['items']
+        
+        materials = rng.choice(engine.materials, size=count)
+        weights = rng.uniform(0.1, 50, size=count)
+        impacts = engine.compute(engine.encode(materials), weights).items[:, :3]
+        baseline = build_baseline(
+            engine, materials.tolist(), rng.choice(SUPPLIERS, size=count).tolist(),
+            weights, weights * rng.uniform(1, 20, size=count), impacts,
+        )
+        
+        # One transform of every kind
+        scenario = Scenario(grid_carbon_kg_per_kwh=0.4)
+        scenario.scale_quantity(0.9)
+        scenario.substitute('plastic', 'recycled_paper')
+        scenario.change_supplier(SUPPLIERS[0], 0.7)
+        scenario.scale_energy(0.8, 'steel')
+        scenario.scale_metric('water', 0.95)
+        
+        timings = []
+        for _ in range(options['iterations']):
+            started = time.perf_counter()
+            summary = summarize(baseline, simulate(baseline, scenario))
+            timings.append((time.perf_counter() - started) * 1000)
+        
+        p50 = statistics.median(timings)
+        p95 = sorted(timings)[int(0.95 * (len(timings) - 1))]
+        self.stdout.write(
+            f"{count:,} items: p50 {p50:.2f} ms, p95 {p95:.2f} ms  "
+            f"(carbon {summary['base']['carbon']:,.0f} -> {summary['simulated']['carbon']:,.0f} kg)"
+        )
+        if p95 > options['max_ms']:
+            raise CommandError(f"p95 {p95:.2f} ms is above the {options['max_ms']} ms target")
+        
+        if options['draws']:
+            outcome = simulate(baseline, scenario)
+            started = time.perf_counter()
+            # No early stopping, so every draw is timed
+            result = monte_carlo(baseline, outcome, Uncertainty(0.2, 0.1), rng, max_draws=options['draws'],
+                                 batch_size=5_000, tolerance=0.0)
+            elapsed = (time.perf_counter() - started) * 1000
+            carbon = result['bands']['carbon']['simulated']
+            self.stdout.write(
+                f"Monte Carlo, {result['draws']:,} draws: {elapsed:.1f} ms  "
+                f"(simulated carbon p5 {carbon['p5']:,.0f}, p50 {carbon['p50']:,.0f}, p95 {carbon['p95']:,.0f} kg)"
+            )
+            if elapsed > options['max_monte_carlo_ms']:
+                raise CommandError(f"Monte Carlo took {elapsed:.1f} ms, above the {options['max_monte_carlo_ms']} ms target")
+        
+        if options['sweep']:
+            started = time.perf_counter()
+            compact = compact_baseline(baseline)
+            for index in range(options['sweep']):
+                sweep = Scenario(grid_carbon_kg_per_kwh=0.4)
+                sweep.substitute('plastic', engine.materials[index % len(engine.materials)])
+                sweep.scale_quantity(1 - (index % 10) / 100)
+                outcome = simulate(compact, sweep)
+                totals(outcome.impacts, outcome.costs)
+            elapsed = (time.perf_counter() - started) * 1000
+            self.stdout.write(
+                f"Sweep of {options['sweep']:,} scenarios over {len(compact.weights)} material/supplier groups: "
+                f"{elapsed:.1f} ms"
+            )
+            if elapsed > options['max_sweep_ms']:
+                raise CommandError(f"Sweep took {elapsed:.1f} ms, above the {options['max_sweep_ms']} ms target")
+        self.stdout.write(self.style.SUCCESS('Within target'))
\ No newline at end of file
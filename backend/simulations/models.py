@@ -19,9 +19,11 @@ class Simulation(models.Model):
     
     STATUS_CHOICES = [
         ('draft', 'Draft'),
+        ('queued', 'Queued'),
         ('running', 'Running'),
         ('completed', 'Completed'),
         ('failed', 'Failed'),
+        ('cancelled', 'Cancelled'),
     ]
     
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='simulations')
@@ -30,6 +32,11 @@ class Simulation(models.Model):
     simulation_type = models.CharField(max_length=30, choices=SIMULATION_TYPES)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='draft')
     
+    # Background job running the simulation (see simulations.jobs)
+    job_id = models.UUIDField(null=True, blank=True, editable=False)
+    progress = models.FloatField(default=0)  # 0..1 while queued or running
+    error_message = models.TextField(blank=True)
+    
     # Base scenario (current state)
     base_carbon_footprint = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
     base_water_usage = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
@@ -55,6 +62,12 @@ class Simulation(models.Model):
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Keyset pages of the simulation list
+            models.Index(fields=['user', '-created_at', '-id'], name='simulation_user_created_idx'),
+            # Per-user concurrency cap
+            models.Index(fields=['user', 'status'], name='simulation_user_status_idx'),
+        ]
     
     def __str__(self):
         return f"{self.name} - {self.get_simulation_type_display()}"
@@ -98,6 +111,9 @@ class SimulationResult(models.Model):
     recommendations = models.JSONField(default=list)   # Store AI-generated recommendations
     implementation_steps = models.JSONField(default=list)  # Store implementation guidance
     
+    # Monte Carlo runs: draws, seed and percentile bands per metric
+    uncertainty = models.JSONField(default=dict, blank=True)
+    
     # Metadata
     calculation_method = models.CharField(max_length=50, default='standard')
     confidence_level = models.DecimalField(max_digits=3, decimal_places=2, null=True, blank=True)
@@ -0,0 +1,316 @@
+"""
+Run simulations against the user's invoice data.
+
+The baseline is every item of the simulation's linked invoices, or of all
+of the user's processed invoices when none are linked. Parameters become
+engine transforms according to the simulation type; the outcome is written
+to the Simulation and its SimulationResult.
+"""
+
+import logging
+import math
+import uuid
+from decimal import Decimal
+from typing import Callable, Dict, Iterable, List, Optional, Set
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .baselines import get_baseline
+from .engine import (
+    Baseline,
+    Outcome,
+    Scenario,
+    SimulationError,
+    Uncertainty,
+    monte_carlo,
+    simulate,
+    summarize,
+)
+from .jobs import SimulationCancelled
+from .models import Simulation, SimulationParameter, SimulationResult
+from invoices.factor_table import get_factor_table, material_key
+from invoices.models import Supplier
+
+logger = logging.getLogger(__name__)
+
+# Parameter types each simulation type understands
+ALLOWED_PARAMETERS = {
+    'material_substitution': {'material', 'quantity'},
+    'supplier_change': {'supplier', 'custom'},
+    'quantity_adjustment': {'quantity'},
+    'energy_efficiency': {'energy', 'custom'},
+    'process_optimization': {'process', 'energy', 'quantity', 'custom'},
+    'custom': {'material', 'quantity', 'supplier', 'process', 'energy', 'custom'},
+}
+
+SIMULATION_TYPE_NAMES = dict(Simulation.SIMULATION_TYPES)
+
+# Simulation fields store_results() writes
+RESULT_FIELDS = [
+    'base_carbon_footprint', 'simulated_carbon_footprint', 'carbon_reduction',
+    'base_water_usage', 'simulated_water_usage', 'water_reduction',
+    'base_energy_usage', 'simulated_energy_usage', 'energy_reduction',
+    'base_cost', 'simulated_cost', 'cost_savings',
+    'status', 'progress', 'error_message', 'updated_at',
+]
+
+# Process and custom parameters that scale a metric across the whole baseline
+SCALED_METRICS = {'carbon', 'water', 'energy', 'cost'}
+
+
+def _number(parameter: SimulationParameter, value: str) -> float:
+    try:
+        number = float(str(value).strip())
+    except ValueError:
+        number = math.nan
+    # float() also takes 'nan' and 'inf', which would poison every total
+    if not math.isfinite(number):
+        raise SimulationError(f"{parameter.parameter_name}: expected a number, got {value!r}")
+    return number
+
+
+def _ratio(parameter: SimulationParameter) -> float:
+    original = _number(parameter, parameter.original_value)
+    new = _number(parameter, parameter.new_value)
+    if original <= 0:
+        raise SimulationError(f"{parameter.parameter_name}: the original value must be greater than zero")
+    if new < 0:
+        raise SimulationError(f"{parameter.parameter_name}: the new value can't be negative")
+    ratio = new / original
+    if not math.isfinite(ratio):
+        raise SimulationError(f"{parameter.parameter_name}: the change is too large to simulate")
+    return ratio
+
+
+def supplier_carbon_factors(names: Iterable[str]) -> Dict[str, float]:
+    """Relative carbon intensity of each named supplier; 1.0 for suppliers without a profile.
+    
+    The share of a good's carbon attributed to its supplier's own energy
+    shrinks with the renewable share of that energy, to nothing when the
+    supplier is carbon neutral.
+    """
+    share = settings.SIMULATION_SUPPLIER_ENERGY_CARBON_SHARE
+    factors = {name: 1.0 for name in names}
+    for name, carbon_neutral, renewable in Supplier.objects.filter(name__in=factors).values_list(
+        'name', 'carbon_neutral', 'renewable_energy_usage',
+    ):
+        clean = 1.0 if carbon_neutral else min(float(renewable or 0), 100.0) / 100
+        factors[name] = 1 - share * clean
+    return factors
+
+
+def supplier_names(parameters: Iterable[SimulationParameter]) -> Set[str]:
+    """Suppliers named by supplier parameters, on either side of the change."""
+    return {
+        name for parameter in parameters if parameter.parameter_type == 'supplier'
+        for name in (parameter.original_value.strip(), parameter.new_value.strip())
+    }
+
+
+def build_scenario(simulation_type: str, parameters: List[SimulationParameter],
+                   suppliers: Optional[Dict[str, float]] = None) -> Scenario:
+    """Turn parameters into engine transforms, in parameter order.
+    
+    Quantity and energy parameters named after a material apply to that
+    material only, otherwise to every item. ``suppliers`` are preloaded
+    supplier_carbon_factors(); they are looked up when not given.
+    """
+    allowed = ALLOWED_PARAMETERS.get(simulation_type, set())
+    scenario = Scenario(grid_carbon_kg_per_kwh=settings.SIMULATION_GRID_CARBON_KG_PER_KWH)
+    if suppliers is None:
+        suppliers = supplier_carbon_factors(supplier_names(parameters))
+    
+    for parameter in parameters:
+        kind = parameter.parameter_type
+        name = material_key(parameter.parameter_name)
+        if kind not in allowed:
+            raise SimulationError(
+                f"{parameter.parameter_name}: {kind} parameters do not apply to "
+                f"{SIMULATION_TYPE_NAMES.get(simulation_type, simulation_type)} simulations"
+            )
+        
+        if kind == 'material':
+            current, replacement = material_key(parameter.original_value), material_key(parameter.new_value)
+            if not replacement or replacement == current:
+                raise SimulationError(f"{parameter.parameter_name}: new value must name a different material")
+            scenario.substitute(current, replacement, label=f"Replace {current} with {replacement}")
+        elif kind == 'quantity':
+            ratio = _ratio(parameter)
+            target = name if name in get_factor_table().factors else ''
+            scenario.scale_quantity(ratio, target, label=f"Change {target or 'all'} quantities by {ratio - 1:+.0%}")
+        elif kind == 'supplier':
+            current, new = parameter.original_value.strip(), parameter.new_value.strip()
+            if not suppliers[current]:
+                # Only when SIMULATION_SUPPLIER_ENERGY_CARBON_SHARE is 1 and the supplier is carbon neutral
+                raise SimulationError(
+                    f"{parameter.parameter_name}: purchases from {current} carry no carbon to scale from"
+                )
+            factor = suppliers[new] / suppliers[current]
+            scenario.change_supplier(current, factor, label=f"Move purchases from {current} to {new}")
+        elif kind == 'energy':
+            ratio = _ratio(parameter)
+            target = name if name in get_factor_table().factors else ''
+            scenario.scale_energy(ratio, target, label=f"Change {target or 'all'} energy use by {ratio - 1:+.0%}")
+        elif name == 'implementation_cost':
+            scenario.add_implementation_cost(_number(parameter, parameter.new_value))
+        elif name in SCALED_METRICS:
+            ratio = _ratio(parameter)
+            scenario.scale_metric(name, ratio, label=f"{parameter.parameter_name}: change {name} by {ratio - 1:+.0%}")
+        else:
+            raise SimulationError(f"Unsupported {kind} parameter {parameter.parameter_name!r}")
+    
+    if not scenario.transforms:
+        raise SimulationError('The simulation has no parameters that change the baseline')
+    return scenario
+
+
+def _decimal(value: float) -> Decimal:
+    return Decimal(f"{value:.2f}")
+
+
+def _recommendations(summary: Dict) -> List[str]:
+    """Materials with the largest carbon change, best first."""
+    changes = []
+    for material, values in summary['breakdowns']['carbon']['materials'].items():
+        change = values['simulated'] - values['base']
+        if abs(change) >= 0.01:
+            changes.append((change, material))
+    changes.sort()
+    
+    recommendations = []
+    for change, material in changes[:3]:
+        if change < 0:
+            recommendations.append(f"{material}: {-change:.1f} kg CO2e less than today")
+    for change, material in changes[::-1][:3]:
+        if change > 0:
+            recommendations.append(f"{material}: {change:.1f} kg CO2e more than today; weigh this against the savings")
+    if not recommendations:
+        recommendations.append('This scenario does not change the carbon footprint of the selected invoices')
+    return recommendations
+
+
+def _implementation_steps(scenario: Scenario, affected: List[int], items: int, cost: float) -> List[str]:
+    steps = [f"{transform.label} ({count} of {items} items)" for transform, count in zip(scenario.transforms, affected)]
+    if scenario.implementation_cost:
+        steps.append(f"Budget {scenario.implementation_cost:.2f} for implementation")
+        savings = -cost
+        if savings > 0:
+            steps.append(f"Pays back after {scenario.implementation_cost / savings:.1f} periods like the one simulated")
+    return steps
+
+
+def _uncertainty_bands(baseline: Baseline, outcome: Outcome, draws: int, seed: Optional[int],
+                       on_batch: Optional[Callable[[int], None]] = None) -> Dict:
+    if seed is None:
+        # Stored with the result, so any run can be repeated
+        seed = int(np.random.SeedSequence().entropy % 2 ** 32)
+    uncertainty = monte_carlo(
+        baseline, outcome,
+        Uncertainty(settings.SIMULATION_FACTOR_UNCERTAINTY, settings.SIMULATION_QUANTITY_UNCERTAINTY),
+        np.random.default_rng(seed),
+        max_draws=draws,
+        batch_size=settings.SIMULATION_MONTE_CARLO_BATCH_SIZE,
+        tolerance=settings.SIMULATION_MONTE_CARLO_TOLERANCE,
+        on_batch=on_batch,
+    )
+    uncertainty['seed'] = seed
+    return uncertainty
+
+
+def run_simulation(simulation: Simulation, draws: Optional[int] = None, seed: Optional[int] = None,
+                   progress: Optional[Callable[[float], None]] = None) -> SimulationResult:
+    """Simulate against the current invoice data and store the results.
+    
+    Runs a simulation a job has claimed (see simulations.tasks). With
+    ``draws``, factor and quantity uncertainty is sampled as well (Monte
+    Carlo mode) and the percentile bands are stored with the result.
+    ``progress`` is called with the fraction done; it may raise
+    SimulationCancelled to stop the run. Raises SimulationError (after
+    marking the simulation failed) when the parameters don't fit the
+    simulation or its baseline.
+    """
+    report = progress or (lambda fraction: None)
+    try:
+        parameters = list(simulation.parameters.all())
+        baseline = get_baseline(simulation.user_id, list(simulation.related_invoices.values_list('id', flat=True)))
+        report(0.1)
+        scenario = build_scenario(simulation.simulation_type, parameters)
+        outcome = simulate(baseline, scenario)
+        report(0.2)
+    except SimulationError as e:
+        logger.info(f"Simulation {simulation.id} rejected: {e}")
+        # Leaves a cancelled simulation, or one a newer job has taken over, alone
+        Simulation.objects.filter(id=simulation.id, job_id=simulation.job_id, status='running').update(
+            status='failed', error_message=str(e), updated_at=timezone.now(),
+        )
+        raise
+    
+    uncertainty = {}
+    if draws:
+        # Sampling takes most of a Monte Carlo run
+        uncertainty = _uncertainty_bands(
+            baseline, outcome, draws, seed, on_batch=lambda drawn: report(0.2 + 0.75 * drawn / draws),
+        )
+    result = store_results(simulation, baseline, scenario, outcome, uncertainty, job_id=simulation.job_id)
+    logger.info(
+        f"Simulation {simulation.id} completed over {baseline.size} items"
+        + (f" with {uncertainty['draws']} draws" if uncertainty else "")
+    )
+    return result
+
+
+def store_results(simulation: Simulation, baseline: Baseline, scenario: Scenario, outcome: Outcome,
+                  uncertainty: Optional[Dict] = None, job_id: Optional[uuid.UUID] = None) -> SimulationResult:
+    """Write an outcome's totals to the simulation and its breakdowns to its SimulationResult.
+    
+    With ``job_id``, results are only written while that job is still
+    running the simulation. Raises SimulationCancelled when it was
+    cancelled, replaced by a resubmission or deleted meanwhile.
+    """
+    summary = summarize(baseline, outcome)
+    base, simulated, breakdowns = summary['base'], summary['simulated'], summary['breakdowns']
+    breakdowns['cost']['implementation'] = round(scenario.implementation_cost, 2)
+    uncertainty = uncertainty or {}
+    
+    with transaction.atomic():
+        current = Simulation.objects.select_for_update().filter(id=simulation.id)
+        if job_id is not None:
+            current = current.filter(job_id=job_id, status='running')
+        if not list(current.values_list('id', flat=True)):
+            raise SimulationCancelled(f"Simulation {simulation.id} was cancelled, resubmitted or deleted")
+        
+        for metric, base_field, simulated_field, reduction_field in (
+            ('carbon', 'base_carbon_footprint', 'simulated_carbon_footprint', 'carbon_reduction'),
+            ('water', 'base_water_usage', 'simulated_water_usage', 'water_reduction'),
+            ('energy', 'base_energy_usage', 'simulated_energy_usage', 'energy_reduction'),
+            ('cost', 'base_cost', 'simulated_cost', 'cost_savings'),
+        ):
+            setattr(simulation, base_field, _decimal(base[metric]))
+            setattr(simulation, simulated_field, _decimal(simulated[metric]))
+            setattr(simulation, reduction_field, _decimal(base[metric] - simulated[metric]))
+        simulation.status = 'completed'
+        simulation.progress = 1.0
+        simulation.error_message = ''
+        # An update only: a row deleted before the lock must not come back
+        simulation.save(update_fields=RESULT_FIELDS)
+        
+        result, _ = SimulationResult.objects.update_or_create(simulation=simulation, defaults={
+            'carbon_breakdown': breakdowns['carbon'],
+            'water_breakdown': breakdowns['water'],
+            'energy_breakdown': breakdowns['energy'],
+            'cost_breakdown': breakdowns['cost'],
+            'recommendations': _recommendations(summary),
+            'implementation_steps': _implementation_steps(
+                scenario, outcome.affected, baseline.size, simulated['cost'] - base['cost'],
+            ),
+            'uncertainty': uncertainty,
+            'calculation_method': 'monte_carlo' if uncertainty else 'invoice_baseline',
+            # How likely the scenario is to cut carbon; deterministic runs make no estimate
+            'confidence_level': (
+                Decimal(f"{uncertainty['reduction_probability']['carbon']:.2f}") if uncertainty else None
+            ),
+        })
+    return result
\ No newline at end of file
@@ -1,4 +1,10 @@
+import math
+
+from django.conf import settings
 from rest_framework import serializers
+
+from eco_api.serializers import SelectableFieldsMixin
+from invoices.models import Invoice
 from .models import Simulation, SimulationParameter, SimulationResult
 
 
@@ -17,26 +23,26 @@ class SimulationResultSerializer(serializers.ModelSerializer):
         model = SimulationResult
         fields = [
             'id', 'carbon_breakdown', 'water_breakdown', 'energy_breakdown', 
-            'cost_breakdown', 'recommendations', 'implementation_steps',
+            'cost_breakdown', 'recommendations', 'implementation_steps', 'uncertainty',
             'calculation_method', 'confidence_level', 'created_at'
         ]
         read_only_fields = ['id', 'created_at']
 
 
-class SimulationSerializer(serializers.ModelSerializer):
+class SimulationSerializer(SelectableFieldsMixin, serializers.ModelSerializer):
     """Serializer for Simulation model."""
     parameters = SimulationParameterSerializer(many=True, read_only=True)
     
     class Meta:
         model = Simulation
         fields = [
-            'id', 'name', 'description', 'simulation_type', 'status',
+            'id', 'name', 'description', 'simulation_type', 'status', 'job_id', 'progress', 'error_message',
             'base_carbon_footprint', 'base_water_usage', 'base_energy_usage', 'base_cost',
             'simulated_carbon_footprint', 'simulated_water_usage', 'simulated_energy_usage', 'simulated_cost',
             'carbon_reduction', 'water_reduction', 'energy_reduction', 'cost_savings',
             'parameters', 'created_at', 'updated_at'
         ]
-        read_only_fields = ['id', 'created_at', 'updated_at']
+        read_only_fields = ['id', 'status', 'job_id', 'progress', 'error_message', 'created_at', 'updated_at']
 
 
 class CreateSimulationSerializer(serializers.ModelSerializer):
@@ -54,4 +60,52 @@ class CreateSimulationSerializer(serializers.ModelSerializer):
         for param_data in parameters_data:
             SimulationParameter.objects.create(simulation=simulation, **param_data)
         
-        return simulation 
\ No newline at end of file
+        return simulation 
+
+
+class SimulationSweepSerializer(serializers.Serializer):
+    """Serializer for a sweep: a grid of parameter options or an explicit list of parameter sets."""
+    simulation_type = serializers.ChoiceField(choices=Simulation.SIMULATION_TYPES)
+    invoices = serializers.ListField(child=serializers.IntegerField(), required=False, allow_empty=True)
+    # Applied in every scenario, before the grid options
+    parameters = serializers.ListField(child=SimulationParameterSerializer(), required=False, default=list)
+    # Axes of options; one scenario per combination of one option from each axis
+    grid = serializers.ListField(
+        child=serializers.ListField(child=SimulationParameterSerializer(), allow_empty=False),
+        required=False, allow_empty=False,
+    )
+    scenarios = serializers.ListField(
+        child=serializers.ListField(child=SimulationParameterSerializer(), allow_empty=False),
+        required=False, allow_empty=False,
+    )
+    rank_by = serializers.ChoiceField(choices=['carbon', 'water', 'energy', 'cost'], default='carbon')
+    persist_top = serializers.IntegerField(min_value=0, default=0)
+    name = serializers.CharField(max_length=180, default='Sweep')
+    
+    def validate_invoices(self, value):
+        """Keep only the requesting user's invoices."""
+        owned = set(Invoice.objects.filter(
+            user=self.context['request'].user, id__in=value,
+        ).values_list('id', flat=True))
+        missing = sorted(set(value) - owned)
+        if missing:
+            raise serializers.ValidationError(f"Unknown invoices: {missing}")
+        return value
+    
+    def validate_persist_top(self, value):
+        if value > settings.SIMULATION_SWEEP_MAX_PERSISTED:
+            raise serializers.ValidationError(f"At most {settings.SIMULATION_SWEEP_MAX_PERSISTED} scenarios can be saved.")
+        return value
+    
+    def validate(self, attrs):
+        if ('grid' in attrs) == ('scenarios' in attrs):
+            raise serializers.ValidationError("Give either a grid or a list of scenarios.")
+        if 'grid' in attrs:
+            count = math.prod(len(axis) for axis in attrs['grid'])
+        else:
+            count = len(attrs['scenarios'])
+        if count > settings.SIMULATION_SWEEP_MAX_SCENARIOS:
+            raise serializers.ValidationError(
+                f"{count} scenarios requested; a sweep runs at most {settings.SIMULATION_SWEEP_MAX_SCENARIOS}."
+            )
+        return attrs
\ No newline at end of file
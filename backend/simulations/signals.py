@@ -0,0 +1,17 @@
+"""
+Signal handlers keeping simulation baselines in step with invoices.
+"""
+
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .baselines import invalidate_baselines
+from invoices.models import Invoice
+
+
+@receiver(post_save, sender=Invoice)
+@receiver(post_delete, sender=Invoice)
+def invalidate_invoice_baselines(sender, instance, **kwargs):
+    """Retire baseline snapshots that include the invoice."""
+    # Processing replaces items in bulk, then saves the invoice, which lands here
+    invalidate_baselines(instance.user_id, instance.id)
\ No newline at end of file
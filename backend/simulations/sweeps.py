@@ -0,0 +1,102 @@
+"""
+Parameter sweeps: many what-if scenarios against one baseline.
+
+The baseline is taken from the snapshot cache once and compacted to one row per material and
+supplier, supplier profiles are looked up once for every scenario, and each
+scenario is then a few array operations over that compact baseline. Only
+the best ``persist_top`` scenarios are written as Simulations, re-run over
+the full item baseline so their breakdowns and steps are exact.
+"""
+
+import itertools
+import logging
+from typing import Dict, List, Optional
+
+from django.db import transaction
+
+from .baselines import get_baseline
+from .engine import SimulationError, compact_baseline, simulate, totals
+from .models import Simulation, SimulationParameter
+from .runner import build_scenario, store_results, supplier_carbon_factors, supplier_names
+
+logger = logging.getLogger(__name__)
+
+RANK_METRICS = ('carbon', 'water', 'energy', 'cost')
+
+
+def expand_grid(parameters: List[Dict], grid: List[List[Dict]]) -> List[List[Dict]]:
+    """Every combination of one option per grid axis, each after the shared parameters."""
+    return [list(parameters) + list(combination) for combination in itertools.product(*grid)]
+
+
+def _reductions(base: Dict[str, float], simulated: Dict[str, float]) -> Dict[str, float]:
+    return {metric: round(base[metric] - simulated[metric], 3) for metric in RANK_METRICS}
+
+
+def run_sweep(user, simulation_type: str, parameter_sets: List[List[Dict]], invoice_ids: Optional[List[int]] = None,
+              rank_by: str = 'carbon', persist_top: int = 0, name: str = 'Sweep') -> Dict:
+    """Evaluate every parameter set and rank them by the reduction in ``rank_by``.
+    
+    Scenarios that can't be applied (say, a substitute without factors) are
+    listed under `failed` instead of failing the sweep. Raises
+    SimulationError when there is no baseline to sweep over.
+    """
+    baseline = get_baseline(user.id, invoice_ids)
+    compact = compact_baseline(baseline)
+    base = totals(baseline.impacts, baseline.costs)
+    
+    candidates = [[SimulationParameter(**data) for data in parameter_set] for parameter_set in parameter_sets]
+    suppliers = supplier_carbon_factors(set().union(*map(supplier_names, candidates)))
+    
+    evaluated = []
+    failed = []
+    for index, (parameter_set, parameters) in enumerate(zip(parameter_sets, candidates)):
+        try:
+            scenario = build_scenario(simulation_type, parameters, suppliers)
+            outcome = simulate(compact, scenario)
+        except SimulationError as e:
+            failed.append({'scenario': index, 'parameters': parameter_set, 'error': str(e)})
+            continue
+        simulated = totals(outcome.impacts, outcome.costs)
+        evaluated.append({
+            'scenario': index,
+            'parameters': parameter_set,
+            'simulated': {metric: round(value, 3) for metric, value in simulated.items()},
+            'reduction': _reductions(base, simulated),
+            'implementation_cost': round(scenario.implementation_cost, 2),
+            '_scenario': scenario,
+        })
+    
+    # Largest reduction first; cost savings break ties
+    evaluated.sort(key=lambda row: (-row['reduction'][rank_by], -row['reduction']['cost'], row['scenario']))
+    for rank, row in enumerate(evaluated, start=1):
+        row['rank'] = rank
+        scenario = row.pop('_scenario')
+        if rank <= persist_top:
+            row['simulation_id'] = _persist(user, simulation_type, row, scenario, baseline, invoice_ids, f"{name} #{rank}")
+    
+    logger.info(
+        f"Sweep of {len(parameter_sets)} {simulation_type} scenarios for user {user.id} over {baseline.size} items "
+        f"({len(compact.weights)} groups), {len(failed)} failed, {min(persist_top, len(evaluated))} saved"
+    )
+    return {
+        'simulation_type': simulation_type,
+        'rank_by': rank_by,
+        'baseline': {'items': baseline.size, **{metric: round(value, 3) for metric, value in base.items()}},
+        'results': evaluated,
+        'failed': failed,
+    }
+
+
+def _persist(user, simulation_type: str, row: Dict, scenario, baseline, invoice_ids: Optional[List[int]],
+             name: str) -> int:
+    """Save one ranked scenario as a completed Simulation with full results."""
+    with transaction.atomic():
+        simulation = Simulation.objects.create(user=user, name=name, simulation_type=simulation_type)
+        SimulationParameter.objects.bulk_create([
+            SimulationParameter(simulation=simulation, **data) for data in row['parameters']
+        ])
+        if invoice_ids:
+            simulation.related_invoices.set(invoice_ids)
+        store_results(simulation, baseline, scenario, simulate(baseline, scenario))
+    return simulation.id
\ No newline at end of file
@@ -0,0 +1,100 @@
+"""
+Background tasks for simulations.
+"""
+
+import logging
+import uuid
+from typing import Optional
+
+from celery import shared_task
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import OperationalError, transaction
+from django.utils import timezone
+
+from .engine import SimulationError
+from .jobs import JobProgress, SimulationBusy, SimulationCancelled, SimulationLimitExceeded, active_simulations
+from .models import Simulation
+from .runner import run_simulation
+
+logger = logging.getLogger(__name__)
+
+
+def _claim_simulation(task, simulation_id: int, job_id: str) -> bool:
+    """Atomically move a queued job to 'running'; False if it was cancelled or replaced."""
+    claimable = ['queued']
+    if task.request.retries or (task.request.delivery_info or {}).get('redelivered'):
+        # Our own earlier attempt left the job 'running'
+        claimable.append('running')
+    
+    return bool(Simulation.objects.filter(id=simulation_id, job_id=job_id, status__in=claimable).update(
+        status='running', progress=0, updated_at=timezone.now(),
+    ))
+
+
+@shared_task(
+    bind=True,
+    autoretry_for=(OperationalError,),
+    retry_backoff=True,
+    retry_backoff_max=600,
+    retry_jitter=True,
+    max_retries=5,
+    acks_late=True,
+)
+def run_simulation_task(self, simulation_id: int, job_id: str, draws: Optional[int] = None,
+                        seed: Optional[int] = None) -> dict:
+    """Run one simulation job. Duplicate deliveries and cancelled jobs are no-ops."""
+    if not _claim_simulation(self, simulation_id, job_id):
+        logger.info(f"Simulation job {job_id} was cancelled or replaced, skipping")
+        return {'simulation_id': simulation_id, 'status': 'skipped'}
+    
+    simulation = Simulation.objects.get(id=simulation_id)
+    try:
+        run_simulation(simulation, draws=draws, seed=seed, progress=JobProgress(simulation_id, job_id))
+    except SimulationCancelled:
+        logger.info(f"Simulation job {job_id} cancelled")
+        return {'simulation_id': simulation_id, 'status': 'cancelled'}
+    except SimulationError:
+        # Already recorded on the simulation
+        return {'simulation_id': simulation_id, 'status': 'failed'}
+    except OperationalError:
+        raise
+    except Exception as e:
+        logger.exception(f"Simulation job {job_id} failed")
+        Simulation.objects.filter(id=simulation_id, job_id=job_id, status='running').update(
+            status='failed', error_message=f"Simulation failed: {e}", updated_at=timezone.now(),
+        )
+        raise
+    
+    return {'simulation_id': simulation_id, 'status': 'completed'}
+
+
+def submit_simulation(simulation: Simulation, draws: Optional[int] = None, seed: Optional[int] = None) -> uuid.UUID:
+    """Queue a simulation job and return its id; the task is sent once the transaction commits.
+    
+    Raises SimulationBusy when the simulation already has an active job and
+    SimulationLimitExceeded when the user is at SIMULATION_MAX_ACTIVE_PER_USER.
+    """
+    job_id = uuid.uuid4()
+    with transaction.atomic():
+        # Serializes submissions per user, so two requests can't both take the last slot
+        list(get_user_model().objects.select_for_update().filter(pk=simulation.user_id).values_list('pk', flat=True))
+        
+        active = active_simulations(simulation.user_id)
+        if active.filter(pk=simulation.pk).exists():
+            raise SimulationBusy('This simulation is already queued or running')
+        if active.count() >= settings.SIMULATION_MAX_ACTIVE_PER_USER:
+            raise SimulationLimitExceeded(
+                f"At most {settings.SIMULATION_MAX_ACTIVE_PER_USER} simulations can run at once; "
+                f"wait for one to finish or cancel it"
+            )
+        
+        Simulation.objects.filter(pk=simulation.pk).update(
+            status='queued', job_id=job_id, progress=0, error_message='', updated_at=timezone.now(),
+        )
+        transaction.on_commit(lambda: run_simulation_task.apply_async(
+            args=(simulation.pk, str(job_id), draws, seed), task_id=str(job_id),
+        ))
+    
+    logger.info(f"Queued simulation {simulation.pk} as job {job_id}")
+    return job_id
\ No newline at end of file
@@ -8,6 +8,8 @@ urlpatterns = [
     path('<int:pk>/', views.SimulationDetailView.as_view(), name='simulation-detail'),
     path('create/', views.CreateSimulationView.as_view(), name='create-simulation'),
     path('<int:pk>/run/', views.RunSimulationView.as_view(), name='run-simulation'),
+    path('<int:pk>/cancel/', views.CancelSimulationView.as_view(), name='cancel-simulation'),
     path('<int:pk>/results/', views.SimulationResultsView.as_view(), name='simulation-results'),
+    path('sweep/', views.SimulationSweepView.as_view(), name='simulation-sweep'),
     path('templates/', views.SimulationTemplatesView.as_view(), name='simulation-templates'),
 ] 
\ No newline at end of file
@@ -1,25 +1,39 @@
+import math
+
 from rest_framework import generics, permissions, status
 from rest_framework.response import Response
 from rest_framework.views import APIView
+from django.conf import settings
 from django.shortcuts import get_object_or_404
-from decimal import Decimal
+from django.urls import reverse
 
+from .engine import SimulationError
+from .jobs import ACTIVE_STATUSES, SimulationBusy, SimulationLimitExceeded, cancel_simulation, wait_for_simulation
 from .models import Simulation, SimulationParameter, SimulationResult
+from .sweeps import expand_grid, run_sweep
+from .tasks import submit_simulation
 from .serializers import (
     SimulationSerializer,
-    SimulationParameterSerializer,
     SimulationResultSerializer,
+    SimulationSweepSerializer,
     CreateSimulationSerializer
 )
+from eco_api.pagination import KeysetPagination
 
 
 class SimulationListView(generics.ListCreateAPIView):
     """View for listing and creating simulations."""
     serializer_class = SimulationSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = KeysetPagination
     
     def get_queryset(self):
-        return Simulation.objects.filter(user=self.request.user)
+        queryset = Simulation.objects.filter(user=self.request.user).only(
+            *SimulationSerializer.only_fields(self.request, 'created_at')
+        )
+        if 'parameters' in SimulationSerializer.selected_fields(self.request):
+            queryset = queryset.prefetch_related('parameters')
+        return queryset
     
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
@@ -31,7 +45,7 @@ class SimulationDetailView(generics.RetrieveUpdateDestroyAPIView):
     permission_classes = [permissions.IsAuthenticated]
     
     def get_queryset(self):
-        return Simulation.objects.filter(user=self.request.user)
+        return Simulation.objects.filter(user=self.request.user).prefetch_related('parameters')
 
 
 class CreateSimulationView(APIView):
@@ -41,143 +55,141 @@ class CreateSimulationView(APIView):
     def post(self, request):
         serializer = CreateSimulationSerializer(data=request.data)
         if serializer.is_valid():
+            # Parameters are created by the serializer
             simulation = serializer.save(user=request.user)
             
-            # Create simulation parameters if provided
-            parameters_data = request.data.get('parameters', [])
-            for param_data in parameters_data:
-                param_data['simulation'] = simulation.id
-                param_serializer = SimulationParameterSerializer(data=param_data)
-                if param_serializer.is_valid():
-                    param_serializer.save()
-            
             return Response(SimulationSerializer(simulation).data, status=status.HTTP_201_CREATED)
         
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
 class RunSimulationView(APIView):
-    """View for running a simulation and calculating results."""
+    """View for queueing a simulation run against the user's invoice data.
+    
+    The run happens in a background job; poll or long-poll the results view
+    for its progress. POST {"mode": "monte_carlo", "draws": 20000, "seed": 7}
+    also samples factor and quantity uncertainty; draws and seed are optional.
+    """
     permission_classes = [permissions.IsAuthenticated]
     
     def post(self, request, pk):
         simulation = get_object_or_404(Simulation, pk=pk, user=request.user)
         
-        # Update status to running
-        simulation.status = 'running'
-        simulation.save()
+        mode = request.data.get('mode', 'deterministic')
+        if mode not in ('deterministic', 'monte_carlo'):
+            return Response({'error': 'mode must be deterministic or monte_carlo'}, status=status.HTTP_400_BAD_REQUEST)
+        draws = seed = None
+        if mode == 'monte_carlo':
+            try:
+                draws = int(request.data.get('draws', settings.SIMULATION_MONTE_CARLO_DEFAULT_DRAWS))
+                seed = request.data.get('seed')
+                seed = int(seed) if seed is not None else None
+            except (TypeError, ValueError):
+                return Response({'error': 'draws and seed must be integers'}, status=status.HTTP_400_BAD_REQUEST)
+            if not 1 <= draws <= settings.SIMULATION_MONTE_CARLO_MAX_DRAWS:
+                return Response({
+                    'error': f'draws must be between 1 and {settings.SIMULATION_MONTE_CARLO_MAX_DRAWS}'
+                }, status=status.HTTP_400_BAD_REQUEST)
+            if seed is not None and seed < 0:
+                return Response({'error': 'seed must not be negative'}, status=status.HTTP_400_BAD_REQUEST)
         
         try:
-            # TODO: Implement actual simulation logic
-            # This would calculate the environmental impact based on parameters
-            
-            # Placeholder calculations
-            base_carbon = Decimal('100.00')  # Example base values
-            base_water = Decimal('500.00')
-            base_energy = Decimal('50.00')
-            base_cost = Decimal('1000.00')
-            
-            # Simulate some improvements (placeholder logic)
-            simulated_carbon = base_carbon * Decimal('0.85')  # 15% reduction
-            simulated_water = base_water * Decimal('0.90')    # 10% reduction
-            simulated_energy = base_energy * Decimal('0.80')  # 20% reduction
-            simulated_cost = base_cost * Decimal('0.95')      # 5% reduction
-            
-            # Update simulation with results
-            simulation.base_carbon_footprint = base_carbon
-            simulation.base_water_usage = base_water
-            simulation.base_energy_usage = base_energy
-            simulation.base_cost = base_cost
-            
-            simulation.simulated_carbon_footprint = simulated_carbon
-            simulation.simulated_water_usage = simulated_water
-            simulation.simulated_energy_usage = simulated_energy
-            simulation.simulated_cost = simulated_cost
-            
-            simulation.carbon_reduction = base_carbon - simulated_carbon
-            simulation.water_reduction = base_water - simulated_water
-            simulation.energy_reduction = base_energy - simulated_energy
-            simulation.cost_savings = base_cost - simulated_cost
-            
-            simulation.status = 'completed'
-            simulation.save()
-            
-            # Create detailed results
-            result_data = {
-                'carbon_breakdown': {
-                    'materials': float(simulated_carbon * Decimal('0.6')),
-                    'transport': float(simulated_carbon * Decimal('0.2')),
-                    'energy': float(simulated_carbon * Decimal('0.2')),
-                },
-                'water_breakdown': {
-                    'direct_usage': float(simulated_water * Decimal('0.7')),
-                    'indirect_usage': float(simulated_water * Decimal('0.3')),
-                },
-                'energy_breakdown': {
-                    'electricity': float(simulated_energy * Decimal('0.5')),
-                    'fuel': float(simulated_energy * Decimal('0.3')),
-                    'renewable': float(simulated_energy * Decimal('0.2')),
-                },
-                'cost_breakdown': {
-                    'materials': float(simulated_cost * Decimal('0.4')),
-                    'energy': float(simulated_cost * Decimal('0.3')),
-                    'labor': float(simulated_cost * Decimal('0.3')),
-                },
-                'recommendations': [
-                    'Consider switching to recycled materials',
-                    'Optimize transportation routes',
-                    'Implement energy-efficient processes'
-                ],
-                'implementation_steps': [
-                    'Audit current material usage',
-                    'Research alternative suppliers',
-                    'Calculate ROI for changes'
-                ]
-            }
-            
-            # Save or update detailed results
-            result, created = SimulationResult.objects.get_or_create(
-                simulation=simulation,
-                defaults={
-                    'carbon_breakdown': result_data['carbon_breakdown'],
-                    'water_breakdown': result_data['water_breakdown'],
-                    'energy_breakdown': result_data['energy_breakdown'],
-                    'cost_breakdown': result_data['cost_breakdown'],
-                    'recommendations': result_data['recommendations'],
-                    'implementation_steps': result_data['implementation_steps'],
-                    'confidence_level': Decimal('0.85')
-                }
+            job_id = submit_simulation(simulation, draws=draws, seed=seed)
+        except SimulationBusy as e:
+            return Response({'error': str(e)}, status=status.HTTP_409_CONFLICT)
+        except SimulationLimitExceeded as e:
+            return Response({'error': str(e)}, status=status.HTTP_429_TOO_MANY_REQUESTS)
+        
+        simulation.refresh_from_db()
+        return Response({
+            'message': 'Simulation queued',
+            'job_id': str(job_id),
+            'results_url': reverse('simulations:simulation-results', kwargs={'pk': simulation.pk}),
+            'simulation': SimulationSerializer(simulation).data
+        }, status=status.HTTP_202_ACCEPTED)
+
+
+class CancelSimulationView(APIView):
+    """View for cancelling a queued or running simulation."""
+    permission_classes = [permissions.IsAuthenticated]
+    
+    def post(self, request, pk):
+        simulation = get_object_or_404(Simulation, pk=pk, user=request.user)
+        if not cancel_simulation(simulation):
+            return Response({'error': 'Simulation is not queued or running'}, status=status.HTTP_409_CONFLICT)
+        return Response({'message': 'Simulation cancelled', 'status': 'cancelled'}, status=status.HTTP_200_OK)
+
+
+class SimulationSweepView(APIView):
+    """View for evaluating many parameter sets against one baseline and ranking them.
+    
+    POST {"simulation_type": "material_substitution",
+          "grid": [[{material option}, ...], [{quantity option}, ...]],
+          "rank_by": "carbon", "persist_top": 3}
+    or the same with "scenarios": [[parameters], ...] instead of a grid.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    
+    def post(self, request):
+        serializer = SimulationSweepSerializer(data=request.data, context={'request': request})
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        
+        data = serializer.validated_data
+        if 'grid' in data:
+            parameter_sets = expand_grid(data['parameters'], data['grid'])
+        else:
+            parameter_sets = [data['parameters'] + scenario for scenario in data['scenarios']]
+        
+        try:
+            sweep = run_sweep(
+                request.user, data['simulation_type'], parameter_sets,
+                invoice_ids=data.get('invoices'),
+                rank_by=data['rank_by'],
+                persist_top=data['persist_top'],
+                name=data['name'],
             )
-            
-            if not created:
-                # Update existing result
-                result.carbon_breakdown = result_data['carbon_breakdown']
-                result.water_breakdown = result_data['water_breakdown']
-                result.energy_breakdown = result_data['energy_breakdown']
-                result.cost_breakdown = result_data['cost_breakdown']
-                result.recommendations = result_data['recommendations']
-                result.implementation_steps = result_data['implementation_steps']
-                result.save()
-            
-            return Response({
-                'message': 'Simulation completed successfully',
-                'simulation': SimulationSerializer(simulation).data
-            }, status=status.HTTP_200_OK)
-            
-        except Exception as e:
-            simulation.status = 'failed'
-            simulation.save()
-            return Response({
-                'error': f'Simulation failed: {str(e)}'
-            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        except SimulationError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        
+        return Response(sweep, status=status.HTTP_200_OK)
 
 
 class SimulationResultsView(APIView):
-    """View for retrieving detailed simulation results."""
+    """View for retrieving detailed simulation results.
+    
+    While the simulation is queued or running this answers 202 with its
+    progress; ?wait=N long-polls until it finishes first. The wait is capped
+    at SIMULATION_RESULTS_MAX_WAIT because it ties up a worker; clients
+    waiting longer poll again.
+    """
     permission_classes = [permissions.IsAuthenticated]
     
     def get(self, request, pk):
-        simulation = get_object_or_404(Simulation, pk=pk, user=request.user)
+        simulation = get_object_or_404(Simulation.objects.select_related('detailed_result'), pk=pk, user=request.user)
+        
+        try:
+            wait = float(request.query_params.get('wait', 0))
+        except ValueError:
+            wait = math.nan
+        if not math.isfinite(wait):
+            return Response({'error': 'wait must be a number of seconds'}, status=status.HTTP_400_BAD_REQUEST)
+        wait = min(max(wait, 0), settings.SIMULATION_RESULTS_MAX_WAIT)
+        if wait and simulation.status in ACTIVE_STATUSES:
+            wait_for_simulation(simulation.pk, wait)
+            simulation = Simulation.objects.select_related('detailed_result').get(pk=simulation.pk)
+        
+        if simulation.status in ACTIVE_STATUSES:
+            return Response({
+                'status': simulation.status,
+                'progress': simulation.progress,
+                'job_id': str(simulation.job_id) if simulation.job_id else None,
+            }, status=status.HTTP_202_ACCEPTED)
+        if simulation.status in ('failed', 'cancelled'):
+            return Response({
+                'status': simulation.status,
+                'error': simulation.error_message or f'Simulation {simulation.status}',
+            }, status=status.HTTP_409_CONFLICT)
         
         try:
             result = simulation.detailed_result
@@ -193,15 +205,15 @@ class SimulationTemplatesView(APIView):
     permission_classes = [permissions.IsAuthenticated]
     
     def get(self, request):
+        # Each parameter goes from its original_value to its new_value
         templates = [
             {
                 'id': 'material_substitution',
                 'name': 'Material Substitution',
                 'description': 'Simulate the impact of switching to more sustainable materials',
                 'parameters': [
-                    {'type': 'material', 'name': 'Current Material', 'required': True},
-                    {'type': 'material', 'name': 'Alternative Material', 'required': True},
-                    {'type': 'quantity', 'name': 'Quantity', 'required': True}
+                    {'type': 'material', 'name': 'Material', 'required': True},
+                    {'type': 'quantity', 'name': 'Quantity', 'required': False}
                 ]
             },
             {
@@ -209,9 +221,7 @@ class SimulationTemplatesView(APIView):
                 'name': 'Supplier Change',
                 'description': 'Analyze the environmental impact of changing suppliers',
                 'parameters': [
-                    {'type': 'supplier', 'name': 'Current Supplier', 'required': True},
-                    {'type': 'supplier', 'name': 'New Supplier', 'required': True},
-                    {'type': 'custom', 'name': 'Transportation Distance', 'required': False}
+                    {'type': 'supplier', 'name': 'Supplier', 'required': True}
                 ]
             },
             {
@@ -219,8 +229,7 @@ class SimulationTemplatesView(APIView):
                 'name': 'Energy Efficiency',
                 'description': 'Simulate energy-saving measures and their impact',
                 'parameters': [
-                    {'type': 'energy', 'name': 'Current Energy Usage', 'required': True},
-                    {'type': 'energy', 'name': 'Proposed Energy Usage', 'required': True},
+                    {'type': 'energy', 'name': 'Energy Usage', 'required': True},
                     {'type': 'custom', 'name': 'Implementation Cost', 'required': False}
                 ]
             }